@@ -0,0 +1,114 @@
+"""
+Synthetic markdown documents for benchmarking
+"""
+import random
+
+def syntheticDocument(blocks, seed=0):
+    """
+    Makes a markdown document with a realistic mix of headers, paragraphs, lists,
+    quotes, code and tables
+    @param {int} blocks Roughly how many top level blocks the document converts to
+    @param {int} [seed=0] Seed, the same seed always makes the same document
+    @returns {str} The markdown
+    """
+    rand = random.Random(seed)
+    words = ["notion", "markdown", "block", "page", "upload", "table", "list", "*bold*",
+        "**strong**", "`code`", "[link](https://example.com)", "lorem", "ipsum", "dolor"]
+    def sentence(length=12):
+        return " ".join(rand.choice(words) for i in range(length)).capitalize() + "."
+
+    parts = []
+    for i in range(blocks):
+        kind = rand.random()
+        if i % 20 == 0:
+            parts.append(f"{'#' * rand.randint(1, 3)} Section {i}\n")
+        elif kind < 0.5:
+            parts.append(" ".join(sentence() for s in range(rand.randint(1, 4))) + "\n")
+        elif kind < 0.7:
+            parts.append("".join(f"* {sentence(6)}\n" for l in range(rand.randint(1, 3))))
+        elif kind < 0.8:
+            parts.append(f"> {sentence()}\n")
+        elif kind < 0.95:
+            parts.append("```python\n" + "".join(f"x{l} = {l}\n" for l in range(rand.randint(1, 8))) + "```\n")
+        else:
+            cols = rand.randint(2, 4)
+            parts.append("| " + " | ".join(f"Col {c}" for c in range(cols)) + " |\n" +
+                "|" + "---|" * cols + "\n" +
+                "".join("| " + " | ".join(rand.choice(words) for c in range(cols)) + " |\n" \
+                    for r in range(rand.randint(1, 5))))
+    return "\n".join(parts)
+
+def tableDocument(rows, cols=6, seed=0):
+    """
+    @param {int} rows The number of rows in the one huge table
+    @param {int} [cols=6] The number of columns
+    @returns {str} The markdown
+    """
+    rand = random.Random(seed)
+    header = "| " + " | ".join(f"Column {c}" for c in range(cols)) + " |\n"
+    divider = "|" + "---|" * cols + "\n"
+    body = "".join("| " + " | ".join(f"cell {rand.randint(0, 10**6)}" for c in range(cols)) + " |\n" \
+        for r in range(rows))
+    return header + divider + body
+
+def nestedListDocument(items, depth=8, seed=0):
+    """
+    @param {int} items The number of top level list items
+    @param {int} [depth=8] How deep each item's sublists go
+    @returns {str} The markdown
+    """
+    rand = random.Random(seed)
+    lines = []
+    for i in range(items):
+        for d in range(depth):
+            bullet = "*" if rand.random() < 0.5 else "1."
+            lines.append(f"{'    ' * d}{bullet} Item {i} level {d} with *some* **formatting**\n")
+    return "".join(lines)
+
+def codeFenceDocument(fences, lines=10, seed=0):
+    """
+    @param {int} fences The number of code fences
+    @param {int} [lines=10] The number of lines in each fence
+    @returns {str} The markdown
+    """
+    rand = random.Random(seed)
+    languages = ["python", "py", "javascript", "js", "sh", "bash", "yaml", "yml", "c", "c++",
+        "java", "go", "rust", "json", "", "unknownlang"]
+    return "".join(f"Example {i}\n\n```{rand.choice(languages)}\n" + \
+        "".join(f"value_{l} = compute({l}, {rand.randint(0, 100)})\n" for l in range(lines)) + \
+        "```\n\n" for i in range(fences))
+
+def htmlDocument(blocks, seed=0):
+    """
+    A document like the HTML heavy exports from other note apps
+    @param {int} blocks The number of HTML blocks and paragraphs
+    @returns {str} The markdown
+    """
+    rand = random.Random(seed)
+    parts = []
+    for i in range(blocks):
+        kind = rand.random()
+        if kind < 0.3:
+            parts.append(f'<img src="https://example.com/image{i}.png" alt="Image {i}">\n')
+        elif kind < 0.6:
+            parts.append(f'<div class="note"><p>Some <b>bold</b> and <i>italic</i> text {i}</p></div>\n')
+        else:
+            parts.append(f'A paragraph with <span style="color:red">inline html</span> ' \
+                f'and <img src="image{i}.png"> an image {i}\n')
+    return "\n".join(parts)
+
+def latexDocument(blocks, seed=0):
+    """
+    A document like math notes, dense with inline and block equations
+    @param {int} blocks The number of paragraphs and block equations
+    @returns {str} The markdown
+    """
+    rand = random.Random(seed)
+    parts = []
+    for i in range(blocks):
+        if rand.random() < 0.4:
+            parts.append(f"$$\n\\sum_{{k=0}}^{{{i}}} \\frac{{x^k}}{{k!}} = e^x + O(x^{{{i}}})\n$$\n")
+        else:
+            parts.append(f"Where $a_{i} = \\sqrt{{b_{i}}}$ and $c_{i} \\leq \\int_0^1 f(t) dt$ " \
+                f"for all $t \\in [0, {i}]$.\n")
+    return "\n".join(parts)
@@ -0,0 +1,131 @@
+"""
+Benchmarks convert() (and so NotionPyRenderer) on synthetic documents of
+different shapes. Reports throughput in MB/s and blocks/s and the peak memory
+of a conversion. Results can be saved and later runs compared against them, a
+run that's slower (or uses more memory) than the baseline by more than the
+tolerance exits with an error.
+    python benchmarks/rendererBenchmark.py --save baseline.json
+    python benchmarks/rendererBenchmark.py --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from md2notion.NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension, addLatexExtension
+from md2notion.upload import convert
+from corpus import syntheticDocument, tableDocument, nestedListDocument, codeFenceDocument, \
+    htmlDocument, latexDocument
+
+#name => (function taking a scale and returning the markdown, renderer to convert with)
+SHAPES = {
+    "mixed": (lambda scale: syntheticDocument(500 * scale), NotionPyRenderer),
+    "table": (lambda scale: tableDocument(1000 * scale), NotionPyRenderer),
+    "nested-list": (lambda scale: nestedListDocument(100 * scale), NotionPyRenderer),
+    "code": (lambda scale: codeFenceDocument(1000 * scale), NotionPyRenderer),
+    "html": (lambda scale: htmlDocument(1000 * scale), addHtmlImgTagExtension(NotionPyRenderer)),
+    "latex": (lambda scale: latexDocument(1000 * scale), addLatexExtension(NotionPyRenderer)),
+}
+
+def countBlocks(blockDescriptors):
+    """
+    @returns {int} The number of blocks in blockDescriptors, children and table rows included
+    """
+    return sum(1 + len(d.get("rows") or []) + countBlocks(d.get("children") or []) \
+        for d in blockDescriptors)
+
+def benchmarkShape(mdText, notionPyRendererCls, repeat=3):
+    """
+    Converts mdText repeat times and once more under tracemalloc
+    @returns {dict} mbps, blocksPerSec and peakMB of the conversion, from the fastest run
+    """
+    seconds = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        rendered = convert(mdText, notionPyRendererCls)
+        seconds = min(seconds, time.perf_counter() - start)
+    blocks = countBlocks(rendered)
+    del rendered
+
+    #tracemalloc slows everything down, so memory gets its own run
+    tracemalloc.start()
+    convert(mdText, notionPyRendererCls)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "mb": len(mdText.encode("utf-8")) / 1024 / 1024,
+        "blocks": blocks,
+        "seconds": seconds,
+        "mbps": len(mdText.encode("utf-8")) / 1024 / 1024 / seconds,
+        "blocksPerSec": blocks / seconds,
+        "peakMB": peak / 1024 / 1024,
+    }
+
+def regressions(results, baseline, tolerance):
+    """
+    @param {dict} results Shape name => benchmarkShape() result
+    @param {dict} baseline The same, from an earlier run
+    @param {float} tolerance How much worse (as a fraction) a result can be than the baseline
+    @returns {str[]} A description of every regression
+    """
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        for key in ("mbps", "blocksPerSec"):
+            if result[key] < base[key] * (1 - tolerance):
+                failures.append(f"{name}: {key} {result[key]:.2f} is below baseline {base[key]:.2f}")
+        if result["peakMB"] > base["peakMB"] * (1 + tolerance):
+            failures.append(f"{name}: peakMB {result['peakMB']:.2f} is above baseline {base['peakMB']:.2f}")
+    return failures
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks converting markdown with NotionPyRenderer')
+    parser.add_argument('--shapes', nargs='+', choices=list(SHAPES.keys()), default=list(SHAPES.keys()),
+                        help='Document shapes to benchmark')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Multiplier for the size of every document')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Conversions per shape, the fastest one is reported')
+    parser.add_argument('--save', type=str, default=None, metavar='PATH',
+                        help='Save the results as JSON to use as a baseline later')
+    parser.add_argument('--baseline', type=str, default=None, metavar='PATH',
+                        help='Fail if the results are worse than the ones saved in PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='How much worse than the baseline (as a fraction) results can be')
+    parser.add_argument('--min-mbps', type=float, default=None,
+                        help='Fail if any shape converts slower than this many MB/s')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'shape':<12} {'MB':>7} {'blocks':>8} {'seconds':>8} {'MB/s':>7} {'blocks/s':>10} {'peak MB':>8}")
+    for name in args.shapes:
+        makeDocument, notionPyRendererCls = SHAPES[name]
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull): #Renderer warnings
+            result = benchmarkShape(makeDocument(args.scale), notionPyRendererCls, args.repeat)
+        results[name] = result
+        print(f"{name:<12} {result['mb']:>7.2f} {result['blocks']:>8} {result['seconds']:>8.3f} " \
+            f"{result['mbps']:>7.2f} {result['blocksPerSec']:>10.0f} {result['peakMB']:>8.2f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            failures += regressions(results, json.load(f), args.tolerance)
+    if args.min_mbps is not None:
+        failures += [f"{name}: mbps {result['mbps']:.2f} is below {args.min_mbps:.2f}" \
+            for name, result in results.items() if result["mbps"] < args.min_mbps]
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,85 @@
+"""
+End to end upload benchmark against a local stand-in for Notion.so (see
+tests/stubServer.py). Uploads synthetic documents of growing size with each
+upload mode and reports time, requests and bytes.
+    python benchmarks/uploadBenchmark.py --sizes 10 100 1000 --latency 0.05
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from notion.client import NotionClient
+from tests.stubServer import StubNotionServer
+from md2notion.pipeline import convertText
+from md2notion.upload import uploadDescriptors, cli
+from corpus import syntheticDocument
+
+def runUpload(server, mdText, batchSize=None):
+    client = NotionClient(token_v2="benchmark")
+    page = client.get_block(server.pageUrl(server.addPage("Benchmark")))
+    uploadDescriptors(convertText(mdText), page, "benchmark.md", batchSize=batchSize)
+    return 1
+
+def runCli(server, mdText, argv, files=4):
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for i in range(files):
+            with open(os.path.join(tmpDir, f"doc{i}.md"), "w", encoding="utf-8") as f:
+                f.write(mdText)
+        cli(["benchmark", server.pageUrl(server.addPage("Benchmark")),
+            os.path.join(tmpDir, "*.md"), "--append", *argv])
+    return files
+
+MODES = {
+    "upload": lambda server, mdText: runUpload(server, mdText),
+    "batched": lambda server, mdText: runUpload(server, mdText, batchSize=100),
+    "cli": lambda server, mdText: runCli(server, mdText, []),
+    "cli-jobs": lambda server, mdText: runCli(server, mdText, ["--batch-size", "100", "--jobs", "4"]),
+}
+
+def benchmark(mode, blocks, **serverKwargs):
+    """
+    Runs one upload mode against a fresh stub server
+    @returns {tuple} (seconds, number of documents uploaded, StubStats, Exception|None)
+    """
+    mdText = syntheticDocument(blocks)
+    with StubNotionServer(**serverKwargs) as server, server.patchNotionPy():
+        start = time.perf_counter()
+        documents = 0
+        error = None
+        try:
+            with redirect_stdout(io.StringIO()):
+                documents = MODES[mode](server, mdText)
+        except Exception as e:
+            error = e
+        return (time.perf_counter() - start, documents, server.stats, error)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks uploading against a local Notion.so stand-in')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500],
+                        help='Number of blocks in each synthetic document')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES.keys()), default=list(MODES.keys()),
+                        help='Upload modes to run')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the server waits before every response')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests the server fails')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests per second before the server answers with 429')
+    args = parser.parse_args(argv)
+
+    #blocks is per document, the cli modes upload 4 documents
+    print(f"{'mode':<10} {'blocks':>7} {'seconds':>8} {'blocks/s':>9} {'requests':>9} {'KB in':>9} {'KB out':>9}")
+    for blocks in args.sizes:
+        for mode in args.modes:
+            seconds, documents, stats, error = benchmark(mode, blocks, latency=args.latency,
+                errorRate=args.error_rate, rateLimit=args.rate_limit, seed=0)
+            print(f"{mode:<10} {blocks:>7} {seconds:>8.2f} {blocks * documents / seconds:>9.1f} " \
+                f"{stats.totalRequests:>9} {stats.bytesIn / 1024:>9.1f} {stats.bytesOut / 1024:>9.1f}" \
+                + (f"  FAILED: {error!r}" if error else ""))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
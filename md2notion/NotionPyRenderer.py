@@ -1,7 +1,8 @@
-from itertools import chain
-import random
+from itertools import chain, count
+from functools import partial
+import hashlib
 import re
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
 from notion.block import CodeBlock, DividerBlock, HeaderBlock, SubheaderBlock, \
     SubsubheaderBlock, QuoteBlock, TextBlock, NumberedListBlock, \
     BulletedListBlock, ImageBlock, CollectionViewBlock, TodoBlock, EquationBlock
@@ -9,45 +10,234 @@ from mistletoe.base_renderer import BaseRenderer
 from mistletoe.block_token import HTMLBlock, CodeFence
 from mistletoe.span_token import Image, Link, HTMLSpan, SpanToken
 from html.parser import HTMLParser
+from .blockDescriptor import BlockDescriptor
+from . import instrument
 
 def flatten(l):
     for el in l:
-        if isinstance(el, Iterable) and not isinstance(el, (str, bytes, dict)):
+        if isinstance(el, Iterable) and not isinstance(el, (str, bytes, Mapping)):
             yield from flatten(el)
         else:
             yield el
 
+def withExtensions(notionPyRendererCls, extensions, *extraExtensions):
+    """Makes a notionPyRendererCls with extensions added to the argument list. Use
+    it with functools.partial so that the result can still be pickled (e.g. to
+    convert on a process pool)
+    """
+    return notionPyRendererCls(*chain(extensions, extraExtensions))
+
 def addHtmlImgTagExtension(notionPyRendererCls):
     """A decorator that add the image tag extension to the argument list. The
     decorator pattern allows us to chain multiple extensions. For example, we
     can create a renderer with extension A, B, C by writing:
         addAExtension(addBExtension(addCExtension(notionPyRendererCls)))
     """
-    def newNotionPyRendererCls(*extraExtensions):
-        new_extension = [HTMLBlock, HTMLSpan]
-        return notionPyRendererCls(*chain(new_extension, extraExtensions))
-    return newNotionPyRendererCls
+    return partial(withExtensions, notionPyRendererCls, (HTMLBlock, HTMLSpan))
 
 def addLatexExtension(notionPyRendererCls):
     """A decorator that add the latex extensions to the argument list.
     Markdown such as $equation$ is parsed as inline-equations and
     $$equation$$ is parsed as an equation block.
     """
-    def newNotionPyRendererCls(*extraExtensions):
-        new_extension = [BlockEquation, InlineEquation]
-        return notionPyRendererCls(*chain(new_extension, extraExtensions))
-    return newNotionPyRendererCls
+    return partial(withExtensions, notionPyRendererCls, (BlockEquation, InlineEquation))
+
+def addHtmlFormattingExtension(notionPyRendererCls):
+    """A decorator that adds the image tag extension but also turns simple inline
+    HTML tags (<b>, <i>, <code>, <s>, <a href>...) into Notion.so formatting instead
+    of leaving them in the text as is.
+    """
+    return partial(withExtensions, notionPyRendererCls, (FormattedHTMLBlock, FormattedHTMLSpan))
+
+def rendererName(notionPyRendererCls):
+    """
+    @param {NotionPyRenderer} notionPyRendererCls A renderer class, with any extensions
+    added to it with the decorators above
+    @returns {str} A name for the renderer class and its extensions, e.g.
+    "md2notion.NotionPyRenderer:NotionPyRenderer+mistletoe.block_token:HTMLBlock,..."
+    """
+    if isinstance(notionPyRendererCls, partial) and notionPyRendererCls.func is withExtensions:
+        innerCls, *extensions = notionPyRendererCls.args
+        extensionNames = (f"{e.__module__}:{e.__qualname__}" for e in chain(*extensions))
+        return f"{rendererName(innerCls)}+{','.join(extensionNames)}"
+    return f"{notionPyRendererCls.__module__}:{notionPyRendererCls.__qualname__}"
+
+#Notion seems really picky about the language field and the case sensitivity
+#so we match the string to the specific version that Notion.so expects
+NOTION_SO_LANGS = (
+    "ABAP",
+    "Arduino",
+    "Bash",
+    "BASIC",
+    "C",
+    "Clojure",
+    "CoffeeScript",
+    "C++",
+    "C#",
+    "CSS",
+    "Dart",
+    "Diff",
+    "Docker",
+    "Elixir",
+    "Elm",
+    "Erlang",
+    "Flow",
+    "Fortran",
+    "F#",
+    "Gherkin",
+    "GLSL",
+    "Go",
+    "GraphQL",
+    "Groovy",
+    "Haskell",
+    "HTML",
+    "Java",
+    "JavaScript",
+    "JSON",
+    "Kotlin",
+    "LaTeX",
+    "Less",
+    "Lisp",
+    "LiveScript",
+    "Lua",
+    "Makefile",
+    "Markdown",
+    "Markup",
+    "MATLAB",
+    "Nix",
+    "Objective-C",
+    "OCaml",
+    "Pascal",
+    "Perl",
+    "PHP",
+    "Plain Text",
+    "PowerShell",
+    "Prolog",
+    "Python",
+    "R",
+    "Reason",
+    "Ruby",
+    "Rust",
+    "Sass",
+    "Scala",
+    "Scheme",
+    "Scss",
+    "Shell",
+    "SQL",
+    "Swift",
+    "TypeScript",
+    "VB.Net",
+    "Verilog",
+    "VHDL",
+    "Visual Basic",
+    "WebAssembly",
+    "XML",
+    "YAML",
+)
+
+#Common names for languages (mostly from code fences on GitHub) that aren't
+#the start of the name Notion.so uses, keys are case-folded
+CODE_LANG_ALIASES = {
+    "py": "Python",
+    "py3": "Python",
+    "python3": "Python",
+    "js": "JavaScript",
+    "jsx": "JavaScript",
+    "node": "JavaScript",
+    "ts": "TypeScript",
+    "tsx": "TypeScript",
+    "sh": "Shell",
+    "zsh": "Shell",
+    "console": "Shell",
+    "shell-session": "Shell",
+    "ps1": "PowerShell",
+    "yml": "YAML",
+    "cpp": "C++",
+    "cxx": "C++",
+    "hpp": "C++",
+    "h": "C",
+    "cs": "C#",
+    "csharp": "C#",
+    "fsharp": "F#",
+    "fs": "F#",
+    "golang": "Go",
+    "rb": "Ruby",
+    "rs": "Rust",
+    "kt": "Kotlin",
+    "hs": "Haskell",
+    "ex": "Elixir",
+    "exs": "Elixir",
+    "erl": "Erlang",
+    "clj": "Clojure",
+    "coffee": "CoffeeScript",
+    "ml": "OCaml",
+    "pl": "Perl",
+    "objc": "Objective-C",
+    "dockerfile": "Docker",
+    "make": "Makefile",
+    "md": "Markdown",
+    "tex": "LaTeX",
+    "vb": "Visual Basic",
+    "vbnet": "VB.Net",
+    "wasm": "WebAssembly",
+    "patch": "Diff",
+    "text": "Plain Text",
+    "txt": "Plain Text",
+    "plaintext": "Plain Text",
+    "htm": "HTML",
+    "svg": "XML",
+}
+
+
+class CodeLanguageIndex:
+    """
+    Resolves the language of a code fence to the name Notion.so uses, by exact
+    (case-insensitive) name, then alias, then the first name it's the start of.
+    Results are remembered so each distinct language is only looked up once
+    """
+
+    def __init__(self, languages, aliases):
+        """
+        @param {str[]} languages The names Notion.so uses, in order of preference
+        for prefix matches
+        @param {dict} aliases Other name => name Notion.so uses
+        """
+        self._languages = [(lang.casefold(), lang) for lang in languages]
+        self._exact = { alias.casefold(): lang for alias, lang in aliases.items() }
+        self._exact.update(self._languages)
+        self._resolved = {}
+
+    def resolve(self, language):
+        """
+        @param {str} language The language from the code fence
+        @returns {str|None} The name Notion.so uses or None if there isn't one
+        """
+        key = language.casefold()
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        match = self._exact.get(key) or \
+            next((lang for folded, lang in self._languages if folded.startswith(key)), None)
+        self._resolved[key] = match
+        return match
 
 class NotionPyRenderer(BaseRenderer):
     """
     A class that will render out a Markdown file into a descriptor for upload
     with notion-py. Each object will have a .type for the block type and then
     a bunch of different dict entries corresponding to kwargs for that block
-    type.
+    type (see BlockDescriptor).
     For CollectionViewBlocks, a .rows entry exists in the dictionary with a list
     object containing a descriptor for every row. This is still TODO
+    Subclasses can support more code fence languages by overriding codeLanguages
+    and codeLanguageAliases, e.g.
+        codeLanguageAliases = { **NotionPyRenderer.codeLanguageAliases, "gql": "GraphQL" }
     """
 
+    codeLanguages = NOTION_SO_LANGS
+    codeLanguageAliases = CODE_LANG_ALIASES
+
     def __init__(self, *extraExtensions):
         """
         Args:
@@ -63,49 +253,96 @@ class NotionPyRenderer(BaseRenderer):
         Overrides super().render but still uses render_map and then just
         does special parsing for stuff
         """
-        return self.render_map[token.__class__.__name__](token)
+        tokenType = token.__class__.__name__
+        if not instrument.enabled("render"):
+            return self.render_map[tokenType](token)
+        with instrument.timed("render", name=tokenType):
+            return self.render_map[tokenType](token)
 
     def renderMultiple(self, tokens):
         """
         Takes an array of sibling tokens and renders each one out.
         """
-        return list(flatten(self.render(t) for t in tokens))
+        out = []
+        for t in tokens:
+            self.renderInto(self.render(t), out)
+        return out
+
+    def renderInto(self, rendered, out):
+        """
+        Appends the output of a render method to out, flattening it if it's a list.
+        Render methods return a block, a string or a flat list of them, but
+        nested lists (and other iterables) are flattened too
+        @param rendered The output of a render method
+        @param {list} out The list to append to
+        """
+        if rendered.__class__ is not list:
+            if isinstance(rendered, (str, bytes, Mapping)) or not isinstance(rendered, Iterable):
+                out.append(rendered)
+                return
+        for el in rendered:
+            if el.__class__ is BlockDescriptor or el.__class__ is str:
+                out.append(el)
+            else:
+                self.renderInto(el, out)
 
     def renderMultipleToString(self, tokens):
         """
         Takes tokens and render them to a single string (if possible). Anything it
         can't convert to a string will be returned in the second part of the tuple
         @param {objects} tokens
-        @returns {tuple} (str, dict[])
+        @returns {tuple} (str, BlockDescriptor[])
         """
-        def toString(renderedBlock):
-            if isinstance(renderedBlock, dict) and renderedBlock['type'] == TextBlock:
-                return renderedBlock['title'] #This unwraps TextBlocks/paragraphs to use in other blocks
-            else: #Returns str as-is or returns blocks we can't convert
-                return renderedBlock
-
-        #Try to convert any objects to strings
-        rendered = [ toString(b) for b in self.renderMultiple(tokens)]
-        strs = "".join([s for s in rendered if isinstance(s, str)])
-        blocks = [b for b in rendered if isinstance(b, dict)]
+        strs = []
+        blocks = []
+        for b in self.renderMultiple(tokens):
+            if b.__class__ is str:
+                strs.append(b)
+            elif b.__class__ is not BlockDescriptor and not isinstance(b, Mapping):
+                continue
+            elif b['type'] == TextBlock:
+                strs.append(b['title']) #This unwraps TextBlocks/paragraphs to use in other blocks
+            else: #Blocks we can't convert
+                blocks.append(b)
+
         #Return a tuple of strings and any extra blocks we couldn't convert
-        return (strs, blocks)
+        return ("".join(strs), blocks)
 
     def renderMultipleToStringAndCombine(self, tokens, toBlockFunc):
         """
         renderMultipleToString but combines the string with the other blocks
         with the returned block from toBlockFunc
         @param {objects} tokens
-        @param {function} toBlockFunc Takes a str and returns a dict for the created
-        @returns {dict[]}
+        @param {function} toBlockFunc Takes a str and returns a BlockDescriptor for the created
+        @returns {BlockDescriptor[]}
         """
         strs, blocks = self.renderMultipleToString(tokens)
-        ret = []
         if strs: #If a non-empty string block
-            ret = ret + [toBlockFunc(strs)]
-        if blocks:
-            ret = ret + blocks
-        return ret
+            blocks.insert(0, toBlockFunc(strs))
+        return blocks
+
+    @classmethod
+    def codeLanguageIndex(cls):
+        """
+        @returns {CodeLanguageIndex} The index for this class' codeLanguages and
+        codeLanguageAliases, built once per class
+        """
+        if "_codeLanguageIndex" not in cls.__dict__:
+            cls._codeLanguageIndex = CodeLanguageIndex(cls.codeLanguages, cls.codeLanguageAliases)
+        return cls._codeLanguageIndex
+
+    def codeLanguage(self, language):
+        """
+        @param {str} language The language of a code fence
+        @returns {str} The Notion.so name for the language, "Plain Text" if there's no
+        language and "" if Notion.so doesn't have it
+        """
+        if language == "":
+            return "Plain Text"
+        matchLang = self.codeLanguageIndex().resolve(language)
+        if not matchLang:
+            print(f"Code block language {language} has no corresponding syntax in Notion.so")
+        return matchLang or ""
 
     def render_document(self, token):
         return self.renderMultiple(token.children)
@@ -113,97 +350,17 @@ class NotionPyRenderer(BaseRenderer):
     # == MD Block Tokens ==
     def render_block_code(self, token):
         #Indented code and ``` ``` code fence
-        #Notion seems really picky about the language field and the case sensitivity
-        #so we match the string to the specific version that Notion.so expects
-        notionSoLangs = [
-            "ABAP", 
-            "Arduino", 
-            "Bash", 
-            "BASIC", 
-            "C", 
-            "Clojure", 
-            "CoffeeScript", 
-            "C++", 
-            "C#", 
-            "CSS", 
-            "Dart", 
-            "Diff", 
-            "Docker", 
-            "Elixir", 
-            "Elm", 
-            "Erlang", 
-            "Flow", 
-            "Fortran", 
-            "F#", 
-            "Gherkin", 
-            "GLSL", 
-            "Go", 
-            "GraphQL", 
-            "Groovy", 
-            "Haskell", 
-            "HTML", 
-            "Java", 
-            "JavaScript", 
-            "JSON", 
-            "Kotlin", 
-            "LaTeX", 
-            "Less", 
-            "Lisp", 
-            "LiveScript", 
-            "Lua", 
-            "Makefile", 
-            "Markdown", 
-            "Markup", 
-            "MATLAB", 
-            "Nix", 
-            "Objective-C", 
-            "OCaml", 
-            "Pascal", 
-            "Perl", 
-            "PHP", 
-            "Plain Text", 
-            "PowerShell", 
-            "Prolog", 
-            "Python", 
-            "R", 
-            "Reason", 
-            "Ruby", 
-            "Rust", 
-            "Sass", 
-            "Scala", 
-            "Scheme", 
-            "Scss", 
-            "Shell", 
-            "SQL", 
-            "Swift", 
-            "TypeScript", 
-            "VB.Net", 
-            "Verilog", 
-            "VHDL", 
-            "Visual Basic", 
-            "WebAssembly", 
-            "XML", 
-            "YAML"
-        ]
-        if token.language != "":
-            matchLang = next((lang for lang in notionSoLangs if re.match(re.escape(token.language), lang, re.I)), "")
-            if not matchLang:
-                print(f"Code block language {token.language} has no corresponding syntax in Notion.so")
-        else:
-            matchLang = "Plain Text"
+        matchLang = self.codeLanguage(token.language)
 
         def blockFunc(blockStr):
-            return {
-                'type': CodeBlock,
-                'language': matchLang,
-                'title_plaintext': blockStr
-            }
+            return BlockDescriptor(CodeBlock,
+                language=matchLang,
+                title_plaintext=blockStr
+            )
         return self.renderMultipleToStringAndCombine(token.children, blockFunc)
 
     def render_thematic_break(self, token):
-        return {
-            'type': DividerBlock
-        }
+        return BlockDescriptor(DividerBlock)
     def render_heading(self, token):
         level = token.level
         if level > 3:
@@ -211,24 +368,21 @@ class NotionPyRenderer(BaseRenderer):
             level = 3
 
         def blockFunc(blockStr):
-            return {
-                'type': [HeaderBlock, SubheaderBlock, SubsubheaderBlock][level-1],
-                'title': blockStr
-            }
+            return BlockDescriptor([HeaderBlock, SubheaderBlock, SubsubheaderBlock][level-1],
+                title=blockStr
+            )
         return self.renderMultipleToStringAndCombine(token.children, blockFunc)
     def render_quote(self, token):
         def blockFunc(blockStr):
-            return {
-                'type': QuoteBlock,
-                'title': blockStr
-            }
+            return BlockDescriptor(QuoteBlock,
+                title=blockStr
+            )
         return self.renderMultipleToStringAndCombine(token.children, blockFunc)
     def render_paragraph(self, token):
         def blockFunc(blockStr):
-            return {
-                'type': TextBlock,
-                'title': blockStr
-            }
+            return BlockDescriptor(TextBlock,
+                title=blockStr
+            )
         return self.renderMultipleToStringAndCombine(token.children, blockFunc)
     def render_list(self, token):
         #List items themselves are each blocks, so skip it and directly render
@@ -243,45 +397,39 @@ class NotionPyRenderer(BaseRenderer):
         strings = [s['title'] for s in rendered if s['type'] == TextBlock]
         strContent = "".join(strings)
 
-        commonAttrs = {
-            'title': strContent,
-            'children': children
-        }
-
         # Figure out which type of block we need to render
         if re.match(r'\d', token.leader): #Contains a number
-            return {
-                'type': NumberedListBlock,
-                **commonAttrs
-            }
-
+            return BlockDescriptor(NumberedListBlock,
+                title=strContent,
+                children=children
+            )
         match = re.match(r"^\[([x ])\][ \t]", strContent, re.I)
         if match:
             # Handle GFM checkboxes as TodoBlocks
-            return {
-                'type': TodoBlock,
-                'checked': match[1] != " ",
-                **commonAttrs,
+            return BlockDescriptor(TodoBlock,
+                checked=match[1] != " ",
                 # We want everything but the checkbox text, so remove
                 # the full match width from the string
-                'title': strContent[len(match[0]):]
-            }
-
-        return {
-            'type': BulletedListBlock,
-            **commonAttrs
-        }
+                title=strContent[len(match[0]):],
+                children=children
+            )
+        return BlockDescriptor(BulletedListBlock,
+            title=strContent,
+            children=children
+        )
     def render_table(self, token):
         headerRow = self.render(token.header) #Header is a single row
         rows = [self.render(r) for r in token.children] #don't use renderMultiple because it flattens
 
-        def randColId():
-            def randChr():
-                #ASCII 32 - 126 is ' ' to '~', all printable characters
-                return chr(random.randrange(32,126))
-            #4 characters long of random printable characters, I don't think it
-            #has any correlation to the data?
-            return "".join([randChr() for c in range(4)])
+        def colId(idx):
+            #4 printable characters (ASCII 32 - 125, ' ' to '}') like Notion.so's
+            #own ids, derived from the column so converting the same table always
+            #gives the same schema
+            for salt in count():
+                digest = hashlib.sha256(f"{idx}\0{headerRow[idx]}\0{salt}".encode("utf-8")).digest()
+                newId = "".join(chr(32 + b % 94) for b in digest[:4])
+                if newId not in schema:
+                    return newId
         def textColSchema(colName):
             return { 'name' : colName, 'type': 'text' }
         #The schema is basically special identifiers + the type of property
@@ -291,7 +439,9 @@ class NotionPyRenderer(BaseRenderer):
         #     'name': 'Column',
         #     'type': 'text'
         # },
-        schema = { randColId() : textColSchema(headerRow[r]) for r in range(len(headerRow) - 1) }
+        schema = {}
+        for r in range(len(headerRow) - 1):
+            schema[colId(r)] = textColSchema(headerRow[r])
         #The last one needs to be named 'Title' and is type title
         # 'title': {
         #     'name': 'Name',
@@ -306,11 +456,10 @@ class NotionPyRenderer(BaseRenderer):
 
         #CollectionViewBlock, and it's gonna be a bit hard to do because this
         #isn't fully fleshed out in notion-py yet but we can still use create_record
-        return {
-            'type': CollectionViewBlock,
-            'rows': rows, #everything except the initial row
-            'schema': schema
-        }
+        return BlockDescriptor(CollectionViewBlock,
+            rows=rows, #everything except the initial row
+            schema=schema
+        )
     def render_table_row(self, token):
         #Rows are a concept in Notion (`CollectionRowBlock`) but notion-py provides
         #another API to use it, `.add_row()` so we just render down to an array
@@ -349,17 +498,27 @@ class NotionPyRenderer(BaseRenderer):
     def render_image(self, token):
         #Alt text
         alt = token.title or self.renderMultipleToString(token.children)[0]
-        return {
-            'type': ImageBlock,
-            'display_source': token.src,
-            'source': token.src,
-            'caption': alt
-        }
+        return BlockDescriptor(ImageBlock,
+            display_source=token.src,
+            source=token.src,
+            caption=alt
+        )
 
     class __HTMLParser(HTMLParser):
+        """
+        Takes the <img>s out of HTML as ImageBlocks (and optionally turns simple
+        inline tags into Notion.so formatting) in a single pass. Made once per
+        renderer and reset() for every fragment. Links stay open between fragments,
+        as every tag of inline HTML is a fragment of its own
+        """
 
         def __init__(self):
+            self._links = []
             super().__init__()
+
+        def reset(self, formatting=False):
+            super().reset()
+            self._formatting = formatting
             self._images = []
             self._html   = []
 
@@ -367,39 +526,78 @@ class NotionPyRenderer(BaseRenderer):
             return (''.join(self._html), self._images)
 
         def handle_starttag(self, tag, attrs):
+            if self._formatting and tag in HTML_FORMATTING_TAGS:
+                self._html.append(HTML_FORMATTING_TAGS[tag])
+                return
+            if self._formatting and tag == "a":
+                href = next((value for key, value in attrs if key == "href"), None)
+                self._links.append(href)
+                if href:
+                    self._html.append("[")
+                return
             if tag != "img": 
                 self._html.append(self.get_starttag_text())
                 return
 
             src = next((value for key, value in attrs if key == "src"), "")
             alt = next((value for key, value in attrs if key == "alt"), None)
-            image = {
-                'type': ImageBlock,
-                'display_source': src,
-                'source': src,
-                'caption': alt
-            }
+            image = BlockDescriptor(ImageBlock,
+                display_source=src,
+                source=src,
+                caption=alt
+            )
             self._images.append(image)
 
+        def handle_startendtag(self, tag, attrs):
+            #Self closing tags (<br/>) don't get an end tag
+            if tag != "img" and not (self._formatting and (tag in HTML_FORMATTING_TAGS or tag == "a")):
+                self._html.append(self.get_starttag_text())
+                return
+            self.handle_starttag(tag, attrs)
+            if tag == "a":
+                self.handle_endtag(tag)
+
         def handle_endtag(self, tag):
+            if self._formatting and tag in HTML_FORMATTING_TAGS:
+                self._html.append(HTML_FORMATTING_TAGS[tag])
+                return
+            if self._formatting and tag == "a":
+                href = self._links.pop() if self._links else None
+                if href:
+                    self._html.append(f"]({href})")
+                return
             if tag != "img": 
                 self._html.append(f'</{tag}>')
 
         def handle_data(self, data):
             self._html.append(data)
 
-    def render_html(self, token):
+    def render_html(self, token, formatting=False):
+        """
+        @param {HTMLBlock|HTMLSpan} token
+        @param {bool} [formatting=False] Whether to turn simple inline tags into
+        Notion.so formatting
+        @returns {BlockDescriptor[]} A TextBlock with the HTML (if it's not just
+        whitespace), then ImageBlocks for every <img> in it
+        """
         content = token.content
-        parser = self.__HTMLParser()
+        if not formatting and not HTML_NEEDS_PARSING_RE.search(content):
+            #Nothing the parser would take out or change
+            return [BlockDescriptor(TextBlock, title=content)] if content.strip() != "" else []
+
+        parser = getattr(self, "_htmlParser", None)
+        if parser is None:
+            parser = self._htmlParser = self.__HTMLParser()
+        parser.reset(formatting)
         parser.feed(content)
+        parser.close() #Keeps anything left over (like a "<" at the end) as text
         strippedContent, images = parser.get_result()
 
         ret = images
         if strippedContent.strip() != "":
-            ret.insert(0, {
-                'type': TextBlock,
-                'title': strippedContent
-            })
+            ret.insert(0, BlockDescriptor(TextBlock,
+                title=strippedContent
+            ))
         return ret
 
     def render_html_block(self, token):
@@ -410,18 +608,48 @@ class NotionPyRenderer(BaseRenderer):
         assert not hasattr(token, "children")
         return self.render_html(token)
 
+    def render_formatted_html_block(self, token):
+        assert not hasattr(token, "children")
+        return self.render_html(token, formatting=True)
+
+    def render_formatted_html_span(self, token):
+        assert not hasattr(token, "children")
+        return self.render_html(token, formatting=True)
+
     def render_block_equation(self, token):
         def blockFunc(blockStr):
-            return {
-                'type': EquationBlock,
-                'title_plaintext': blockStr.replace('\\', '\\\\')
-            }
+            return BlockDescriptor(EquationBlock,
+                title_plaintext=blockStr.replace('\\', '\\\\')
+            )
         return self.renderMultipleToStringAndCombine(token.children, blockFunc)
 
     def render_inline_equation(self, token):
         return self.renderMultipleToStringAndCombine(token.children, lambda s: f"$${s}$$")
 
 
+#Anything in HTML that the parser would take out (<img>s, comments, unclosed
+#<script>s...) or change (character references, end tags that aren't lowercase...),
+#so it needs parsing
+HTML_NEEDS_PARSING_RE = re.compile(r"<(?i:img\b|script|style)|<[!?]|&|</[^>]*[^a-z0-9>]")
+
+#Inline HTML tags and the Notion.so (markdown-like) formatting they turn into
+HTML_FORMATTING_TAGS = {
+    "b": "**",
+    "strong": "**",
+    "i": "*",
+    "em": "*",
+    "code": "`",
+    "s": "~",
+    "strike": "~",
+    "del": "~",
+}
+
+class FormattedHTMLBlock(HTMLBlock):
+    """An HTMLBlock whose simple inline tags are turned into Notion.so formatting"""
+
+class FormattedHTMLSpan(HTMLSpan):
+    """An HTMLSpan whose simple inline tags are turned into Notion.so formatting"""
+
 class InlineEquation(SpanToken):
     pattern = re.compile(r"(?<!\\|\$)(?:\\\\)*(\$+)(?!\$)(.+?)(?<!\$)\1(?!\$)", re.DOTALL)
     parse_inner = True
@@ -1,5 +1,5 @@
 import sys
-from .upload import cli
+from .cli import cli
 
 if __name__ == "__main__":
     cli(sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,160 @@
+import asyncio
+import mimetypes
+import os.path
+import re
+import aiohttp
+from notion.block import EmbedOrUploadBlock
+from notion.settings import API_BASE_URL, S3_URL_PREFIX
+from .operations import newId, blockOperations, attrOperations
+from .upload import relativePathForMarkdownUrl
+
+
+class AsyncNotionClient:
+    """
+    A minimal non-blocking Notion.so client that can only do what md2notion needs
+    to upload: submit transactions and upload files. All requests share one pool of
+    connections and at most maxConcurrency of them are in flight at once, no matter
+    how many uploads are using the client. Needs the "async" extra
+    (pip install md2notion[async]).
+    Use it as an async context manager:
+        async with AsyncNotionClient(token_v2) as client:
+            await uploadAsync(client, convert(mdFile), pageId, mdFile.name)
+    """
+
+    def __init__(self, token_v2, maxConcurrency=8, apiBaseUrl=API_BASE_URL):
+        """
+        @param {str} token_v2 The token for your Notion.so session
+        @param {int} [maxConcurrency=8] The max number of requests in flight at once
+        @param {str} [apiBaseUrl=API_BASE_URL] Where to send API requests (e.g. to a
+        local stand-in server for testing)
+        """
+        self._token = token_v2
+        self._maxConcurrency = maxConcurrency
+        self._apiBaseUrl = apiBaseUrl
+        self._session = None
+        self._semaphore = None
+        self.userId = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self._maxConcurrency)
+        #token_v2 is only sent with the API requests (not the S3 uploads), and no
+        #cookies are kept that could be sent along with the uploads
+        self._session = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar(),
+            connector=aiohttp.TCPConnector(limit=self._maxConcurrency))
+        records = (await self.post("loadUserContent", {}))["recordMap"]
+        self.userId = list(records["notion_user"].keys())[0]
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self._session.close()
+
+    async def post(self, endpoint, data):
+        """
+        POSTs to a Notion.so API endpoint
+        @returns {dict} The JSON response
+        """
+        async with self._semaphore:
+            async with self._session.post(self._apiBaseUrl + endpoint, json=data,
+                headers={ "Cookie": f"token_v2={self._token}" }) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    async def submitTransaction(self, operations):
+        if operations:
+            await self.post("submitTransaction", { "operations": operations })
+
+    async def uploadFile(self, path):
+        """
+        Uploads a local file to Notion.so, see fileUploads.uploadFileToNotion()
+        @returns {str} The Notion.so hosted url of the file
+        """
+        mimetype = mimetypes.guess_type(path)[0] or "text/plain"
+        fileName = os.path.split(path)[-1]
+        data = await self.post("getUploadFileUrl",
+            { "bucket": "secure", "name": fileName, "contentType": mimetype })
+        fileBytes = await asyncio.get_event_loop().run_in_executor(None, readBytes, path)
+        async with self._semaphore:
+            async with self._session.put(data["signedPutUrl"], data=fileBytes,
+                headers={ "Content-type": mimetype }) as response:
+                response.raise_for_status()
+        return data["url"]
+
+def readBytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def localFilePath(imgRelSrc, mdFilePath, imagePathFunc=None):
+    """
+    The local file to upload for an EmbedOrUploadBlock's source, like uploadFileForBlock()
+    @returns {str|None} The path, or None if it's an external url or not found
+    """
+    if re.search(r"(?<!file)://", imgRelSrc, re.I):
+        return None
+    imgSrc = imagePathFunc(imgRelSrc, mdFilePath) if imagePathFunc \
+        else relativePathForMarkdownUrl(imgRelSrc, mdFilePath)
+    if not imgSrc:
+        print(f"ERROR: Local image '{imgRelSrc}' not found to upload. Skipping...")
+        return None
+    return str(imgSrc)
+
+async def uploadAsync(client, rendered, pageId, mdFilePath, imagePathFunc=None, batchSize=100):
+    """
+    Uploads block descriptors from convert() as children of the page with pageId,
+    like uploadBlocksBatched() but without blocking the event loop.
+    The blocks of a single call are created in order, batchSize blocks per transaction.
+    Local files upload concurrently with that and the blocks are pointed at them at
+    the end. Run many of these at once (with asyncio.gather()) on the same client to
+    upload many documents concurrently.
+    @param {AsyncNotionClient} client The client to upload with
+    @param {dict[]} rendered Block descriptors, output from convert()
+    @param {str} pageId The id of the page to add the blocks to
+    @param {string} mdFilePath The path to the markdown file to find images with
+    @param {callable|None) [imagePathFunc=None] See upload()
+    @param {int} [batchSize=100] The max number of blocks in a single transaction
+    @returns {tuple[]} (path, Exception) for every file that failed to upload
+    """
+    #Flatten the tree depth first, parents are always created before their children
+    pending = []
+    def addPending(descriptors, parentId):
+        for descriptor in descriptors:
+            blockId = newId()
+            pending.append((descriptor, blockId, parentId))
+            addPending(descriptor.get("children") or [], blockId)
+    addPending(rendered, pageId)
+
+    async def uploadFile(blockClass, blockId, path):
+        return (blockClass, blockId, await client.uploadFile(path))
+    uploads = []
+    uploadPaths = []
+    for descriptor, blockId, parentId in pending:
+        if issubclass(descriptor["type"], EmbedOrUploadBlock):
+            path = localFilePath(descriptor["source"], mdFilePath, imagePathFunc)
+            if path:
+                uploads.append(asyncio.ensure_future(uploadFile(descriptor["type"], blockId, path)))
+                uploadPaths.append(path)
+
+    try:
+        for start in range(0, len(pending), batchSize):
+            await client.submitTransaction([op \
+                for descriptor, blockId, parentId in pending[start:start + batchSize] \
+                for op in blockOperations(descriptor, blockId, parentId, client.userId)])
+    except BaseException:
+        for upload in uploads:
+            upload.cancel()
+        raise
+
+    errors = []
+    fileOps = []
+    results = await asyncio.gather(*uploads, return_exceptions=True)
+    for path, result in zip(uploadPaths, results):
+        if isinstance(result, Exception):
+            errors.append((path, result))
+            continue
+        blockClass, blockId, url = result
+        fileOps += attrOperations(blockClass, blockId, {
+            "display_source": url,
+            "source": url,
+            "file_id": url[len(S3_URL_PREFIX):].split("/")[0]
+        })
+    await client.submitTransaction(fileOps)
+    return errors
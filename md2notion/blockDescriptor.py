@@ -0,0 +1,76 @@
+from collections.abc import MutableMapping
+
+#The keys block descriptors usually have, stored in slots
+DESCRIPTOR_KEYS = ("type", "title", "title_plaintext", "language", "checked", "caption",
+    "display_source", "source", "children", "schema", "rows")
+_DESCRIPTOR_KEYS = frozenset(DESCRIPTOR_KEYS)
+
+class BlockDescriptor(MutableMapping):
+    """
+    A block for notion-py to upload, output from NotionPyRenderer. 'type' is the
+    notion-py Block subclass and every other key is an attribute to set on it, except
+    'children' (more BlockDescriptors) and 'schema' and 'rows' (for CollectionViewBlocks).
+    It keeps the usual keys in slots instead of a dict (any other keys go in a dict
+    of their own) but otherwise works like, and compares equal to, the dict it
+    replaces.
+    """
+    __slots__ = DESCRIPTOR_KEYS + ("_extra",)
+
+    def __init__(self, type, **attrs):
+        """
+        @param {type} type The notion-py Block subclass
+        @param attrs The rest of the keys
+        """
+        self.type = type
+        for key, val in attrs.items():
+            if key in _DESCRIPTOR_KEYS:
+                setattr(self, key, val)
+            else:
+                self[key] = val
+
+    def __getitem__(self, key):
+        if key in _DESCRIPTOR_KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        extra = getattr(self, "_extra", None)
+        if extra is None:
+            raise KeyError(key)
+        return extra[key]
+
+    def __setitem__(self, key, val):
+        if key in _DESCRIPTOR_KEYS:
+            setattr(self, key, val)
+            return
+        extra = getattr(self, "_extra", None)
+        if extra is None:
+            extra = self._extra = {}
+        extra[key] = val
+
+    def __delitem__(self, key):
+        if key in _DESCRIPTOR_KEYS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        extra = getattr(self, "_extra", None)
+        if extra is None:
+            raise KeyError(key)
+        del extra[key]
+
+    def __iter__(self):
+        for key in DESCRIPTOR_KEYS:
+            if hasattr(self, key):
+                yield key
+        yield from getattr(self, "_extra", None) or ()
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return f"BlockDescriptor({dict(self)!r})"
+
+    def copy(self):
+        return BlockDescriptor(**self)
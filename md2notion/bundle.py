@@ -0,0 +1,127 @@
+import gzip
+import importlib
+import json
+from notion.block import BLOCK_TYPES, Block
+from .blockDescriptor import BlockDescriptor
+
+#Bump when the bundle format changes in a way older versions can't read
+BUNDLE_VERSION = 1
+#The only modules block classes are imported from when reading a bundle, so a
+#bundle can't import (and run) anything else
+BLOCK_MODULES = ("notion.block", "md2notion")
+
+def blockClassName(blockClass):
+    """
+    @param {type} blockClass The notion-py Block subclass
+    @returns {str} The name to store it as, its Notion.so type (like "text") for
+    notion-py's own classes and "module:Class" for anything else (which can only
+    be read back from BLOCK_MODULES)
+    """
+    if BLOCK_TYPES.get(getattr(blockClass, "_type", None)) is blockClass:
+        return blockClass._type
+    return f"{blockClass.__module__}:{blockClass.__qualname__}"
+
+def blockClassFromName(name, trusted=False):
+    """
+    @param {str} name A name from blockClassName()
+    @param {bool} [trusted=False] Whether name comes from md2notion itself (like a
+    ConvertCache), so it can be from any module and not just BLOCK_MODULES
+    @returns {type} The notion-py Block subclass
+    @throws {ValueError} If name isn't a Block subclass (in one of BLOCK_MODULES
+    if it's not trusted)
+    """
+    if ":" not in name:
+        return BLOCK_TYPES[name]
+    moduleName, qualname = name.split(":", 1)
+    if not trusted and not any(moduleName == m or moduleName.startswith(m + ".") for m in BLOCK_MODULES):
+        raise ValueError(f"Block class {name} isn't from {' or '.join(BLOCK_MODULES)}")
+    obj = importlib.import_module(moduleName)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr, None)
+    if not isinstance(obj, type) or not issubclass(obj, Block):
+        raise ValueError(f"{name} isn't a notion-py Block class")
+    return obj
+
+def descriptorToJson(blockDescriptor):
+    """
+    @param {BlockDescriptor} blockDescriptor A block descriptor, output from NotionPyRenderer
+    @returns {dict} The descriptor (and its children) as plain JSON data
+    """
+    data = dict(blockDescriptor)
+    data["type"] = blockClassName(blockDescriptor["type"])
+    if data.get("children"):
+        data["children"] = [descriptorToJson(c) for c in data["children"]]
+    return data
+
+def descriptorFromJson(data, trusted=False):
+    """
+    @param {dict} data Output from descriptorToJson()
+    @param {bool} [trusted=False] See blockClassFromName()
+    @returns {BlockDescriptor}
+    """
+    data = dict(data)
+    if data.get("children"):
+        data["children"] = [descriptorFromJson(c, trusted) for c in data["children"]]
+    data["type"] = blockClassFromName(data["type"], trusted)
+    return BlockDescriptor(**data)
+
+def openBundle(path, mode="r"):
+    """
+    Opens a bundle file for reading ("r") or writing ("w"), gzipped if path ends in .gz
+    @returns {file}
+    """
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def writeBundle(bundleFile, documents):
+    """
+    Writes converted markdown documents to a bundle, a JSON Lines file. The first
+    line is a header, then every document is a line describing it followed by a
+    line for each of its top level block descriptors. Everything is written as it
+    comes in, so documents can be converted with convertStream() while writing
+    @param {file} bundleFile The file to write to, see openBundle()
+    @param {iterable} documents (mdPath, mdFileName, block descriptors) tuples
+    """
+    def writeLine(data):
+        bundleFile.write(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+        bundleFile.write("\n")
+    writeLine({ "md2notion": BUNDLE_VERSION })
+    for mdPath, mdFileName, rendered in documents:
+        writeLine({ "document": { "path": mdPath, "name": mdFileName } })
+        for blockDescriptor in rendered:
+            writeLine(descriptorToJson(blockDescriptor))
+
+def readBundle(bundleFile):
+    """
+    Reads the documents in a bundle from writeBundle(). Each document's block
+    descriptors are read as they're iterated over (and skipped if they aren't)
+    @param {file} bundleFile The file to read from, see openBundle()
+    @returns {iterator} (mdPath, mdFileName, block descriptor iterator) tuples
+    """
+    lines = (json.loads(line) for line in bundleFile if line.strip())
+    header = next(lines, None)
+    if not header or "md2notion" not in header:
+        raise ValueError("Not an md2notion bundle")
+    if header["md2notion"] > BUNDLE_VERSION:
+        raise ValueError(f"Bundle version {header['md2notion']} is newer than this md2notion "
+            f"can read ({BUNDLE_VERSION})")
+
+    nextDocument = next(lines, None)
+    def descriptors():
+        nonlocal nextDocument
+        nextDocument = None
+        for data in lines:
+            if "document" in data:
+                nextDocument = data
+                return
+            yield descriptorFromJson(data)
+
+    while nextDocument:
+        if "document" not in nextDocument:
+            raise ValueError("Bundle has block descriptors outside of a document")
+        document = nextDocument["document"]
+        rendered = descriptors()
+        yield (document["path"], document["name"], rendered)
+        for blockDescriptor in rendered: #Skip whatever wasn't read
+            pass
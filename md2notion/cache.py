@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from .NotionPyRenderer import rendererName
+from .bundle import descriptorToJson, descriptorFromJson
+
+#Bump when what the renderer outputs changes, so conversions cached by older
+#versions aren't used
+CONVERT_CACHE_VERSION = 2
+
+
+def userCacheDir():
+    """
+    Gets the directory md2notion keeps its caches in between runs
+    @returns {Path} $XDG_CACHE_HOME/md2notion, %LOCALAPPDATA%/md2notion or ~/.cache/md2notion
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+    return (Path(base) if base else Path.home() / ".cache") / "md2notion"
+
+def hashFile(path):
+    """
+    @param {str|Path} path The path to the file to hash
+    @returns {str} Hex sha256 of the file's contents
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SqliteCache:
+    """
+    A persistent map kept in a SQLite table, that can forget the entries that
+    haven't been used in a while. The caches below are built on it, each setting
+    fileName, table, keyColumn and columns. Safe to use from multiple threads.
+    """
+    fileName = None #The database in userCacheDir() when no path is given
+    table = None
+    keyColumn = None
+    columns = None #The SQL for the columns after keyColumn, before lastUsed
+
+    def __init__(self, path=None, maxAge=None, maxEntries=None):
+        """
+        @param {str|Path|None} [path=None] The SQLite database to use, defaults to
+        fileName in userCacheDir(). Use ":memory:" for a cache that only lasts for
+        this run
+        @param {float|None} [maxAge=None] See evict()
+        @param {int|None} [maxEntries=None] See evict()
+        """
+        if path is None:
+            path = userCacheDir() / self.fileName
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                f"({self.keyColumn} TEXT PRIMARY KEY, {self.columns}, lastUsed REAL NOT NULL)")
+        self.evict(maxAge, maxEntries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _get(self, key, columns):
+        """
+        @param {str} key
+        @param {str} columns The SQL for the columns to get
+        @returns {tuple|None} The columns of key's row, None if there isn't one.
+        Marks it as used
+        """
+        with self._lock, self._db:
+            row = self._db.execute(f"SELECT {columns} FROM {self.table} WHERE {self.keyColumn} = ?",
+                (key,)).fetchone()
+            if row:
+                self._db.execute(f"UPDATE {self.table} SET lastUsed = ? WHERE {self.keyColumn} = ?",
+                    (time.time(), key))
+        return row
+
+    def _set(self, key, *values):
+        """
+        @param {str} key
+        @param values The rest of key's row, up to lastUsed
+        """
+        with self._lock, self._db:
+            self._db.execute(f"INSERT OR REPLACE INTO {self.table} VALUES "
+                f"({', '.join('?' * (len(values) + 2))})", (key, *values, time.time()))
+
+    def _delete(self, key):
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM {self.table} WHERE {self.keyColumn} = ?", (key,))
+
+    def clear(self):
+        """
+        Forgets every entry
+        """
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM {self.table}")
+
+    def evict(self, maxAge=None, maxEntries=None):
+        """
+        Forgets entries that haven't been used in a while
+        @param {float|None} [maxAge=None] Forget entries not used in this many seconds
+        @param {int|None} [maxEntries=None] Keep at most this many of the most
+        recently used entries
+        """
+        with self._lock, self._db:
+            if maxAge is not None:
+                self._db.execute(f"DELETE FROM {self.table} WHERE lastUsed < ?",
+                    (time.time() - maxAge,))
+            if maxEntries is not None:
+                self._db.execute(f"DELETE FROM {self.table} WHERE {self.keyColumn} NOT IN "
+                    f"(SELECT {self.keyColumn} FROM {self.table} ORDER BY lastUsed DESC LIMIT ?)",
+                    (maxEntries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class UploadCache(SqliteCache):
+    """
+    A persistent map of file content hashes to the Notion.so hosted url that the
+    file was uploaded to, so the same file never has to be uploaded twice.
+    Uploaded files belong to a workspace, so they're cached by the id of the
+    workspace too and only reused in the same one.
+    Defaults to uploads.sqlite in userCacheDir(), see SqliteCache.
+    """
+    fileName = "uploads.sqlite"
+    table = "uploads"
+    keyColumn = "hash"
+    columns = "url TEXT NOT NULL"
+
+    @staticmethod
+    def key(fileHash, spaceId=None):
+        """
+        @returns {str} The key to cache the file with fileHash by, for the workspace spaceId
+        """
+        return f"{spaceId}:{fileHash}" if spaceId else fileHash
+
+    def get(self, fileHash, spaceId=None):
+        """
+        @param {str} fileHash The hash of the file, from hashFile()
+        @param {str|None} [spaceId=None] The id of the workspace it's for
+        @returns {str|None} The url the file was uploaded to, or None if it's not cached
+        """
+        row = self._get(self.key(fileHash, spaceId), "url")
+        return row[0] if row else None
+
+    def set(self, fileHash, url, spaceId=None):
+        """
+        @param {str} fileHash The hash of the file, from hashFile()
+        @param {str} url The url the file was uploaded to
+        @param {str|None} [spaceId=None] The id of the workspace it was uploaded to
+        """
+        self._set(self.key(fileHash, spaceId), url)
+
+    def invalidate(self, fileHash, spaceId=None):
+        """
+        Forgets a single file, e.g. if the block it was uploaded to has been
+        deleted permanently
+        @param {str} fileHash The hash of the file, from hashFile()
+        @param {str|None} [spaceId=None] The id of the workspace it was uploaded to
+        """
+        self._delete(self.key(fileHash, spaceId))
+
+
+class ConvertCache(SqliteCache):
+    """
+    A persistent map of markdown text (and the renderer it was converted with) to
+    the block descriptors it converts to, so files that haven't changed don't have
+    to be parsed again. The renderer is keyed by its name (see rendererName()), so
+    clear() the cache after changing a custom renderer. Defaults to
+    conversions.sqlite in userCacheDir(), see SqliteCache.
+    """
+    fileName = "conversions.sqlite"
+    table = "conversions"
+    keyColumn = "key"
+    columns = "descriptors BLOB NOT NULL"
+
+    @staticmethod
+    def key(mdText, notionPyRendererCls):
+        """
+        @param {str} mdText The markdown
+        @param {NotionPyRenderer} notionPyRendererCls The renderer to convert it with
+        @returns {str} The key to cache its conversion by
+        """
+        h = hashlib.sha256(f"{CONVERT_CACHE_VERSION}\0{rendererName(notionPyRendererCls)}\0".encode("utf-8"))
+        h.update(mdText.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        @param {str} key From key()
+        @returns {BlockDescriptor[]|None} The block descriptors, or None if it's not cached
+        """
+        row = self._get(key, "descriptors")
+        if not row:
+            return None
+        #Written by this process or an earlier run, so custom renderers' block classes are fine
+        return [descriptorFromJson(d, trusted=True) for d in json.loads(zlib.decompress(row[0]))]
+
+    def set(self, key, rendered):
+        """
+        @param {str} key From key()
+        @param {BlockDescriptor[]} rendered The block descriptors it converted to,
+        from convertText()
+        """
+        self._set(key, zlib.compress(json.dumps([descriptorToJson(d) for d in rendered],
+            separators=(",", ":")).encode("utf-8")))
+
+
+class UrlCache(SqliteCache):
+    """
+    A persistent map of urls to the last response fetched from them (its body and
+    its ETag and Last-Modified validators), so a url can be fetched conditionally
+    and its body reused when the server says it hasn't changed (304).
+    Defaults to urls.sqlite in userCacheDir(), see SqliteCache.
+    """
+    fileName = "urls.sqlite"
+    table = "urls"
+    keyColumn = "url"
+    columns = "etag TEXT, lastModified TEXT, body BLOB NOT NULL"
+
+    def get(self, url):
+        """
+        @param {str} url
+        @returns {tuple|None} (etag, lastModified, body) from the last time url was
+        fetched, or None if it's not cached
+        """
+        row = self._get(url, "etag, lastModified, body")
+        if not row:
+            return None
+        etag, lastModified, body = row
+        return (etag, lastModified, zlib.decompress(body).decode("utf-8"))
+
+    def set(self, url, etag, lastModified, body):
+        """
+        @param {str} url
+        @param {str|None} etag The ETag header of the response
+        @param {str|None} lastModified The Last-Modified header of the response
+        @param {str} body The text of the response
+        """
+        self._set(url, etag, lastModified, zlib.compress(body.encode("utf-8")))
@@ -0,0 +1,437 @@
+import argparse
+import os.path
+import sys
+import threading
+from functools import partial
+from . import instrument
+
+#The command line interface. Only argparse is imported up front, so --help (and a
+#typo in the arguments) doesn't wait on notion-py, requests and mistletoe. Everything
+#else is imported once the arguments are parsed, and only what the command needs
+#(convert never loads the rate limiter, the journal or Pillow).
+
+def addModeArguments(parser):
+    parser.add_argument('--create', action='store_const', dest='mode', const='create',
+                        help='Create a new child page (default)')
+    parser.add_argument('--append', action='store_const', dest='mode', const='append',
+                        help='Append to page instead of creating a child page')
+    parser.add_argument('--clear-previous', action='store_const', dest='mode', const='clear',
+                        help='Clear a previous child page with the same name if it exists')
+    parser.add_argument('--sync', action='store_const', dest='mode', const='sync',
+                        help='Update a previous child page with the same name in place, only '
+                        'changing the blocks that differ (creates it if it doesn\'t exist)')
+    parser.set_defaults(mode='create')
+
+def addRendererArguments(parser):
+    parser.add_argument('--html-img', action='store_true', default=False,
+                        help="Upload images in HTML <img> tags (disabled by default)")
+    parser.add_argument('--html-formatting', action='store_true', default=False,
+                        help="Like --html-img, but also turn <b>, <i>, <code>, <s> and <a> tags into "
+                        "Notion.so formatting")
+    parser.add_argument('--latex', action='store_true', default=False,
+                        help="Support for latex inline ($..$) and block ($$..$$) equations (disabled by default)")
+    parser.add_argument('--convert-cache', action='store_true', default=False,
+                        help="Reuse the conversion of files that haven't changed since this or a previous "
+                        "run instead of converting them again")
+    parser.add_argument('--convert-cache-path', type=str, default=None, metavar='PATH',
+                        help="Keep the --convert-cache in the cache database at PATH (implies --convert-cache)")
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help="Convert files a chunk at a time as they're uploaded, so very big files don't "
+                        "have to be held in memory. Reference-style links can only use definitions from "
+                        "before them")
+
+def addFetchArguments(parser):
+    parser.add_argument('--fetch-workers', type=int, default=8, metavar='N',
+                        help="Download up to N Markdown urls at once (default 8)")
+    parser.add_argument('--url-cache', action='store_true', default=False,
+                        help="Remember downloaded Markdown urls and only download them again if they changed")
+    parser.add_argument('--url-cache-path', type=str, default=None, metavar='PATH',
+                        help="Keep the --url-cache in the cache database at PATH (implies --url-cache)")
+
+def addUploadArguments(parser):
+    parser.add_argument('--batch-size', type=int, default=None, metavar='N',
+                        help="Upload N blocks per Notion.so transaction instead of one block at a time")
+    parser.add_argument('--upload-workers', type=int, default=None, metavar='N',
+                        help="Upload up to N local images at once while creating the blocks")
+    parser.add_argument('--upload-cache', action='store_true', default=False,
+                        help="Reuse local images that were already uploaded in this or a previous run "
+                        "instead of uploading them again")
+    parser.add_argument('--upload-cache-path', type=str, default=None, metavar='PATH',
+                        help="Keep the --upload-cache in the cache database at PATH (implies --upload-cache)")
+    parser.add_argument('--upload-cache-max-age', type=float, default=None, metavar='DAYS',
+                        help="Forget cached uploads that haven't been used in DAYS days")
+    parser.add_argument('--rate-limit', type=float, default=None, metavar='N',
+                        help="Send at most N requests per second to Notion.so (across all workers)")
+    parser.add_argument('--max-retries', type=int, default=5, metavar='N',
+                        help="Retry requests that are rate limited or fail with a transient error "
+                        "up to N times (default 5)")
+    parser.add_argument('--resume', type=str, default=None, metavar='PATH',
+                        help="Record what's uploaded in the journal at PATH and, if it already exists, "
+                        "resume the upload it records, skipping everything that was already uploaded")
+    parser.add_argument('--ignore-case-paths', action='store_true', default=False,
+                        help="Find local images whose file name only matches in a different case")
+    parser.add_argument('--optimize-images', action='store_true', default=False,
+                        help="Downscale and recompress large local images before uploading them, caching "
+                        "the results. Needs Pillow")
+    parser.add_argument('--optimize-images-path', type=str, default=None, metavar='DIR',
+                        help="Cache the --optimize-images results in the directory DIR (implies --optimize-images)")
+    parser.add_argument('--image-max-size', type=float, default=1, metavar='MB',
+                        help="With --optimize-images, recompress images larger than MB megabytes (default 1)")
+    parser.add_argument('--image-max-dimension', type=int, default=2000, metavar='PX',
+                        help="With --optimize-images, downscale images larger than PX pixels on their "
+                        "longest side (default 2000)")
+    parser.add_argument('--image-format', type=str, default='webp', choices=['webp', 'jpeg'],
+                        help="With --optimize-images, what to recompress images to (default webp)")
+
+def addStatsArguments(parser):
+    parser.add_argument('--stats', type=str, default=None, metavar='PATH',
+                        help="Write how long everything took (per token type, block type, file...) "
+                        "as JSON to PATH")
+    parser.add_argument('--slowest', type=int, default=None, metavar='N',
+                        help="Print the N slowest conversions, blocks and file uploads at the end")
+
+def statsSinksFromArgs(args, progress=False):
+    """
+    Adds the instrument sinks for the addStatsArguments() arguments
+    @param {bool} [progress=False] Whether to also print the progress of uploads
+    @returns {list} The sinks, to pass to writeStats() at the end
+    """
+    sinks = []
+    if args.stats:
+        sinks.append(instrument.StatsSink())
+    if args.slowest:
+        sinks.append(instrument.SlowestSink(args.slowest))
+    if progress:
+        sinks.append(instrument.ProgressSink())
+    for sink in sinks:
+        instrument.addSink(sink)
+    return sinks
+
+def writeStats(args, sinks):
+    """
+    Writes and prints the reports of the statsSinksFromArgs() sinks and removes them
+    """
+    for sink in sinks:
+        instrument.removeSink(sink)
+        if isinstance(sink, instrument.StatsSink):
+            sink.write(args.stats)
+            print(f"Wrote stats to {args.stats}")
+        elif isinstance(sink, instrument.SlowestSink):
+            print(f"Slowest {sink.n}:\n{sink.table()}")
+
+def rendererFromArgs(args):
+    """
+    @returns {NotionPyRenderer} The renderer for the addRendererArguments() arguments
+    """
+    from .NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension, addHtmlFormattingExtension, \
+        addLatexExtension
+    notionPyRendererCls = NotionPyRenderer
+    if args.html_formatting:
+        notionPyRendererCls = addHtmlFormattingExtension(notionPyRendererCls)
+    elif args.html_img:
+        notionPyRendererCls = addHtmlImgTagExtension(notionPyRendererCls)
+    if args.latex:
+        notionPyRendererCls = addLatexExtension(notionPyRendererCls)
+    return notionPyRendererCls
+
+def convertCacheFromArgs(args):
+    """
+    @returns {ConvertCache|None} The cache for the addRendererArguments() arguments
+    """
+    if not args.convert_cache and args.convert_cache_path is None:
+        return None
+    from .cache import ConvertCache
+    return ConvertCache(args.convert_cache_path)
+
+def fetcherFromArgs(args, session=None):
+    """
+    @returns {UrlFetcher} The fetcher for the addFetchArguments() arguments
+    """
+    from .cache import UrlCache
+    from .fetch import UrlFetcher
+    urlCache = UrlCache(args.url_cache_path) if args.url_cache or args.url_cache_path is not None else None
+    return UrlFetcher(session, maxWorkers=args.fetch_workers, urlCache=urlCache)
+
+def uploadCacheFromArgs(args):
+    """
+    @returns {UploadCache|None} The cache for the addUploadArguments() arguments
+    """
+    if not args.upload_cache and args.upload_cache_path is None:
+        return None
+    from .cache import UploadCache
+    maxAge = args.upload_cache_max_age * 24 * 60 * 60 if args.upload_cache_max_age is not None else None
+    return UploadCache(args.upload_cache_path, maxAge=maxAge)
+
+def imageOptimizerFromArgs(args):
+    """
+    @returns {ImageOptimizer|None} The image optimizer for the addUploadArguments() arguments
+    """
+    if not args.optimize_images and args.optimize_images_path is None:
+        return None
+    #Only needs Pillow when it's used
+    from .images import ImageOptimizer
+    return ImageOptimizer(args.optimize_images_path, maxBytes=int(args.image_max_size * 1024 * 1024),
+        maxDimension=args.image_max_dimension, format=args.image_format)
+
+def rateLimiterFromArgs(args, maxConcurrency=8):
+    """
+    @returns {RateLimiter} The limiter for the addUploadArguments() arguments
+    """
+    from .rateLimit import RateLimiter
+    return RateLimiter(rate=args.rate_limit, maxRetries=args.max_retries,
+        maxConcurrency=maxConcurrency)
+
+def journalFromArgs(args):
+    """
+    @returns {UploadJournal|None} The journal for the addUploadArguments() arguments
+    """
+    if not args.resume:
+        return None
+    from .journal import UploadJournal
+    journal = UploadJournal(args.resume)
+    if journal.entries:
+        print(f"Resuming the upload recorded in {args.resume}...")
+    return journal
+
+def imagePathFuncFromArgs(args):
+    """
+    @returns {callable} The imagePathFunc for the addUploadArguments() arguments,
+    which finds images with one PathIndex shared by every file in the run
+    """
+    from .pathIndex import PathIndex
+    from .upload import relativePathForMarkdownUrl
+    return partial(relativePathForMarkdownUrl, pathIndex=PathIndex(args.ignore_case_paths))
+
+def convertCli(argv):
+    parser = argparse.ArgumentParser(prog='md2notion convert',
+        description='Converts Markdown files to a bundle that can be uploaded later with push')
+    parser.add_argument('bundle_path', type=str,
+                        help='the bundle file to write (gzipped if it ends in .gz)')
+    parser.add_argument('md_path_url', type=str, nargs='+',
+                        help='A path, glob, or url to the Markdown file you want to convert')
+    addRendererArguments(parser)
+    addFetchArguments(parser)
+    addStatsArguments(parser)
+    args = parser.parse_args(argv)
+
+    from .bundle import openBundle, writeBundle
+    from .upload import filesFromPathsUrls, convertCached
+    notionPyRendererCls = rendererFromArgs(args)
+    convertCache = convertCacheFromArgs(args)
+    fetcher = fetcherFromArgs(args)
+    sinks = statsSinksFromArgs(args)
+    def documents():
+        for mdPath, mdFileName, mdFile in filesFromPathsUrls(args.md_path_url, fetcher=fetcher):
+            print(f"Converting {mdPath}...")
+            yield (mdPath, mdFileName, convertCached(mdFile, notionPyRendererCls, convertCache, args.stream))
+    with openBundle(args.bundle_path, "w") as bundleFile:
+        writeBundle(bundleFile, documents())
+    writeStats(args, sinks)
+
+def pushCli(argv):
+    parser = argparse.ArgumentParser(prog='md2notion push',
+        description='Uploads bundles made with convert to Notion.so')
+    parser.add_argument('token_v2', type=str,
+                        help='the token for your Notion.so session')
+    parser.add_argument('page_url', type=str,
+                        help='the url of the Notion.so page you want to upload to')
+    parser.add_argument('bundle_path', type=str, nargs='+',
+                        help='A bundle file made with convert')
+    addModeArguments(parser)
+    addUploadArguments(parser)
+    addStatsArguments(parser)
+    args = parser.parse_args(argv)
+
+    from .bundle import openBundle, readBundle
+    from .upload import NotionClient, ChildPages, fileJournal, targetPage, syncDescriptors, \
+        uploadDescriptors
+    uploadCache = uploadCacheFromArgs(args)
+    imageOptimizer = imageOptimizerFromArgs(args)
+    try:
+        rateLimiter = rateLimiterFromArgs(args, args.upload_workers or 1)
+        journal = journalFromArgs(args)
+        imagePathFunc = imagePathFuncFromArgs(args)
+        sinks = statsSinksFromArgs(args, progress=True)
+        print("Initializing Notion.so client...")
+        client = rateLimiter.install(NotionClient(token_v2=args.token_v2))
+        print("Getting target PageBlock...")
+        page = client.get_block(args.page_url)
+        childPages = ChildPages(page) if args.mode != 'append' else None
+
+        for bundlePath in args.bundle_path:
+            with openBundle(bundlePath) as bundleFile:
+                #Images are found relative to the markdown file's original path
+                for mdPath, mdFileName, rendered in readBundle(bundleFile):
+                    mdJournal = fileJournal(journal, mdPath)
+                    if mdJournal and mdJournal.done:
+                        print(f"Skipping {mdPath}, it was already uploaded")
+                        continue
+                    with instrument.timed("file", name=mdPath):
+                        uploadPage, shouldSync = targetPage(page, args.mode, mdFileName, mdJournal, childPages)
+                        if shouldSync:
+                            stats = syncDescriptors(list(rendered), uploadPage, mdPath, imagePathFunc,
+                                args.upload_workers, uploadCache, imageOptimizer)
+                            print(f"Synced {mdPath}: {stats}")
+                            continue
+                        print(f"Uploading {mdPath} to Notion.so at page {uploadPage.title}...")
+                        uploadDescriptors(rendered, uploadPage, mdPath, imagePathFunc, args.batch_size,
+                            args.upload_workers, uploadCache, mdJournal, imageOptimizer)
+        print(f"Requests: {rateLimiter.stats}")
+        writeStats(args, sinks)
+    finally:
+        if imageOptimizer is not None:
+            imageOptimizer.close()
+
+#Subcommands of the cli, anything else is an upload
+SUBCOMMANDS = {
+    'convert': convertCli,
+    'push': pushCli,
+}
+
+def cli(argv):
+    if argv and argv[0] in SUBCOMMANDS:
+        return SUBCOMMANDS[argv[0]](argv[1:])
+
+    parser = argparse.ArgumentParser(description='Uploads Markdown files to Notion.so. '
+        'Use "convert" and "push" as the first argument to convert to a bundle and upload '
+        'it separately')
+    parser.add_argument('token_v2', type=str,
+                        help='the token for your Notion.so session')
+    parser.add_argument('page_url', type=str,
+                        help='the url of the Notion.so page you want to upload your Markdown files to')
+    parser.add_argument('md_path_url', type=str, nargs='+',
+                        help='A path, glob, or url to the Markdown file you want to upload')
+    addModeArguments(parser)
+    addRendererArguments(parser)
+    addFetchArguments(parser)
+    addUploadArguments(parser)
+    addStatsArguments(parser)
+    parser.add_argument('--jobs', '-j', type=int, default=None, metavar='N',
+                        help="Read, convert and upload N files at once (on N processes for converting)")
+    parser.add_argument('--tree', action='store_true', default=False,
+                        help="Mirror the directories of the Markdown files as nested pages (creating "
+                        "--jobs pages at once, 8 by default) and point links between the files at their pages")
+
+    args = parser.parse_args(argv)
+    if args.tree and (args.mode in ('append', 'sync') or args.resume):
+        parser.error("--tree only makes new pages, it can't be used with --append, --sync or --resume")
+    if args.tree and any('://' in p for p in args.md_path_url):
+        parser.error("--tree only mirrors local files and directories, it can't upload urls")
+
+    from .pipeline import runPipeline
+    from .upload import NotionClient, ChildPages, fileJournal, targetPage, clearPreviousPages, \
+        expandPathsUrls, readPathUrl, openPathsUrls, convertCached, sync, syncDescriptors, upload, \
+        uploadDescriptors
+    notionPyRendererCls = rendererFromArgs(args)
+    convertCache = convertCacheFromArgs(args)
+    uploadCache = uploadCacheFromArgs(args)
+    imageOptimizer = imageOptimizerFromArgs(args)
+    try:
+        #Shared by every client and thread so they're all paced together
+        treeJobs = (args.jobs or 8) if args.tree else 1
+        rateLimiter = rateLimiterFromArgs(args, max(args.jobs or 1, treeJobs) * (args.upload_workers or 1))
+        fetcher = fetcherFromArgs(args)
+        journal = journalFromArgs(args)
+        imagePathFunc = imagePathFuncFromArgs(args)
+        sinks = statsSinksFromArgs(args, progress=True)
+
+        print("Initializing Notion.so client...")
+        client = rateLimiter.install(NotionClient(token_v2=args.token_v2))
+        print("Getting target PageBlock...")
+        page = client.get_block(args.page_url)
+        childPages = ChildPages(page) if args.mode != 'append' else None
+
+        mdPaths = []
+        for mdPath, mdFileName in expandPathsUrls(args.md_path_url):
+            if journal and journal.file(mdPath).done:
+                print(f"Skipping {mdPath}, it was already uploaded")
+                continue
+            mdPaths.append((mdPath, mdFileName))
+
+        tree = None
+        if args.tree:
+            from notion.block import PageBlock
+            from .tree import PageTree, treePaths
+            mdPaths = [(mdPath, os.path.basename(mdPath)) for mdPath in treePaths(p for p, n in mdPaths)]
+            tree = PageTree([mdPath for mdPath, mdFileName in mdPaths])
+        if args.mode == 'clear':
+            if tree:
+                childPages.remove(tree.topLevelTitles())
+            else:
+                clearPreviousPages(childPages, mdPaths, journal)
+        if tree:
+            print(f"Creating the pages for {len(mdPaths)} files under {tree.root}...")
+            errors = tree.create(page, lambda: rateLimiter.install(NotionClient(token_v2=args.token_v2)),
+                workers=treeJobs)
+            for path, e in errors:
+                print(f"ERROR: Could not create the page for {path}: {e}")
+            mdPaths = [(mdPath, mdFileName) for mdPath, mdFileName in mdPaths if tree.pageId(mdPath)]
+
+        def pageFor(mdPath, mdFileName, mdJournal):
+            if tree:
+                #Loaded when it's first used, --jobs loads it again on its upload thread's client
+                return (PageBlock(client, tree.pageId(mdPath)), False)
+            return targetPage(page, args.mode, mdFileName, mdJournal, childPages)
+
+        if args.jobs:
+            # notion-py clients can't be written to from multiple threads at once (they
+            # share one transaction), so every upload thread gets its own
+            threadClients = threading.local()
+            def uploadConverted(mdPath, target, rendered):
+                if not hasattr(threadClients, 'client'):
+                    threadClients.client = rateLimiter.install(NotionClient(token_v2=args.token_v2))
+                uploadPage, shouldSync = target
+                #Only the upload, the file was read and converted in the earlier stages
+                with instrument.timed("file", name=mdPath):
+                    uploadPage = threadClients.client.get_block(uploadPage.id)
+                    if tree:
+                        tree.rewriteLinks(rendered, mdPath)
+                    if shouldSync:
+                        stats = syncDescriptors(rendered, uploadPage, mdPath, imagePathFunc, args.upload_workers,
+                            uploadCache, imageOptimizer)
+                        print(f"Synced {mdPath}: {stats}")
+                        return
+                    print(f"Uploading {mdPath} to Notion.so at page {uploadPage.title}...")
+                    uploadDescriptors(rendered, uploadPage, mdPath, imagePathFunc, args.batch_size,
+                        args.upload_workers, uploadCache, fileJournal(journal, mdPath), imageOptimizer)
+
+            errors = runPipeline(mdPaths, partial(readPathUrl, fetcher=fetcher),
+                lambda mdPath, mdFileName: pageFor(mdPath, mdFileName, fileJournal(journal, mdPath)),
+                uploadConverted, notionPyRendererCls, jobs=args.jobs, convertCache=convertCache,
+                #Appending to the same page has to happen in order
+                uploadJobs=1 if args.mode == 'append' else args.jobs)
+            for mdPath, e in errors:
+                print(f"ERROR: Could not upload {mdPath}: {e}")
+            print(f"Requests: {rateLimiter.stats}")
+            writeStats(args, sinks)
+            return
+
+        for mdPath, mdFileName, mdFile in openPathsUrls(mdPaths, fetcher=fetcher):
+            mdJournal = fileJournal(journal, mdPath)
+            with instrument.timed("file", name=mdPath):
+                uploadPage, shouldSync = pageFor(mdPath, mdFileName, mdJournal)
+                if tree:
+                    print(f"Uploading {mdPath} to Notion.so at page {uploadPage.title}...")
+                    rendered = list(convertCached(mdFile, notionPyRendererCls, convertCache, args.stream))
+                    tree.rewriteLinks(rendered, mdPath)
+                    uploadDescriptors(rendered, uploadPage, mdPath, imagePathFunc, args.batch_size,
+                        args.upload_workers, uploadCache, mdJournal, imageOptimizer)
+                    continue
+                if shouldSync:
+                    print(f"Syncing {mdPath} to Notion.so at page {uploadPage.title}...")
+                    stats = sync(mdFile, uploadPage, imagePathFunc, notionPyRendererCls, args.upload_workers,
+                        uploadCache, convertCache, imageOptimizer)
+                    print(f"Synced {mdPath}: {stats}")
+                    continue
+                print(f"Uploading {mdPath} to Notion.so at page {uploadPage.title}...")
+                upload(mdFile, uploadPage, imagePathFunc, notionPyRendererCls, args.batch_size,
+                    args.upload_workers, uploadCache, mdJournal, convertCache, imageOptimizer, args.stream)
+        print(f"Requests: {rateLimiter.stats}")
+        writeStats(args, sinks)
+    finally:
+        if imageOptimizer is not None:
+            imageOptimizer.close()
+
+
+if __name__ == "__main__":
+    cli(sys.argv[1:])
@@ -0,0 +1,103 @@
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+#How long to wait on a server (to connect, and between bytes of the response)
+FETCH_TIMEOUT = 30
+#The largest markdown file to download
+FETCH_MAX_BYTES = 50 * 1024 * 1024
+
+class FetchError(RuntimeError):
+    pass
+
+class UrlFetcher:
+    """
+    Downloads markdown from urls over one pooled session, maxWorkers at a time.
+    With a UrlCache, urls that were fetched before are fetched conditionally (with
+    If-None-Match/If-Modified-Since) and their cached text is used when the server
+    says they haven't changed. Only 2xx (and 304) responses are accepted, and
+    responses larger than maxBytes are cut off with an error.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, session=None, maxWorkers=8, timeout=FETCH_TIMEOUT,
+            maxBytes=FETCH_MAX_BYTES, urlCache=None):
+        """
+        @param {requests.Session|None} [session=None] The session to fetch with, a new
+        one with a connection pool of maxWorkers connections if not given
+        @param {int} [maxWorkers=8] The max number of urls to fetch at once with submit()
+        @param {float} [timeout=FETCH_TIMEOUT] See FETCH_TIMEOUT
+        @param {int} [maxBytes=FETCH_MAX_BYTES] See FETCH_MAX_BYTES
+        @param {UrlCache|None} [urlCache=None] If given, fetch conditionally using the
+        responses cached in it, and cache new responses
+        """
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=maxWorkers, pool_maxsize=maxWorkers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.maxWorkers = maxWorkers
+        self.timeout = timeout
+        self.maxBytes = maxBytes
+        self.urlCache = urlCache
+        self.notModified = 0 #The number of fetches answered with a 304
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def fetch(self, url):
+        """
+        @param {str} url The url to fetch
+        @returns {str} The text at url
+        """
+        cached = self.urlCache.get(url) if self.urlCache is not None else None
+        headers = {}
+        if cached:
+            etag, lastModified, text = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if lastModified:
+                headers["If-Modified-Since"] = lastModified
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as r:
+            if r.status_code == 304 and cached:
+                with self._lock:
+                    self.notModified += 1
+                return text
+            if not 200 <= r.status_code < 300:
+                raise FetchError(f'Could not get file {url}, HTTP {r.status_code}')
+            if int(r.headers.get("Content-Length") or 0) > self.maxBytes:
+                raise FetchError(f'Could not get file {url}, it is larger than {self.maxBytes} bytes')
+            body = bytearray()
+            for chunk in r.iter_content(64 * 1024):
+                body += chunk
+                if len(body) > self.maxBytes:
+                    raise FetchError(f'Could not get file {url}, it is larger than {self.maxBytes} bytes')
+            #Markdown is usually UTF-8, whatever requests guesses for text/* without a charset
+            encoding = r.encoding if "charset" in r.headers.get("Content-Type", "") else "utf-8"
+            text = body.decode(encoding, errors="replace")
+
+        if self.urlCache is not None and (r.headers.get("ETag") or r.headers.get("Last-Modified")):
+            self.urlCache.set(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), text)
+        return text
+
+    def submit(self, url):
+        """
+        Starts fetching url on the fetcher's threads
+        @returns {Future} The future of the text at url
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.maxWorkers)
+        return self._executor.submit(self.fetch, url)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
@@ -0,0 +1,178 @@
+import mimetypes
+import os.path
+import requests
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from notion.settings import S3_URL_PREFIX
+from .cache import hashFile
+from . import instrument
+
+
+def uploadSession(notionClient):
+    """
+    A session for putting files to S3. notion-py's session can't be used for that,
+    it would send the token_v2 cookie (which isn't scoped to any domain) to S3 too
+    @param {NotionClient} notionClient The client the files are for, its RateLimiter
+    (if one is installed) is installed on the new session too
+    @returns {requests.Session} A new session without any cookies
+    """
+    session = requests.Session()
+    clientSession = getattr(notionClient, "session", None)
+    limiter = getattr(clientSession.get_adapter("https://"), "limiter", None) \
+        if isinstance(clientSession, requests.Session) else None
+    if limiter is not None:
+        limiter.install(session)
+    return session
+
+def spaceIdOf(notionClient):
+    """
+    @param {NotionClient} notionClient
+    @returns {str|None} The id of the workspace notionClient's user is in (the
+    files it uploads belong to), None if it doesn't know
+    """
+    return getattr(getattr(notionClient, "current_space", None), "id", None)
+
+def uploadFileToNotion(notionClient, path, session=None, uploadName=None):
+    """
+    Uploads a local file to Notion.so's S3 bucket without touching any block.
+    This is the network half of notion-py's EmbedOrUploadBlock.upload_file()
+    @param {NotionClient} notionClient The client to upload with
+    @param {str} path The path to the local file
+    @param {requests.Session|None} [session=None] The session to put the file to S3
+    with, from uploadSession(). A new one if not given
+    @param {str|None} [uploadName=None] The file name to give it on Notion.so (the
+    url ends with it), path's by default
+    @returns {str} The Notion.so hosted url of the file
+    """
+    with instrument.timed("fileUpload", name=str(path)) as uploadStats:
+        mimetype = mimetypes.guess_type(path)[0] or "text/plain"
+        fileName = uploadName or os.path.split(path)[-1]
+        data = notionClient.post(
+            "getUploadFileUrl",
+            {"bucket": "secure", "name": fileName, "contentType": mimetype},
+        ).json()
+
+        #Read it all up front (instead of streaming it) so it can be sent again if
+        #it needs to be retried
+        with open(path, "rb") as f:
+            fileBytes = f.read()
+        uploadStats["bytes"] = len(fileBytes)
+        session = session or uploadSession(notionClient)
+        response = session.put(
+            data["signedPutUrl"], data=fileBytes, headers={"Content-type": mimetype}
+        )
+        response.raise_for_status()
+        return data["url"]
+
+def setBlockFile(block, url):
+    """
+    Points an EmbedOrUploadBlock at a file already uploaded with uploadFileToNotion().
+    This is the block half of notion-py's EmbedOrUploadBlock.upload_file()
+    @param {EmbedOrUploadBlock} block The block to set the file of
+    @param {str} url The Notion.so hosted url of the file
+    """
+    block.display_source = url
+    block.source = url
+    block.file_id = url[len(S3_URL_PREFIX):].split("/")[0]
+
+
+class FileUploadPool:
+    """
+    Uploads local files for EmbedOrUploadBlocks on a bounded pool of threads so
+    blocks can keep being created while the files transfer.
+    Only the transfers happen on the worker threads. The blocks are pointed at
+    their files when wait() is called, from the calling thread, so that the updates
+    don't end up in some unrelated transaction that is open on the client.
+    Failed uploads are collected instead of raised.
+    """
+
+    def __init__(self, maxWorkers=4, uploadCache=None, imageOptimizer=None):
+        """
+        @param {int} [maxWorkers=4] The max number of files to upload at once
+        @param {UploadCache|None} [uploadCache=None] If given, files that have already
+        been uploaded (in this run or a previous one) are reused instead of uploaded
+        @param {ImageOptimizer|None} [imageOptimizer=None] If given, images are shrunk
+        with it before they're uploaded. Files in the uploadCache are still cached by
+        their original contents, so they aren't optimized again either
+        """
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        self._pending = []
+        self._uploadCache = uploadCache
+        self._imageOptimizer = imageOptimizer
+        self._hashLocksLock = threading.Lock()
+        self._hashLocks = defaultdict(threading.Lock)
+        self._session = None
+        self._sessionLock = threading.Lock()
+        self.errors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.wait()
+        self._executor.shutdown()
+        if self._session is not None:
+            self._session.close()
+
+    def submit(self, block, path, done=None):
+        """
+        Starts uploading the file at path to the given block
+        @param {EmbedOrUploadBlock} block The already created block to upload the file to
+        @param {str|Path} path The path to the local file
+        @param {callable|None} [done=None] Called from wait() once the block is pointed
+        at its uploaded file
+        """
+        future = self._executor.submit(self._upload, block._client, str(path))
+        self._pending.append((block, path, future, done))
+
+    def _uploadFile(self, notionClient, path):
+        uploadPath, uploadName = path, None
+        if self._imageOptimizer is not None:
+            uploadPath = self._imageOptimizer.optimize(path)
+            if uploadPath != path:
+                #Keep the image's name instead of its cache name, with its new extension
+                uploadName = os.path.splitext(os.path.basename(path))[0] + os.path.splitext(uploadPath)[1]
+        with self._sessionLock:
+            #One for the whole pool, so its connections to S3 are reused
+            if self._session is None:
+                self._session = uploadSession(notionClient)
+        return uploadFileToNotion(notionClient, uploadPath, self._session, uploadName)
+
+    def _upload(self, notionClient, path):
+        if self._uploadCache is None:
+            return self._uploadFile(notionClient, path)
+        # Only let one thread upload a given file, the rest wait and use the cache
+        fileHash = hashFile(path)
+        spaceId = spaceIdOf(notionClient)
+        with self._hashLocksLock:
+            hashLock = self._hashLocks[(fileHash, spaceId)]
+        with hashLock:
+            url = self._uploadCache.get(fileHash, spaceId)
+            if not url:
+                url = self._uploadFile(notionClient, path)
+                self._uploadCache.set(fileHash, url, spaceId)
+        return url
+
+    def wait(self):
+        """
+        Waits on all the submitted uploads and points every block at its uploaded file
+        @returns {tuple[]} (path, Exception) for every upload that has failed so far
+        """
+        pending, self._pending = self._pending, []
+        uploaded = []
+        for block, path, future, done in pending:
+            try:
+                uploaded.append((block, future.result(), done))
+            except Exception as e:
+                self.errors.append((path, e))
+
+        if uploaded:
+            notionClient = uploaded[0][0]._client #Hacky internals stuff...
+            with notionClient.as_atomic_transaction():
+                for block, url, done in uploaded:
+                    setBlockFile(block, url)
+            for block, url, done in uploaded:
+                if done:
+                    done()
+        return self.errors
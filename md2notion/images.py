@@ -0,0 +1,146 @@
+import os
+import hashlib
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .cache import userCacheDir, hashFile
+
+#Only images larger than this many bytes are recompressed
+IMAGE_MAX_BYTES = 1024 * 1024
+#Images larger than this many pixels on their longest side are downscaled to it
+IMAGE_MAX_DIMENSION = 2000
+#What images are recompressed to
+IMAGE_FORMATS = {
+    "webp": (".webp", "WEBP"),
+    "jpeg": (".jpg", "JPEG"),
+}
+
+
+def optimizedImagePath(cacheDir, fileHash, maxBytes, maxDimension, format, quality):
+    """
+    @returns {Path} Where the optimized version of the file with fileHash is cached
+    for these settings
+    """
+    settings = f"{fileHash}\0{maxBytes}\0{maxDimension}\0{format}\0{quality}"
+    key = hashlib.sha256(settings.encode("utf-8")).hexdigest()
+    return Path(cacheDir) / (key + IMAGE_FORMATS[format][0])
+
+def optimizeImage(path, cacheDir, maxBytes=IMAGE_MAX_BYTES, maxDimension=IMAGE_MAX_DIMENSION,
+        format="webp", quality=80):
+    """
+    Downscales and recompresses a local image if it's larger than maxBytes or
+    maxDimension, caching the result by the image's contents so it only happens once.
+    Images that can't be read (or that are animated) are left alone, as are the ones
+    that don't end up any smaller.
+    Runs on ImageOptimizer's processes, so it only takes arguments that pickle.
+    @param {str} path The path to the local image
+    @param {str|Path} cacheDir The directory to cache the optimized images in
+    @param {int} [maxBytes=IMAGE_MAX_BYTES] See IMAGE_MAX_BYTES
+    @param {int} [maxDimension=IMAGE_MAX_DIMENSION] See IMAGE_MAX_DIMENSION
+    @param {str} [format="webp"] One of IMAGE_FORMATS
+    @param {int} [quality=80] The encoder quality, 1-100
+    @returns {str} The path of the image to upload, path itself if it wasn't optimized
+    """
+    size = os.path.getsize(path)
+    outPath = optimizedImagePath(cacheDir, hashFile(path), maxBytes, maxDimension, format, quality)
+    if not outPath.exists():
+        try:
+            with Image.open(path) as img:
+                if getattr(img, "is_animated", False):
+                    return path
+                if size <= maxBytes and max(img.size) <= maxDimension:
+                    return path
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((maxDimension, maxDimension), Image.LANCZOS)
+                if format == "jpeg" or img.mode not in ("RGB", "RGBA"):
+                    img = flattenImage(img) if format == "jpeg" else img.convert("RGBA")
+                #Write then rename, so other processes never see a partial file
+                outPath.parent.mkdir(parents=True, exist_ok=True)
+                tmpPath = outPath.with_name(f"{outPath.name}.{os.getpid()}.tmp")
+                img.save(tmpPath, IMAGE_FORMATS[format][1], quality=quality, optimize=True)
+                os.replace(tmpPath, outPath)
+        except (UnidentifiedImageError, OSError, ValueError):
+            return path
+    return str(outPath) if os.path.getsize(outPath) < size else path
+
+def flattenImage(img):
+    """
+    @param {Image} img
+    @returns {Image} img in RGB, with any transparency over white (for JPEG)
+    """
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, (255, 255, 255))
+        flat.paste(img, mask=img.getchannel("A"))
+        return flat
+    return img.convert("RGB")
+
+
+class ImageOptimizer:
+    """
+    Shrinks local images before they're uploaded (see optimizeImage()) on a pool of
+    processes. Optimized images are cached on disk by the contents of the original,
+    so reruns (and the same image under different names) don't optimize it again.
+    Needs the "images" extra (pip install md2notion[images]).
+    Safe to use from multiple threads, e.g. from a FileUploadPool.
+    """
+
+    def __init__(self, cacheDir=None, maxBytes=IMAGE_MAX_BYTES, maxDimension=IMAGE_MAX_DIMENSION,
+            format="webp", quality=80, workers=None):
+        """
+        @param {str|Path|None} [cacheDir=None] The directory to cache optimized images
+        in, defaults to images in userCacheDir()
+        @param {int} [maxBytes=IMAGE_MAX_BYTES] See IMAGE_MAX_BYTES
+        @param {int} [maxDimension=IMAGE_MAX_DIMENSION] See IMAGE_MAX_DIMENSION
+        @param {str} [format="webp"] One of IMAGE_FORMATS
+        @param {int} [quality=80] The encoder quality, 1-100
+        @param {int|None} [workers=None] The number of processes, one per CPU by default
+        """
+        if format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format '{format}', use one of {', '.join(IMAGE_FORMATS)}")
+        self.cacheDir = str(cacheDir if cacheDir is not None else userCacheDir() / "images")
+        self.settings = (maxBytes, maxDimension, format, quality)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._futures = {}
+        #Images are submitted from FileUploadPool's threads, and forking a process
+        #with other threads running can deadlock it, so the processes are spawned
+        if sys.version_info >= (3, 7):
+            self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            #No mp_context before 3.7, but every process is forked on the first
+            #submit, so that happens here on this thread
+            self._executor = ProcessPoolExecutor(workers)
+            self._executor.submit(int)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def submit(self, path):
+        """
+        Starts optimizing the image at path, once per path per run
+        @param {str|Path} path The path to the local image
+        @returns {Future} The future of the path to upload instead
+        """
+        path = str(path)
+        with self._lock:
+            if path not in self._futures:
+                self._futures[path] = self._executor.submit(optimizeImage, path, self.cacheDir,
+                    *self.settings)
+            return self._futures[path]
+
+    def optimize(self, path):
+        """
+        @param {str|Path} path The path to the local image
+        @returns {str} The path to upload instead, see optimizeImage()
+        """
+        return self.submit(path).result()
+
+    def close(self):
+        self._executor.shutdown()
@@ -0,0 +1,236 @@
+import heapq
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+#Hooks that md2notion reports what it's doing to, for finding out where a run
+#spends its time. Every event has a kind and a dict of fields, "name" being what
+#it's about (grouped by in reports) and "seconds" how long it took, if it's timed:
+#* "render" name=token type, every NotionPyRenderer.render() (including the
+#  tokens inside of it)
+#* "convert" name=markdown path, blocks=top level blocks, every convert()
+#* "block" name=block class, file, position, every uploadBlock() (not including
+#  its children)
+#* "batch" name=markdown path, blocks, topLevel, every transaction of uploadBlocksBatched()
+#* "fileUpload" name=local file path, bytes, every file uploaded for a block
+#* "retry" name=status code or error, attempt, every request a RateLimiter retries
+#* "uploadStart" name=markdown path, total=top level blocks or None, then "upload"
+#  once all of its blocks are created (its files may still be uploading)
+#* "file" name=markdown path, everything done for a file by the cli
+#* "treeLevel" name=depth, pages, every level of pages PageTree.create() makes
+#Sinks are called on the thread the event happened on, so they have to be thread
+#safe. A sink with a kinds attribute only gets those kinds of events, otherwise it
+#gets all of them. Events from other processes (converting with --jobs) aren't
+#reported. Kinds of events no sink gets aren't timed.
+
+_sinks = []
+_kinds = set() #Every kind some sink gets, None when a sink gets every kind
+
+def _sinkKinds(sink):
+    kinds = getattr(sink, "kinds", None)
+    return None if kinds is None else set(kinds)
+
+def _updateKinds():
+    global _kinds
+    kinds = set()
+    for sink in _sinks:
+        sinkKinds = _sinkKinds(sink)
+        if sinkKinds is None:
+            kinds = None
+            break
+        kinds |= sinkKinds
+    _kinds = kinds
+
+def addSink(sink):
+    """
+    @param {callable} sink Called with (kind, fields) for every event from now on
+    (only the kinds in sink.kinds, if it has that attribute)
+    @returns {callable} sink
+    """
+    _sinks.append(sink)
+    _updateKinds()
+    return sink
+
+def removeSink(sink):
+    _sinks.remove(sink)
+    _updateKinds()
+
+def enabled(kind=None):
+    """
+    @param {str|None} [kind=None] The kind of event, any kind by default
+    @returns {bool} Whether there are any sinks to report that kind of event to
+    """
+    if kind is None:
+        return bool(_sinks)
+    return _kinds is None or kind in _kinds
+
+def emit(kind, **fields):
+    """
+    Reports an event to every sink that gets that kind of event
+    @param {str} kind The kind of event
+    @param fields What to report about it
+    """
+    for sink in list(_sinks):
+        sinkKinds = getattr(sink, "kinds", None)
+        if sinkKinds is None or kind in sinkKinds:
+            sink(kind, fields)
+
+@contextmanager
+def timed(kind, **fields):
+    """
+    Reports an event with how long the with block took in "seconds" (and the name
+    of the exception in "error" if it raised)
+    @param {str} kind The kind of event
+    @param fields What to report about it
+    @returns {dict} The fields, to add more to from inside of the with block
+    """
+    if not enabled(kind):
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        fields["seconds"] = time.perf_counter() - start
+        emit(kind, **fields)
+
+
+class StatsSink:
+    """
+    Totals up every kind of event by name, for the --stats JSON report
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+
+    def __call__(self, kind, fields):
+        with self._lock:
+            totals = self._totals[kind][str(fields.get("name"))]
+            totals["count"] += 1
+            for key, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and key not in ("total", "attempt"):
+                    totals[key] += value
+            if "seconds" in fields:
+                totals["maxSeconds"] = max(totals["maxSeconds"], fields["seconds"])
+            if "error" in fields:
+                totals["errors"] += 1
+
+    def report(self):
+        """
+        @returns {dict} { kind: { name: { "count", "seconds", "maxSeconds", and the
+        totals of any other numbers reported, like "bytes" } } }, slowest first
+        """
+        with self._lock:
+            return { kind: { name: dict(totals) for name, totals in
+                sorted(names.items(), key=lambda item: -item[1].get("seconds", 0)) }
+                for kind, names in self._totals.items() }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class SlowestSink:
+    """
+    Keeps the n slowest timed events (except whole files and uploads, which are
+    made of the others), for the --slowest table
+    """
+
+    def __init__(self, n=20, kinds=("render", "convert", "block", "batch", "fileUpload")):
+        """
+        @param {int} [n=20] How many events to keep
+        @param {str[]} [kinds] The kinds of events to keep
+        """
+        self.n = n
+        self.kinds = kinds
+        self._lock = threading.Lock()
+        self._heap = []
+        self._counter = 0 #Breaks ties so fields are never compared
+
+    def __call__(self, kind, fields):
+        if kind not in self.kinds or "seconds" not in fields:
+            return
+        with self._lock:
+            self._counter += 1
+            entry = (fields["seconds"], self._counter, kind, fields)
+            if len(self._heap) < self.n:
+                heapq.heappush(self._heap, entry)
+            elif entry > self._heap[0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def slowest(self):
+        """
+        @returns {tuple[]} (seconds, kind, fields) of the slowest events, slowest first
+        """
+        with self._lock:
+            return [(seconds, kind, fields) for seconds, _, kind, fields in sorted(self._heap, reverse=True)]
+
+    def table(self):
+        """
+        @returns {str} The slowest events as a text table
+        """
+        lines = [f"{'seconds':>9}  {'kind':<10}  name"]
+        for seconds, kind, fields in self.slowest():
+            details = ", ".join(f"{k}={v}" for k, v in fields.items() if k not in ("name", "seconds"))
+            lines.append(f"{seconds:>9.3f}  {kind:<10}  {fields.get('name')}" + (f" ({details})" if details else ""))
+        return "\n".join(lines)
+
+
+class ProgressSink:
+    """
+    Prints how far along the upload of every file is, at most once per interval
+    seconds so printing doesn't slow the upload down
+    """
+    kinds = ("uploadStart", "block", "batch", "upload")
+
+    def __init__(self, interval=0.5, out=None):
+        """
+        @param {float} [interval=0.5] The min seconds between updates
+        @param {file|None} [out=None] Where to print to, sys.stdout by default
+        """
+        self.interval = interval
+        self.out = out
+        self._lock = threading.Lock()
+        self._files = {}
+        self._lastPrint = 0.0
+
+    def __call__(self, kind, fields):
+        if kind == "uploadStart":
+            with self._lock:
+                self._files[fields["name"]] = [0, fields.get("total")]
+            return
+        if "error" in fields:
+            return #A batch that failed is uploaded again block by block
+        if kind == "block" and "." not in fields.get("position", ""):
+            fileName, done = fields.get("file"), 1
+        elif kind == "batch":
+            fileName, done = fields["name"], fields["topLevel"]
+        elif kind == "upload":
+            with self._lock:
+                progress = self._files.pop(fields["name"], None)
+                if progress:
+                    self._print(fields["name"], *progress, end="\n")
+            return
+        else:
+            return
+        with self._lock:
+            progress = self._files.get(fileName)
+            if progress is None:
+                return
+            progress[0] += done
+            now = time.monotonic()
+            if now - self._lastPrint >= self.interval:
+                self._lastPrint = now
+                self._print(fileName, *progress)
+
+    def _print(self, fileName, done, total, end=""):
+        progress = f"{done}/{total} ({done/total * 100:.1f}%)" if total else f"{done}"
+        print(f"\rUploading {fileName}, {progress} blocks", end=end, file=self.out or sys.stdout, flush=True)
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+
+
+class UploadJournal:
+    """
+    An append-only log of everything an upload has created in Notion.so, so an
+    upload that was stopped part way (a crash, a dropped connection, Ctrl+C) can be
+    resumed without creating anything twice or starting over.
+    Every entry is a JSON line that is written (and fsynced) as soon as what it
+    records is done. A line cut off by a crash is dropped when the journal is
+    opened again. Safe to use from multiple threads.
+    Only what was being created when the upload stopped (a block, or a batch of
+    them) can end up created twice, as it exists in Notion.so but not in the journal.
+    """
+
+    def __init__(self, path, fsync=True):
+        """
+        @param {str|Path} path The journal file, created if it doesn't exist and
+        resumed from if it does
+        @param {bool} [fsync=True] Whether to wait for every entry to be on disk
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._files = {}
+        self.entries = 0
+        if os.path.exists(path):
+            self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _load(self):
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                #The last entry was cut off
+                f.truncate(end)
+        for line in data[:end].decode("utf-8").splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+
+    def _apply(self, entry):
+        state = self._state(entry["file"])
+        position = entry.get("position")
+        if "page" in entry:
+            state["page"] = entry["page"]
+        elif "block" in entry:
+            state["blocks"][position] = entry["block"]
+        elif "image" in entry:
+            state["images"].add(position)
+        elif "collection" in entry:
+            state["tables"][position] = { "collection": entry["collection"],
+                "view": entry["view"], "props": entry["props"], "rows": [] }
+        elif "rows" in entry:
+            state["tables"][position]["rows"] += entry["rows"]
+        elif "done" in entry:
+            state["done"] = True
+        self.entries += 1
+
+    def _state(self, mdPath):
+        return self._files.setdefault(mdPath, { "page": None, "blocks": {}, "images": set(),
+            "tables": {}, "done": False })
+
+    def write(self, entries):
+        """
+        Appends entries to the journal and waits for them to be written
+        @param {dict[]} entries The entries, see FileJournal for what's in them
+        """
+        with self._lock:
+            for entry in entries:
+                self._apply(entry)
+                self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def file(self, mdPath):
+        """
+        @param {str} mdPath The path of the markdown file being uploaded
+        @returns {FileJournal} The part of the journal for that file
+        """
+        return FileJournal(self, mdPath)
+
+    def close(self):
+        self._file.close()
+
+
+class FileJournal:
+    """
+    The part of an UploadJournal for a single markdown file.
+    Blocks are recorded by their position in the file's block descriptors, "3"
+    for the fourth top level block and "3.0" for its first child, and so on.
+    """
+
+    def __init__(self, journal, mdPath):
+        self.journal = journal
+        self.mdPath = mdPath
+
+    def _state(self):
+        with self.journal._lock:
+            return self.journal._state(self.mdPath)
+
+    def _write(self, *entries):
+        self.journal.write([{ "file": self.mdPath, **entry } for entry in entries])
+
+    @property
+    def pageId(self):
+        """
+        @returns {str|None} The id of the page created to upload the file to
+        """
+        return self._state()["page"]
+
+    def setPage(self, pageId):
+        self._write({ "page": pageId })
+
+    def blockId(self, position):
+        """
+        @returns {str|None} The id of the block created for the descriptor at position
+        """
+        return self._state()["blocks"].get(position)
+
+    def setBlocks(self, createdBlocks):
+        """
+        @param {tuple[]} createdBlocks (position, block id) for blocks that were created
+        """
+        self._write(*({ "position": position, "block": blockId } for position, blockId in createdBlocks))
+
+    def imageDone(self, position):
+        """
+        @returns {bool} Whether the file of the block at position was uploaded
+        """
+        return position in self._state()["images"]
+
+    def setImageDone(self, position):
+        self._write({ "position": position, "image": True })
+
+    def table(self, position):
+        """
+        @returns {dict|None} The collection ("collection"), view ("view"), property
+        ids in order of the columns ("props") and the ids of the rows created so far
+        ("rows") of the table at position
+        """
+        return self._state()["tables"].get(position)
+
+    def setTable(self, position, collectionId, viewId, propIds):
+        self._write({ "position": position, "collection": collectionId, "view": viewId,
+            "props": propIds })
+
+    def addRows(self, position, rowIds):
+        self._write({ "position": position, "rows": rowIds })
+
+    @property
+    def done(self):
+        """
+        @returns {bool} Whether the whole file was uploaded
+        """
+        return self._state()["done"]
+
+    def setDone(self):
+        self._write({ "done": True })
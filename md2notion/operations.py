@@ -0,0 +1,122 @@
+import uuid
+from inspect import signature
+from notion.block import CollectionViewBlock
+from notion.markdown import markdown_to_notion
+from notion.operations import build_operation
+from notion.utils import now
+
+#Descriptor keys that aren't attributes of the block
+NON_ATTR_KEYS = ("type", "children", "schema", "rows")
+
+def newId():
+    """
+    @returns {str} A new record id, Notion.so lets us pick our own
+    """
+    return str(uuid.uuid4())
+
+def recordOperation(table, recordId, parentId, parentTable, userId, **kwargs):
+    """
+    The operation that creates a record, like notion-py's NotionClient.create_record()
+    but without adding it to its parent's list
+    @returns {dict} The operation
+    """
+    args = {
+        "id": recordId,
+        "version": 1,
+        "alive": True,
+        "created_by_id": userId,
+        "created_by_table": "notion_user",
+        "created_time": now(),
+        "parent_id": parentId,
+        "parent_table": parentTable,
+        **kwargs
+    }
+    return build_operation(id=recordId, path=[], args=args, command="set", table=table)
+
+def appendOperation(parentId, childId, parentTable="block", childListKey="content"):
+    """
+    The operation that adds a record to the end of its parent's list of children
+    @returns {dict} The operation
+    """
+    return build_operation(id=parentId, path=[childListKey], args={"id": childId},
+        command="listAfter", table=parentTable)
+
+def attrOperations(blockClass, blockId, attrs):
+    """
+    The operations that set attributes on a block, the same as setting them with
+    setattr() on a notion-py block would
+    @param {type} blockClass The notion-py Block subclass
+    @param {str} blockId The id of the block
+    @param {dict} attrs The attributes to set, attributes blockClass doesn't have are skipped
+    @returns {dict[]} The operations
+    """
+    ops = []
+    for key, val in attrs.items():
+        mapper = getattr(blockClass, key, None)
+        if not hasattr(mapper, "python_to_api"):
+            print(f"{blockClass.__name__} does not have attribute '{key}' to be set, skipping...")
+            continue
+        kwargs = { "client": None } if "client" in signature(mapper.python_to_api).parameters else {}
+        ops.append(build_operation(id=blockId, path=mapper.path,
+            args=mapper.python_to_api(val, **kwargs)))
+    return ops
+
+def rowOperations(collectionId, schema, rows, userId, rowIds=None):
+    """
+    The operations that create a collection's rows in order
+    @param {str} collectionId The id of the collection
+    @param {dict} schema The schema from the block descriptor
+    @param {list[]} rows The rows from the block descriptor, one string per column
+    in the order of schema
+    @param {str} userId The id of the user creating the rows
+    @param {str[]|None} [rowIds=None] The ids to use for the rows, new ones if not given
+    @returns {dict[]} The operations
+    """
+    propIds = list(schema.keys())
+    rowIds = rowIds or [newId() for row in rows]
+    return [recordOperation("block", rowId, collectionId, "collection", userId, type="page",
+            properties={ propId: markdown_to_notion(val or "") for propId, val in zip(propIds, row) }) \
+        for rowId, row in zip(rowIds, rows)]
+
+def collectionOperations(blockId, schema, rows, userId):
+    """
+    The operations that give a new CollectionViewBlock its collection, a table view
+    and all of its rows, like uploadBlock() does but without reading anything back
+    @param {str} blockId The id of the CollectionViewBlock
+    @param {dict} schema The schema from the block descriptor
+    @param {list[]} rows The rows from the block descriptor
+    @param {str} userId The id of the user creating the records
+    @returns {dict[]} The operations
+    """
+    collectionId = newId()
+    viewId = newId()
+    rowIds = [newId() for row in rows]
+    return [
+        recordOperation("collection", collectionId, blockId, "block", userId, schema=schema),
+        build_operation(id=blockId, path=["collection_id"], args=collectionId),
+        recordOperation("collection_view", viewId, blockId, "block", userId, type="table",
+            collection_id=collectionId, page_sort=rowIds),
+        build_operation(id=blockId, path=["view_ids"], args=[viewId]),
+        *rowOperations(collectionId, schema, rows, userId, rowIds)
+    ]
+
+def blockOperations(blockDescriptor, blockId, parentId, userId, parentTable="block"):
+    """
+    The operations that create a block from a descriptor as the last child of its
+    parent, without its children
+    @param {dict} blockDescriptor A block descriptor, output from NotionPyRenderer
+    @param {str} blockId The id to give the new block
+    @param {str} parentId The id of the parent block
+    @param {str} userId The id of the user creating the block
+    @returns {dict[]} The operations
+    """
+    blockClass = blockDescriptor["type"]
+    attrs = { k: v for k, v in blockDescriptor.items() if k not in NON_ATTR_KEYS }
+    ops = [
+        recordOperation("block", blockId, parentId, parentTable, userId, type=blockClass._type),
+        appendOperation(parentId, blockId, parentTable),
+        *attrOperations(blockClass, blockId, attrs)
+    ]
+    if issubclass(blockClass, CollectionViewBlock):
+        ops += collectionOperations(blockId, blockDescriptor["schema"], blockDescriptor["rows"], userId)
+    return ops
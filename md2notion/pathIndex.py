@@ -0,0 +1,81 @@
+import os
+import threading
+from pathlib import Path
+
+
+class PathIndex:
+    """
+    An in memory index of the directories around the markdown files, for finding
+    the local files their images reference without a stat() per candidate path.
+    Every directory is listed (with one os.scandir()) the first time a path in it
+    is looked up, and never again for the rest of the run, so share one PathIndex
+    between all the files being uploaded. Files created or deleted after their
+    directory was listed won't be seen.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, caseInsensitive=False):
+        """
+        @param {bool} [caseInsensitive=False] Whether to also find files whose name
+        only matches in a different case, like on Windows and macOS, e.g. for
+        markdown written on those but uploaded from elsewhere
+        """
+        self.caseInsensitive = caseInsensitive
+        self.scans = 0 #The number of directories listed
+        self._lock = threading.Lock()
+        self._listings = {}
+
+    def _listing(self, directory):
+        """
+        @param {str} directory The absolute, normalized path of the directory
+        @returns {tuple} ({name: isDir}, {lowercase name: name}) of the entries in
+        directory, both empty if it can't be listed
+        """
+        with self._lock:
+            listing = self._listings.get(directory)
+        if listing is not None:
+            return listing
+
+        entries = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        entries[entry.name] = entry.is_dir()
+                    except OSError:
+                        entries[entry.name] = False
+        except (OSError, ValueError):
+            pass #Doesn't exist, isn't a directory, or isn't a valid path
+        folded = {}
+        for name in sorted(entries):
+            folded.setdefault(name.casefold(), name)
+        listing = (entries, folded)
+        with self._lock:
+            self._listings.setdefault(directory, listing)
+            self.scans += 1
+        return listing
+
+    def find(self, path):
+        """
+        @param {str|Path} path The path to look for, relative to the working directory
+        or absolute
+        @returns {Path|None} path if it exists, the path with the names it has on
+        disk if it only exists in a different case (and caseInsensitive), or None
+        """
+        try:
+            parts = Path(os.path.abspath(path)).parts
+        except (OSError, ValueError):
+            return None
+        current = parts[0]
+        exact = True
+        for idx, name in enumerate(parts[1:], 1):
+            entries, folded = self._listing(current)
+            if name not in entries:
+                if not self.caseInsensitive or name.casefold() not in folded:
+                    return None
+                name = folded[name.casefold()]
+                exact = False
+            if idx < len(parts) - 1 and not entries[name]:
+                return None #A file in the middle of the path
+            current = os.path.join(current, name)
+        return Path(path) if exact else Path(current)
@@ -0,0 +1,274 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import mistletoe
+from .NotionPyRenderer import NotionPyRenderer
+
+
+def convertText(mdText, notionPyRendererCls=NotionPyRenderer):
+    """
+    Converts markdown to block descriptors, for convert() and the conversion
+    processes. It's the only conversion stored in a ConvertCache
+    @param {str|file} mdText The markdown to convert
+    @param {NotionPyRenderer} notionPyRendererCls See convert(), has to be picklable
+    @returns {dict[]} The block descriptors
+    """
+    return mistletoe.markdown(mdText, notionPyRendererCls)
+
+def convertFiles(paths, notionPyRendererCls=NotionPyRenderer):
+    """
+    Reads and converts local markdown files one at a time, run on the conversion
+    processes. A file that fails doesn't stop the rest
+    @param {str[]} paths The paths to the markdown files
+    @param {NotionPyRenderer} notionPyRendererCls See convert(), has to be picklable
+    @returns {tuple[]} (block descriptors, None) or (None, Exception) for every path
+    """
+    results = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as mdFile:
+                results.append((convertText(mdFile.read(), notionPyRendererCls), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+class ConvertTask:
+    """
+    A function submitted to a ConvertPool, like a Future
+    """
+
+    def __init__(self, pool, fn, args):
+        self._pool = pool
+        self.fn = fn
+        self.args = args
+        self.future = None
+
+    def result(self):
+        """
+        @returns The function's result, see ConvertPool.result()
+        """
+        return self._pool.result(self)
+
+
+class ConvertPool:
+    """
+    A pool of processes to convert on that carries on when one of them crashes. A
+    crash breaks a ProcessPoolExecutor for good, failing everything in flight on it
+    with BrokenProcessPool, so the pool is replaced and everything that was in
+    flight is submitted again. Only the task that crashed fails.
+    Only use it from one thread.
+    """
+
+    def __init__(self, workers=None):
+        """
+        @param {int|None} [workers=None] The number of processes, one per CPU by default
+        """
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(workers)
+        self._tasks = set() #Submitted tasks whose results haven't been taken yet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.shutdown()
+
+    def submit(self, fn, *args):
+        """
+        @param {callable} fn The function to run on a process, has to be picklable
+        @param args Its arguments, have to be picklable
+        @returns {ConvertTask} The task, take its result with result()
+        """
+        task = ConvertTask(self, fn, args)
+        self._submit(task)
+        self._tasks.add(task)
+        return task
+
+    def _submit(self, task):
+        try:
+            task.future = self._executor.submit(task.fn, *task.args)
+        except BrokenProcessPool as e:
+            #Already broken, the task is handled like the ones that were in flight
+            task.future = Future()
+            task.future.set_exception(e)
+
+    def _restart(self):
+        self._executor.shutdown()
+        self._executor = ProcessPoolExecutor(self.workers)
+
+    def result(self, task):
+        """
+        Waits for a task to finish
+        @param {ConvertTask} task From submit()
+        @returns The function's result
+        @throws {BrokenProcessPool} If the task crashed its process, or whatever the
+        function raised
+        """
+        try:
+            return task.future.result()
+        except BrokenProcessPool:
+            #Run it again on a new pool by itself, so it only fails if it's the one
+            #that crashed, then resubmit the rest of what was in flight
+            self._restart()
+            self._submit(task)
+            try:
+                return task.future.result()
+            except BrokenProcessPool:
+                self._restart()
+                raise
+            finally:
+                for other in self._tasks:
+                    if other is not task and other.future.done() and \
+                        isinstance(other.future.exception(), BrokenProcessPool):
+                        self._submit(other)
+        finally:
+            self._tasks.discard(task)
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+def markdownPaths(paths):
+    """
+    @param {iterable} paths Paths to markdown files or directories
+    @returns {iterator} The paths, with directories replaced by every .md file in
+    them (and their subdirectories) in sorted order
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(str(p) for p in Path(path).rglob("*.md") if p.is_file())
+        else:
+            yield str(path)
+
+def convertMany(paths, notionPyRendererCls=NotionPyRenderer, workers=None, chunkSize=8):
+    """
+    convert() for many local markdown files at once, on a pool of processes. The
+    block descriptors only hold plain data and the notion-py block classes (not
+    any live notion-py objects), so they come back from the processes as is and
+    can be uploaded (or written to a bundle) from anywhere.
+    Only a bounded number of files are in flight at once, so the results can be
+    used as they come in without holding every file in memory.
+    @param {iterable} paths Paths to markdown files, or directories to convert
+    every .md file in
+    @param {NotionPyRenderer} notionPyRendererCls See convert(), has to be picklable
+    @param {int|None} [workers=None] The number of processes, one per CPU by default
+    @param {int} [chunkSize=8] How many files to send to a process at once, more
+    means less overhead for lots of small files
+    @returns {iterator} (path, block descriptors, None) for every file that was
+    converted and (path, None, Exception) for every file that failed, in the order
+    of paths. When a file crashes its process, the files sent to the process with
+    it fail with BrokenProcessPool and the rest are converted on a new pool
+    """
+    def chunks():
+        chunk = []
+        for path in markdownPaths(paths):
+            chunk.append(path)
+            if len(chunk) >= chunkSize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    workers = workers or os.cpu_count() or 1
+    with ConvertPool(workers) as convertPool:
+        submitted = ((chunk, convertPool.submit(convertFiles, chunk, notionPyRendererCls))
+            for chunk in chunks())
+        for chunk, future in runAhead(submitted, workers * 2):
+            try:
+                results = future.result()
+            except Exception as e:
+                #The chunk crashed its process, or the results couldn't be pickled
+                results = [(None, e)] * len(chunk)
+            for path, (rendered, error) in zip(chunk, results):
+                yield (path, rendered, error)
+
+def runAhead(tasks, window):
+    """
+    Pulls at most window items ahead from the tasks iterator before handing
+    them out. When tasks submits work to a pool as it's iterated, this keeps
+    window tasks in flight and stops submitting when the consumer falls behind
+    @param {iterator} tasks
+    @param {int} window The max items to pull ahead
+    """
+    inFlight = deque()
+    for task in tasks:
+        inFlight.append(task)
+        if len(inFlight) >= window:
+            yield inFlight.popleft()
+    while inFlight:
+        yield inFlight.popleft()
+
+def runPipeline(pathsUrls, readFunc, prepareFunc, uploadFunc,
+        notionPyRendererCls=NotionPyRenderer, jobs=4, uploadJobs=None, window=None,
+        convertCache=None):
+    """
+    Reads, converts and uploads many markdown files at once. Every stage runs on
+    its own pool: reading on threads, converting on processes and uploading on
+    threads. Each stage only runs window files ahead of the next one, so a slow
+    stage holds back the ones before it instead of piling up files in memory.
+    A file that fails in any stage is skipped and reported at the end, including a
+    file that crashes its conversion process (see ConvertPool).
+    @param {iterable} pathsUrls (path, fileName) tuples, from expandPathsUrls()
+    @param {callable} readFunc Takes a path and returns the markdown text, runs on the
+    read threads
+    @param {callable} prepareFunc Takes a path and fileName and returns the target to
+    upload to. Runs on the calling thread in the order of pathsUrls (so pages can be
+    created in order)
+    @param {callable} uploadFunc Takes a path, the target from prepareFunc and the
+    block descriptors and uploads them. Runs on the upload threads
+    @param {NotionPyRenderer} notionPyRendererCls See convert(), has to be picklable
+    @param {int} [jobs=4] The number of workers for reading and converting
+    @param {int|None} [uploadJobs=None] The number of workers for uploading, defaults
+    to jobs
+    @param {int|None} [window=None] How many files each stage can run ahead of the
+    next, defaults to twice the number of workers
+    @param {ConvertCache|None} [convertCache=None] If given, files that were already
+    converted (in this run or a previous one) aren't sent to the conversion processes
+    @returns {tuple[]} (path, Exception) for every file that failed
+    """
+    window = window or jobs * 2
+    errors = []
+    with ThreadPoolExecutor(jobs) as readPool, \
+        ConvertPool(jobs) as convertPool, \
+        ThreadPoolExecutor(uploadJobs or jobs) as uploadPool:
+
+        def read():
+            for path, fileName in pathsUrls:
+                yield (path, fileName, readPool.submit(readFunc, path))
+
+        def converted():
+            for path, fileName, future in runAhead(read(), window):
+                try:
+                    mdText = future.result()
+                except Exception as e:
+                    errors.append((path, e))
+                    continue
+                key = convertCache.key(mdText, notionPyRendererCls) if convertCache is not None else None
+                rendered = convertCache.get(key) if key else None
+                if rendered is not None:
+                    future = Future()
+                    future.set_result(rendered)
+                    yield (path, fileName, None, future)
+                    continue
+                yield (path, fileName, key, convertPool.submit(convertText, mdText, notionPyRendererCls))
+
+        def uploaded():
+            for path, fileName, key, future in runAhead(converted(), window):
+                try:
+                    rendered = future.result()
+                    if key:
+                        convertCache.set(key, rendered)
+                    target = prepareFunc(path, fileName)
+                except Exception as e:
+                    errors.append((path, e))
+                    continue
+                yield (path, uploadPool.submit(uploadFunc, path, target, rendered))
+
+        for path, future in runAhead(uploaded(), window):
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((path, e))
+    return errors
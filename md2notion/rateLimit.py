@@ -0,0 +1,215 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from . import instrument
+
+#Responses that mean "try again later", 429 is Notion.so rate limiting us and the
+#rest are the transient errors notion-py already retries
+RETRY_STATUSES = (429, 502, 503, 504)
+#Responses that mean we're sending too much
+THROTTLE_STATUSES = (429, 503)
+
+def retryAfterSeconds(response):
+    """
+    @param {requests.Response} response
+    @returns {float|None} How long the Retry-After header says to wait, if there is one
+    """
+    retryAfter = response.headers.get("Retry-After")
+    if not retryAfter:
+        return None
+    try:
+        return max(0.0, float(retryAfter))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retryAfter).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitStats:
+    """
+    What a RateLimiter has done so far
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.waited = 0.0 #Seconds spent waiting for the limiter
+        self.concurrency = 0.0 #The current concurrency limit
+
+    def __repr__(self):
+        return f"{self.requests} requests, {self.retries} retries ({self.throttled} throttled, " \
+            f"{self.errors} errors), waited {self.waited:.1f}s, concurrency {self.concurrency:.1f}"
+
+
+class RateLimiter:
+    """
+    Paces requests to Notion.so for everything sharing it (every client and thread
+    of a run) and retries the ones that fail with a 429 or a transient 5xx.
+    * At most rate requests per second are sent (a token bucket, allowing bursts
+      of up to burst requests)
+    * At most `concurrency` requests are in flight at once. That limit grows by
+      about one for every window of successful requests and halves when Notion.so
+      throttles us (AIMD, like TCP)
+    * Failed requests are retried up to maxRetries times after a jittered
+      exponential backoff, or after the Retry-After Notion.so sends. A Retry-After
+      pauses everyone sharing the limiter, not just the request that got it
+    Use install() to send a NotionClient's (or any requests.Session's) requests
+    through it.
+    """
+
+    def __init__(self, rate=None, burst=None, maxConcurrency=8, minConcurrency=1,
+            maxRetries=5, backoffBase=0.5, maxBackoff=30.0):
+        """
+        @param {float|None} [rate=None] Max requests per second, unlimited if None
+        @param {int|None} [burst=None] Max requests sent at once after being idle,
+        defaults to rate
+        @param {int} [maxConcurrency=8] The most requests in flight at once
+        @param {int} [minConcurrency=1] The least the concurrency limit can drop to
+        @param {int} [maxRetries=5] How many times to retry a request before giving up
+        @param {float} [backoffBase=0.5] Seconds to back off after the first failure,
+        doubling for every one after that
+        @param {float} [maxBackoff=30.0] The longest to back off for
+        """
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.maxConcurrency = maxConcurrency
+        self.minConcurrency = minConcurrency
+        self.maxRetries = maxRetries
+        self.backoffBase = backoffBase
+        self.maxBackoff = maxBackoff
+        self.stats = RateLimitStats()
+        self.stats.concurrency = float(maxConcurrency)
+        self._cond = threading.Condition()
+        self._inFlight = 0
+        self._tokens = float(self.burst)
+        self._lastRefill = time.monotonic()
+        self._pausedUntil = 0.0
+        self._lastDecrease = 0.0
+        self._random = random.Random()
+
+    def install(self, notionClientOrSession):
+        """
+        Sends every request of a NotionClient (or requests.Session) through this
+        limiter. Anything without a requests.Session is left as is
+        @returns The NotionClient or Session
+        """
+        session = getattr(notionClientOrSession, "session", notionClientOrSession)
+        if isinstance(session, Session):
+            adapter = RateLimitedAdapter(self)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        return notionClientOrSession
+
+    def acquire(self):
+        """
+        Blocks until a request can be sent, call release() once it's done
+        """
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._pausedUntil:
+                    self._cond.wait(self._pausedUntil - now)
+                    continue
+                if self._inFlight >= int(self.stats.concurrency):
+                    self._cond.wait()
+                    continue
+                if self.rate:
+                    self._tokens = min(self.burst, self._tokens + (now - self._lastRefill) * self.rate)
+                    self._lastRefill = now
+                    if self._tokens < 1:
+                        self._cond.wait((1 - self._tokens) / self.rate)
+                        continue
+                    self._tokens -= 1
+                self._inFlight += 1
+                self.stats.requests += 1
+                self.stats.waited += time.monotonic() - start
+                return
+
+    def release(self, throttled=False, retryAfter=None):
+        """
+        Marks a request from acquire() as done
+        @param {bool} [throttled=False] Whether Notion.so said we're sending too much
+        @param {float|None} [retryAfter=None] Seconds Notion.so said to wait before
+        sending anything else
+        """
+        with self._cond:
+            self._inFlight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.stats.throttled += 1
+                #Only halve once per burst of throttled responses
+                if now - self._lastDecrease > 1.0:
+                    self.stats.concurrency = max(float(self.minConcurrency), self.stats.concurrency / 2)
+                    self._lastDecrease = now
+            else:
+                self.stats.concurrency = min(float(self.maxConcurrency),
+                    self.stats.concurrency + 1 / self.stats.concurrency)
+            if retryAfter:
+                self._pausedUntil = max(self._pausedUntil, now + retryAfter)
+            self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """
+        @param {int} attempt The number of the retry, starting at 0
+        @returns {float} Seconds to wait before it, jittered so that everyone that
+        failed at once doesn't retry at once
+        """
+        return self._random.uniform(0, min(self.maxBackoff, self.backoffBase * 2 ** attempt))
+
+    def send(self, sendFunc):
+        """
+        Sends a request through the limiter, retrying it if it fails
+        @param {callable} sendFunc Sends the request and returns the requests.Response
+        @returns {requests.Response} The last response
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                response = sendFunc()
+            except (ConnectionError, Timeout) as e:
+                self.release(throttled=False)
+                if attempt >= self.maxRetries:
+                    raise
+                with self._cond:
+                    self.stats.retries += 1
+                    self.stats.errors += 1
+                instrument.emit("retry", name=type(e).__name__, attempt=attempt)
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            status = response.status_code
+            retryAfter = retryAfterSeconds(response) if status in RETRY_STATUSES else None
+            self.release(throttled=status in THROTTLE_STATUSES, retryAfter=retryAfter)
+            if status not in RETRY_STATUSES or attempt >= self.maxRetries:
+                return response
+            with self._cond:
+                self.stats.retries += 1
+                if status not in THROTTLE_STATUSES:
+                    self.stats.errors += 1
+            instrument.emit("retry", name=str(status), attempt=attempt)
+            response.close()
+            time.sleep(retryAfter if retryAfter is not None else self.backoff(attempt))
+            attempt += 1
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    A requests transport adapter that sends everything through a RateLimiter
+    """
+
+    def __init__(self, limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        return self.limiter.send(lambda: super(RateLimitedAdapter, self).send(request, **kwargs))
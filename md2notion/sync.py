@@ -0,0 +1,214 @@
+import hashlib
+import json
+from inspect import signature
+from difflib import SequenceMatcher
+from urllib.parse import unquote_plus
+from notion.block import CodeBlock, TodoBlock, EquationBlock, DividerBlock, \
+    EmbedOrUploadBlock, CollectionViewBlock, PageBlock
+from notion.settings import S3_URL_PREFIX
+
+#The attributes of each block class that are compared when syncing. Classes not
+#in here (or whose base classes aren't in here) compare their 'title'
+SYNC_ATTRS = {
+    CodeBlock: ("language", "title_plaintext"),
+    TodoBlock: ("title", "checked"),
+    EquationBlock: ("title_plaintext",),
+    DividerBlock: (),
+    EmbedOrUploadBlock: ("caption", "source"),
+    CollectionViewBlock: (),
+}
+
+def syncAttrs(blockClass):
+    """
+    @param {type} blockClass The notion-py Block subclass
+    @returns {str[]} The attributes to compare for blocks of blockClass, from SYNC_ATTRS
+    """
+    for cls in blockClass.__mro__:
+        if cls in SYNC_ATTRS:
+            return SYNC_ATTRS[cls]
+    return ("title",)
+
+def normalizeSource(src):
+    """
+    Uploaded files end up with a Notion.so hosted url, so local paths and uploaded
+    files are compared by their file name alone. External urls are compared as-is
+    @param {str} src The source of an EmbedOrUploadBlock
+    @returns {str}
+    """
+    src = unquote_plus(src or "")
+    if "://" not in src or src.startswith("file://") or S3_URL_PREFIX in src:
+        return src.split("?")[0].replace("\\", "/").split("/")[-1]
+    return src
+
+def descriptorValue(blockClass, key, val):
+    """
+    @param {type} blockClass The notion-py Block subclass
+    @param {str} key The attribute of the block
+    @param val The value for the attribute from a block descriptor
+    @returns The value as notion-py would store it on Notion.so, comparable with
+    storedValue(), so markdown formatting is compared exactly
+    """
+    if key == "source":
+        return normalizeSource(val)
+    mapper = getattr(blockClass, key)
+    kwargs = { "client": None } if "client" in signature(mapper.python_to_api).parameters else {}
+    return mapper.python_to_api(val if val is not None else "", **kwargs) or None
+
+def storedValue(block, key):
+    """
+    @param {NotionBlock} block
+    @param {str} key The attribute of the block
+    @returns The value of the attribute as stored on Notion.so, see descriptorValue()
+    """
+    val = block.get(getattr(type(block), key).path)
+    if key == "source":
+        return normalizeSource("".join(chunk[0] for chunk in val or []))
+    return val or None
+
+def _hash(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+def descriptorHash(blockDescriptor):
+    """
+    Content hash of a block descriptor and all its children, comparable to
+    blockHash() of the block it would upload to
+    @param {dict} blockDescriptor A block descriptor, output from NotionPyRenderer
+    @returns {str}
+    """
+    blockClass = blockDescriptor["type"]
+    attrs = [descriptorValue(blockClass, k, blockDescriptor.get(k)) for k in syncAttrs(blockClass)]
+    if "schema" in blockDescriptor:
+        attrs.append([prop["name"] for prop in blockDescriptor["schema"].values()])
+        attrs.append(blockDescriptor["rows"])
+    children = [descriptorHash(c) for c in blockDescriptor.get("children") or []]
+    return _hash(blockClass._type, attrs, children)
+
+def blockHash(block):
+    """
+    Content hash of an existing block and all its children, see descriptorHash()
+    @param {NotionBlock} block
+    @returns {str}
+    """
+    blockClass = type(block)
+    attrs = [storedValue(block, k) for k in syncAttrs(blockClass)]
+    if isinstance(block, CollectionViewBlock) and block.collection:
+        props = list(block.collection.get("schema", {}).items())
+        attrs.append([prop["name"] for propId, prop in props])
+        attrs.append([[row.get_property(propId) for propId, prop in props] \
+            for row in block.collection.get_rows()])
+    #Don't descend into subpages, they're compared by title
+    hasChildren = not isinstance(block, PageBlock) and block.get("content")
+    children = [blockHash(c) for c in block.children] if hasChildren else []
+    return _hash(block._type, attrs, children)
+
+
+class SyncStats:
+    """
+    Counts of what syncBlocks() did
+    """
+
+    def __init__(self):
+        self.kept = 0
+        self.updated = 0
+        self.inserted = 0
+        self.moved = 0
+        self.removed = 0
+
+    def __repr__(self):
+        return f"{self.kept} kept, {self.updated} updated, {self.inserted} inserted, " \
+            f"{self.moved} moved, {self.removed} removed"
+
+
+def syncBlocks(blockDescriptors, blockParent, createBlock, stats=None):
+    """
+    Makes the children of blockParent match blockDescriptors, only touching the
+    blocks that differ. Blocks are matched up by descriptorHash()/blockHash(), and
+    unmatched blocks are moved (if the same content exists elsewhere in the parent),
+    updated in place (if they're the same simple type), created, or removed.
+    @param {dict[]} blockDescriptors Block descriptors, output from NotionPyRenderer
+    @param {NotionBlock} blockParent The block whose children to sync
+    @param {callable} createBlock Function taking a descriptor and parent block that
+    uploads the descriptor as the last child of the parent and returns the new block,
+    like uploadBlock()
+    @param {SyncStats|None} [stats=None] Stats to add to
+    @returns {SyncStats}
+    """
+    stats = stats or SyncStats()
+    existing = list(blockParent.children)
+    existingHashes = [blockHash(b) for b in existing]
+    wantedHashes = [descriptorHash(d) for d in blockDescriptors]
+    opcodes = SequenceMatcher(None, existingHashes, wantedHashes, autojunk=False).get_opcodes()
+
+    #Blocks that aren't already in the right place, by hash, so they can be
+    #moved or updated instead of recreated. Whatever is left over gets removed
+    available = {}
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "equal":
+            for i in range(i1, i2):
+                available.setdefault(existingHashes[i], []).append(existing[i])
+    def take(block, blockHash):
+        available[blockHash].remove(block)
+
+    prevBlock = None
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            stats.kept += i2 - i1
+            prevBlock = existing[i2 - 1]
+            continue
+
+        #Blocks in a replaced range can stay where they are if they're updated in
+        #place. Pair them up with the descriptors in order, skipping over blocks
+        #that can't be updated to what's wanted (they'll be moved or removed)
+        replaced = list(zip(existing[i1:i2], existingHashes[i1:i2])) if tag == "replace" else []
+        nextReplaced = 0
+        for j in range(j1, j2):
+            blockDescriptor = blockDescriptors[j]
+            blockClass = blockDescriptor["type"]
+            if available.get(wantedHashes[j]):
+                #Same content exists elsewhere, move it here
+                block = available[wantedHashes[j]][0]
+                take(block, wantedHashes[j])
+                if nextReplaced < len(replaced) and block is replaced[nextReplaced][0]:
+                    nextReplaced += 1
+                    stats.kept += 1
+                else:
+                    moveAfter(block, prevBlock, blockParent)
+                    stats.moved += 1
+                prevBlock = block
+                continue
+
+            updatable = not issubclass(blockClass, (EmbedOrUploadBlock, CollectionViewBlock))
+            candidateIdx = next((k for k in range(nextReplaced, len(replaced)) \
+                if type(replaced[k][0]) is blockClass and \
+                replaced[k][0] in available.get(replaced[k][1], [])), None) if updatable else None
+            if candidateIdx is not None:
+                block, candidateHash = replaced[candidateIdx]
+                nextReplaced = candidateIdx + 1
+                take(block, candidateHash)
+                for key in syncAttrs(blockClass):
+                    if key in blockDescriptor and storedValue(block, key) != \
+                        descriptorValue(blockClass, key, blockDescriptor[key]):
+                        setattr(block, key, blockDescriptor[key])
+                syncBlocks(blockDescriptor.get("children") or [], block, createBlock, stats)
+                stats.updated += 1
+            else:
+                block = createBlock(dict(blockDescriptor), blockParent)
+                moveAfter(block, prevBlock, blockParent)
+                stats.inserted += 1
+            prevBlock = block
+
+    for blocks in available.values():
+        for block in blocks:
+            block.remove()
+            stats.removed += 1
+    return stats
+
+def moveAfter(block, prevBlock, blockParent):
+    """
+    Moves block to right after prevBlock, or to the start of blockParent if there's
+    no prevBlock
+    """
+    if prevBlock is None:
+        block.move_to(blockParent, "first-child")
+    else:
+        block.move_to(prevBlock, "after")
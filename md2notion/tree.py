@@ -0,0 +1,203 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from urllib.parse import unquote
+from notion.block import PageBlock, CodeBlock, EquationBlock
+from .upload import createBlockInTransaction
+from .pipeline import markdownPaths
+from . import instrument
+
+#Files that hold the contents of their directory's page instead of getting a page
+#of their own (compared case insensitively)
+INDEX_NAMES = ("index.md", "readme.md")
+
+#A markdown link in the text of a block, as NotionPyRenderer.render_link() makes them
+LINK_RE = re.compile(r"\]\(([^)]+)\)")
+
+def treePaths(paths):
+    """
+    @param {iterable} paths Paths from expandPathsUrls()
+    @returns {str[]} The local markdown files the paths refer to, with directories
+    replaced by every .md file in them. URLs are left out, they're not in any tree
+    """
+    return list(dict.fromkeys(markdownPaths(p for p in paths if '://' not in p)))
+
+def pageUrl(pageId):
+    """
+    @returns {str} The Notion.so url of a page, for linking to it
+    """
+    return "https://www.notion.so/" + pageId.replace("-", "")
+
+
+class PageTree:
+    """
+    The pages that mirror a directory tree of markdown files: a page for every
+    file and for every directory with files in it, each under the page of its
+    directory. Once they're created, links between the files can be pointed at
+    their pages.
+    """
+
+    def __init__(self, mdPaths, root=None):
+        """
+        @param {str[]} mdPaths The markdown files to mirror
+        @param {str|None} [root=None] The directory to mirror, the closest one that
+        has all of mdPaths in it by default. Its page is the one the tree is created under
+        """
+        absPaths = [os.path.abspath(p) for p in mdPaths]
+        if root is None:
+            root = os.path.commonpath([os.path.dirname(p) for p in absPaths]) if absPaths else os.getcwd()
+        self.root = os.path.abspath(root)
+        self.pageIds = {} #Page key => the id of the page, once it's created
+        self._keys = {} #Absolute path of a file or directory => its page key
+        self._pages = {} #Page key => (parent page key, title)
+        indexed = set() #Directories that already have an index file
+        for mdPath, absPath in zip(mdPaths, absPaths):
+            directory = os.path.dirname(absPath)
+            self._addDirectory(directory)
+            if os.path.basename(absPath).lower() in INDEX_NAMES and directory != self.root \
+                and directory not in indexed:
+                indexed.add(directory)
+                key = directory
+            else:
+                key = absPath
+                self._pages[key] = (directory, os.path.basename(mdPath))
+            self._keys[absPath] = key
+            self._keys[mdPath] = key
+
+    def _addDirectory(self, directory):
+        while directory != self.root and directory not in self._pages:
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                raise ValueError(f"{directory} is not in {self.root}")
+            self._pages[directory] = (parent, os.path.basename(directory))
+            self._keys[directory] = directory
+            directory = parent
+        self._keys[self.root] = self.root
+
+    def levels(self):
+        """
+        @returns {list[]} The pages to create breadth first, one list of (key,
+        parent key, title) per level. Pages with the same parent are next to each
+        other, in the order of their titles
+        """
+        children = {}
+        for key, (parentKey, title) in self._pages.items():
+            children.setdefault(parentKey, []).append((key, parentKey, title))
+        levels = []
+        level = [self.root]
+        while True:
+            level = [page for parentKey in level for page in
+                sorted(children.get(parentKey, []), key=lambda page: (page[2].casefold(), page[2]))]
+            if not level:
+                return levels
+            levels.append(level)
+            level = [key for key, parentKey, title in level]
+
+    def topLevelTitles(self):
+        """
+        @returns {str[]} The titles of the pages created right under the root page
+        """
+        return [title for parentKey, title in self._pages.values() if parentKey == self.root]
+
+    def pageId(self, path):
+        """
+        @param {str} path A file or directory in the tree
+        @returns {str|None} The id of its page, None if it wasn't created (yet)
+        """
+        return self.pageIds.get(self._keys.get(path, self._keys.get(os.path.abspath(path))))
+
+    def create(self, page, newClient=None, workers=8, batchSize=50):
+        """
+        Creates the pages a level at a time, every page of a level at once. The pages
+        are created with up to batchSize per Notion.so transaction on workers threads.
+        The children of a page are created together on one thread so they keep their order.
+        @param {NotionBlock} page The page to create the tree under, for the root directory
+        @param {callable|None} [newClient=None] Makes a new NotionClient, one per thread
+        (notion-py clients can't be written to from multiple threads at once). Without it,
+        every page is created with page's client, one transaction at a time
+        @param {int} [workers=8] The max number of transactions at once
+        @param {int} [batchSize=50] The max number of pages per transaction
+        @returns {tuple[]} (path, Exception) for every page that couldn't be created.
+        The pages under them aren't created either
+        """
+        self.pageIds[self.root] = page.id
+        threadClients = threading.local()
+        def clientForThread():
+            if newClient is None:
+                return page._client
+            if not hasattr(threadClients, 'client'):
+                threadClients.client = newClient()
+            return threadClients.client
+
+        errors = []
+        def createPages(pages):
+            client = clientForThread()
+            for start in range(0, len(pages), batchSize):
+                batch = pages[start:start + batchSize]
+                try:
+                    with client.as_atomic_transaction():
+                        created = [(key, createBlockInTransaction(PageBlock,
+                            PageBlock(client, self.pageIds[parentKey]), title=title).id)
+                            for key, parentKey, title in batch]
+                except Exception as e:
+                    errors.extend((key, e) for key, parentKey, title in batch)
+                    continue
+                self.pageIds.update(created)
+
+        with ThreadPoolExecutor(workers if newClient else 1) as pool:
+            for depth, level in enumerate(self.levels()):
+                #Pages whose parent couldn't be created are left out
+                level = [p for p in level if p[1] in self.pageIds]
+                #Split into up to workers tasks (so the level is spread over all of the
+                #threads), never splitting the children of a page
+                taskSize = min(batchSize, max(1, -(-len(level) // workers)))
+                tasks = [[]]
+                for parentKey, pages in groupby(level, key=lambda p: p[1]):
+                    pages = list(pages)
+                    if tasks[-1] and len(tasks[-1]) + len(pages) > taskSize:
+                        tasks.append([])
+                    tasks[-1] += pages
+                with instrument.timed("treeLevel", name=depth, pages=len(level)):
+                    list(pool.map(createPages, tasks))
+        return errors
+
+    def rewriteLinks(self, blockDescriptors, mdPath):
+        """
+        Points the links in blockDescriptors (and their children) to files or
+        directories in the tree at their Notion.so pages instead. Links to anything
+        else are left alone
+        @param {dict[]} blockDescriptors The block descriptors of mdPath, changed in place
+        @param {str} mdPath The markdown file they're from, for relative links
+        @returns {int} The number of links rewritten
+        """
+        directory = os.path.dirname(os.path.abspath(mdPath))
+        count = 0
+        def rewriteLink(match):
+            nonlocal count
+            target = match.group(1)
+            if '://' in target or target.startswith(('#', 'mailto:')):
+                return match.group(0)
+            #Notion.so has no links to a heading, so just go to the page
+            path = unquote(target.split('#')[0])
+            pageId = self.pageId(os.path.normpath(os.path.join(directory, path))) if path else None
+            if not pageId:
+                return match.group(0)
+            count += 1
+            return f"]({pageUrl(pageId)})"
+        def rewriteValue(value):
+            if isinstance(value, str):
+                return LINK_RE.sub(rewriteLink, value) if '](' in value else value
+            if isinstance(value, list):
+                return [rewriteValue(v) for v in value]
+            return value
+
+        for blockDescriptor in blockDescriptors:
+            #Links in code are just text
+            if not issubclass(blockDescriptor["type"], (CodeBlock, EquationBlock)):
+                for key, value in blockDescriptor.items():
+                    if key not in ("type", "children", "schema"):
+                        blockDescriptor[key] = rewriteValue(value)
+            count += self.rewriteLinks(blockDescriptor.get("children") or [], mdPath)
+        return count
@@ -1,19 +1,29 @@
 import io
-import requests
+import json
 import os.path
 import glob
-import argparse
 import sys
 import re
+from functools import partial
+from itertools import islice
 from pathlib import Path
 from urllib.parse import unquote, urlparse, ParseResult
-import mistletoe
+from requests.exceptions import HTTPError
+from mistletoe import block_token, span_token
 from notion.block import EmbedOrUploadBlock, CollectionViewBlock, PageBlock
 from notion.client import NotionClient
-from .NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension, addLatexExtension
+from notion.operations import build_operation
+from .NotionPyRenderer import NotionPyRenderer
+from .fileUploads import FileUploadPool
+from .fetch import UrlFetcher
+from .sync import syncBlocks
+from .pipeline import runAhead, convertMany, convertText
+from .operations import NON_ATTR_KEYS, newId, rowOperations
+from . import instrument
+from .cli import cli
 
 
-def relativePathForMarkdownUrl(url, mdFilePath):
+def relativePathForMarkdownUrl(url, mdFilePath, pathIndex=None):
     """
     Markdown images commonly referenence local files the URL portion but the URLs
     might not be valid file paths.
@@ -21,6 +31,8 @@ def relativePathForMarkdownUrl(url, mdFilePath):
     url parts
     @param {str} The url to parse
     @param {str} mdFilePath The path to the file we're parsing, for relative paths
+    @param {PathIndex|None} [pathIndex=None] If given, look the paths up in this
+    instead of checking each one on disk
     @returns {None|Path} None of the url is not a valid local file path or is
     an external URL (http/https). Path path if it's valid
     """
@@ -37,78 +49,277 @@ def relativePathForMarkdownUrl(url, mdFilePath):
         ]
 
     for path in paths:
+        if pathIndex is not None:
+            found = pathIndex.find(path)
+            if found:
+                return found
+            continue
         # Test for validity (the try/except) and existance
         try:
             if path.exists():
                 return path
-            else:
-                print(f"File not found '{path}'")
         except OSError as e:
             pass
     return None
 
-def uploadBlock(blockDescriptor, blockParent, mdFilePath, imagePathFunc=None):
+def uploadFileForBlock(newBlock, imgRelSrc, mdFilePath, imagePathFunc=None, uploadPool=None,
+        done=None):
+    """
+    Uploads the local file referenced by an EmbedOrUploadBlock's source to Notion.so
+    @param {EmbedOrUploadBlock} newBlock The already created block to upload the file to
+    @param {str} imgRelSrc The source from the block descriptor
+    @param {string} mdFilePath The path to the markdown file to find images with
+    @param {callable|None) [imagePathFunc=None] See upload()
+    @param {FileUploadPool|None} [uploadPool=None] If given, upload the file in the
+    background on this pool instead of waiting for it
+    @param {callable|None} [done=None] Called once the file is uploaded and set on the block
+    """
+    if re.search(r"(?<!file)://", imgRelSrc, re.I):
+        return #Don't upload images that are external urls
+
+    if imagePathFunc: #Transform by imagePathFunc insteadif provided
+        imgSrc = imagePathFunc(imgRelSrc, mdFilePath)
+    else:
+        imgSrc = relativePathForMarkdownUrl(imgRelSrc, mdFilePath)
+    if not imgSrc:
+        print(f"ERROR: Local image '{imgRelSrc}' not found to upload. Skipping...")
+        return
+
+    if uploadPool:
+        uploadPool.submit(newBlock, imgSrc, done)
+        return
+    print(f"Uploading file '{imgSrc}'")
+    with instrument.timed("fileUpload", name=str(imgSrc), bytes=os.path.getsize(imgSrc)):
+        newBlock.upload_file(str(imgSrc))
+    if done:
+        done()
+
+#Rows created per Notion.so transaction when uploading a table
+ROW_CHUNK_SIZE = 500
+
+def uploadCollectionRows(notionClient, collectionId, viewId, schema, rows, chunkSize=ROW_CHUNK_SIZE,
+        rowIds=None, chunkDone=None):
+    """
+    Creates all the rows of a table, chunkSize rows (with all their properties) per
+    Notion.so transaction, instead of a collection.add_row() and a setattr() per
+    cell, which are a round trip each. The rows are kept in order in the view.
+    @param {NotionClient} notionClient
+    @param {str} collectionId The id of the table's collection
+    @param {str} viewId The id of the view to show the rows in
+    @param {dict} schema The schema from the block descriptor, its keys are the
+    property ids
+    @param {list[]} rows The rows from the block descriptor, one string per column
+    in the order of schema
+    @param {int} [chunkSize=ROW_CHUNK_SIZE] The max number of rows per transaction
+    @param {str[]|None} [rowIds=None] The ids of the first rows, if they were already
+    created (by an upload that was stopped part way). Only the rows after them are created
+    @param {callable|None} [chunkDone=None] Called with the ids of every chunk of rows
+    once it's created
+    """
+    userId = notionClient.current_user.id
+    rowIds = list(rowIds or [])
+    for start in range(len(rowIds), len(rows), chunkSize):
+        chunk = rows[start:start + chunkSize]
+        chunkIds = [newId() for row in chunk]
+        rowIds += chunkIds
+        notionClient.submit_transaction([
+            *rowOperations(collectionId, schema, chunk, userId, chunkIds),
+            #Every row so far, so the view stays in order even if a later chunk fails
+            build_operation(id=viewId, path=["page_sort"], args=list(rowIds),
+                table="collection_view")
+        ], update_last_edited=False)
+        if chunkDone:
+            chunkDone(chunkIds)
+
+def uploadBlock(blockDescriptor, blockParent, mdFilePath, imagePathFunc=None, uploadPool=None,
+        rowChunkSize=ROW_CHUNK_SIZE, journal=None, position="0"):
     """
     Uploads a single blockDescriptor for NotionPyRenderer as the child of another block
     and does any post processing for Markdown importing
-    @param {dict} blockDescriptor A block descriptor, output from NotionPyRenderer
+    @param {BlockDescriptor} blockDescriptor A block descriptor, output from NotionPyRenderer
+    (left as is)
     @param {NotionBlock} blockParent The parent to add it as a child of
     @param {string} mdFilePath The path to the markdown file to find images with
     @param {callable|None) [imagePathFunc=None] See upload()
+    @param {FileUploadPool|None} [uploadPool=None] See uploadFileForBlock()
+    @param {int} [rowChunkSize=ROW_CHUNK_SIZE] See uploadCollectionRows()
+    @param {FileJournal|None} [journal=None] If given, everything created is recorded in
+    it, and anything it says was already created (by an upload that was stopped part
+    way) is skipped
+    @param {str} [position="0"] The position of blockDescriptor in the file, see FileJournal
+    @returns {NotionBlock} The newly created block
 
     @todo Make mdFilePath optional and don't do searching if not provided
     """
     blockClass = blockDescriptor["type"]
-    del blockDescriptor["type"]
-    if "schema" in blockDescriptor:
-        collectionSchema = blockDescriptor["schema"]
-        collectionRows = blockDescriptor["rows"]
-        del blockDescriptor["schema"]
-        del blockDescriptor["rows"]
-    blockChildren = None
-    if "children" in blockDescriptor:
-        blockChildren = blockDescriptor["children"]
-        del blockDescriptor["children"]
-    newBlock = blockParent.children.add_new(blockClass, **blockDescriptor)
-    # Upload images to Notion.so that have local file paths
-    # most of the time, this will be a standard ImageBlock; however some markdown
-    # generators use the image syntax for general purpose "embedded" files; hence we
-    # check for any subclass of EmbedOrUploadBlock (which provides upload_file)
-    if issubclass(blockClass, EmbedOrUploadBlock):
-        imgRelSrc = blockDescriptor["source"]
-        if re.search(r"(?<!file)://", imgRelSrc, re.I):
-            return #Don't upload images that are external urls
-
-        if imagePathFunc: #Transform by imagePathFunc insteadif provided
-            imgSrc = imagePathFunc(imgRelSrc, mdFilePath)
+    collectionSchema = blockDescriptor.get("schema")
+    collectionRows = blockDescriptor.get("rows")
+    blockChildren = blockDescriptor.get("children")
+    blockAttrs = { k: v for k, v in blockDescriptor.items() if k not in NON_ATTR_KEYS }
+    notionClient = blockParent._client #Hacky internals stuff...
+    with instrument.timed("block", name=blockClass.__name__, file=mdFilePath, position=position):
+        blockId = journal.blockId(position) if journal else None
+        if blockId:
+            #Created by an earlier upload, this doesn't fetch it unless it's needed
+            newBlock = blockClass(notionClient, blockId)
         else:
-            imgSrc = relativePathForMarkdownUrl(imgRelSrc, mdFilePath)
-            if not imgSrc:
-                print(f"ERROR: Local image '{imgRelSrc}' not found to upload. Skipping...")
-                return
-
-        print(f"Uploading file '{imgSrc}'")
-        newBlock.upload_file(str(imgSrc))
-    elif isinstance(newBlock, CollectionViewBlock):
-        #We should have generated a schema and rows for this one
-        notionClient = blockParent._client #Hacky internals stuff...
-        newBlock.collection = notionClient.get_collection(
-            #Low-level use of the API
-            #TODO: Update when notion-py provides a better interface for this
-            notionClient.create_record("collection", parent=newBlock, schema=collectionSchema)
-        )
-        view = newBlock.views.add_new(view_type="table")
-        for row in collectionRows:
-            newRow = newBlock.collection.add_row()
-            for idx, propName in enumerate(prop["name"] for prop in collectionSchema.values()):
-                # TODO: If rows aren't uploading, check to see if there's special
-                # characters that don't map to propName in notion-py
-                propName = propName.lower() #The actual prop name in notion-py is lowercase
-                propVal = row[idx]
-                setattr(newRow, propName, propVal)
+            newBlock = blockParent.children.add_new(blockClass, **blockAttrs)
+            if journal:
+                journal.setBlocks([(position, newBlock.id)])
+        # Upload images to Notion.so that have local file paths
+        # most of the time, this will be a standard ImageBlock; however some markdown
+        # generators use the image syntax for general purpose "embedded" files; hence we
+        # check for any subclass of EmbedOrUploadBlock (which provides upload_file)
+        if issubclass(blockClass, EmbedOrUploadBlock):
+            if not (journal and journal.imageDone(position)):
+                uploadFileForBlock(newBlock, blockDescriptor["source"], mdFilePath, imagePathFunc,
+                    uploadPool, journal and partial(journal.setImageDone, position))
+        elif isinstance(newBlock, CollectionViewBlock):
+            #We should have generated a schema and rows for this one
+            table = journal.table(position) if journal else None
+            if not table:
+                #Low-level use of the API
+                #TODO: Update when notion-py provides a better interface for this
+                collectionId = notionClient.create_record("collection", parent=newBlock,
+                    schema=collectionSchema)
+                newBlock.collection = notionClient.get_collection(collectionId)
+                view = newBlock.views.add_new(view_type="table")
+                table = { "collection": collectionId, "view": view.id,
+                    "props": list(collectionSchema.keys()), "rows": [] }
+                if journal:
+                    journal.setTable(position, table["collection"], table["view"], table["props"])
+            #The columns of a resumed table are the property ids it was created with
+            schema = dict(zip(table["props"], collectionSchema.values()))
+            uploadCollectionRows(notionClient, table["collection"], table["view"], schema,
+                collectionRows, rowChunkSize, table["rows"], journal and partial(journal.addRows, position))
     if blockChildren:
-        for childBlock in blockChildren:
-            uploadBlock(childBlock, newBlock, mdFilePath, imagePathFunc)
+        for idx, childBlock in enumerate(blockChildren):
+            uploadBlock(childBlock, newBlock, mdFilePath, imagePathFunc, uploadPool,
+                rowChunkSize, journal, f"{position}.{idx}")
+    return newBlock
+
+#Notion.so rejects very large transactions, so keep batches well under that
+BATCH_MAX_BYTES = 512 * 1024
+
+def createBlockInTransaction(blockClass, blockParent, **kwargs):
+    """
+    Creates a new block as the last child of blockParent without asking Notion.so
+    for the created record, so it can be used inside of an atomic transaction (unlike
+    children.add_new() which has to fetch the block it just created)
+    @param {type} blockClass The notion-py Block subclass to create
+    @param {NotionBlock} blockParent The parent to add it as a child of
+    @param kwargs Attributes to set on the new block
+    @returns {NotionBlock} The new block (only valid once the transaction is committed)
+    """
+    notionClient = blockParent._client #Hacky internals stuff...
+    blockId = notionClient.create_record("block", parent=blockParent, type=blockClass._type)
+    newBlock = blockClass(notionClient, blockId)
+    for key, val in kwargs.items():
+        if not hasattr(blockClass, key):
+            print(f"{blockClass.__name__} does not have attribute '{key}' to be set, skipping...")
+            continue
+        setattr(newBlock, key, val)
+    return newBlock
+
+def uploadBlocksBatched(blockDescriptors, blockParent, mdFilePath, imagePathFunc=None,
+        batchSize=100, batchMaxBytes=BATCH_MAX_BYTES, uploadPool=None, journal=None,
+        firstIndex=0):
+    """
+    Uploads blockDescriptors (and all of their children) as children of blockParent
+    like uploadBlock() but creates up to batchSize blocks per Notion.so transaction
+    instead of making a round trip for every block.
+    Local files are uploaded once the batch with their block has been committed.
+    CollectionViewBlocks need to read back what they create so they're uploaded on
+    their own with uploadBlock(). If Notion.so rejects a batch, the blocks in that
+    batch are uploaded one at a time with uploadBlock() instead.
+    @param {dict[]} blockDescriptors Block descriptors, output from NotionPyRenderer
+    @param {NotionBlock} blockParent The parent to add them as children of
+    @param {string} mdFilePath The path to the markdown file to find images with
+    @param {callable|None) [imagePathFunc=None] See upload()
+    @param {int} [batchSize=100] The max number of blocks in a single transaction
+    @param {int} [batchMaxBytes=BATCH_MAX_BYTES] The max approximate size of the block
+    data in a single transaction
+    @param {FileUploadPool|None} [uploadPool=None] See uploadFileForBlock()
+    @param {FileJournal|None} [journal=None] See uploadBlock()
+    @param {int} [firstIndex=0] The index of the first of blockDescriptors in the file,
+    for the positions in journal
+    @returns {NotionBlock[]} The newly created top level blocks
+    """
+    # Flatten the descriptor tree depth first so every parent is created before
+    # its children, remembering the index of every descriptor's parent
+    pending = []
+    positions = []
+    def addPending(descriptors, parentIdx, parentPosition):
+        for childIdx, descriptor in enumerate(descriptors):
+            position = f"{parentPosition}.{childIdx}" if parentPosition else str(firstIndex + childIdx)
+            pending.append((descriptor, parentIdx))
+            positions.append(position)
+            addPending(descriptor.get("children") or [], len(pending) - 1, position)
+    addPending(blockDescriptors, None, None)
+
+    blocks = [None] * len(pending)
+    def parentFor(idx):
+        parentIdx = pending[idx][1]
+        return blockParent if parentIdx is None else blocks[parentIdx]
+    def isBatchable(idx):
+        return not issubclass(pending[idx][0]["type"], CollectionViewBlock)
+    def uploadSingle(idx):
+        #uploadBlock() recurses, so give it a childless copy
+        blockDescriptor = dict(pending[idx][0])
+        blockDescriptor.pop("children", None)
+        return uploadBlock(blockDescriptor, parentFor(idx), mdFilePath, imagePathFunc,
+            uploadPool, journal=journal, position=positions[idx])
+    def uploadFile(idx):
+        blockDescriptor = pending[idx][0]
+        if issubclass(blockDescriptor["type"], EmbedOrUploadBlock) and \
+            not (journal and journal.imageDone(positions[idx])):
+            uploadFileForBlock(blocks[idx], blockDescriptor["source"], mdFilePath,
+                imagePathFunc, uploadPool, journal and partial(journal.setImageDone, positions[idx]))
+
+    notionClient = blockParent._client #Hacky internals stuff...
+    idx = 0
+    while idx < len(pending):
+        blockId = journal.blockId(positions[idx]) if journal else None
+        if blockId and isBatchable(idx):
+            #Created by an earlier upload
+            blocks[idx] = pending[idx][0]["type"](notionClient, blockId)
+            uploadFile(idx)
+            idx += 1
+            continue
+        if not isBatchable(idx):
+            blocks[idx] = uploadSingle(idx)
+            idx += 1
+            continue
+
+        start = idx
+        batchBytes = 0
+        try:
+            with instrument.timed("batch", name=mdFilePath) as batch, \
+                notionClient.as_atomic_transaction():
+                while idx < len(pending) and idx - start < batchSize and \
+                    batchBytes < batchMaxBytes and isBatchable(idx) and \
+                    not (journal and journal.blockId(positions[idx])):
+                    blockDescriptor = pending[idx][0]
+                    blockAttrs = { k: v for k, v in blockDescriptor.items() \
+                        if k not in ("type", "children") }
+                    batchBytes += len(json.dumps(blockAttrs, default=str))
+                    blocks[idx] = createBlockInTransaction(blockDescriptor["type"],
+                        parentFor(idx), **blockAttrs)
+                    idx += 1
+                batch["blocks"] = idx - start
+                batch["topLevel"] = sum(1 for batchIdx in range(start, idx) if pending[batchIdx][1] is None)
+        except HTTPError as e:
+            print(f"Batch of {idx - start} blocks was rejected ({e}), uploading them one at a time...")
+            for batchIdx in range(start, idx):
+                blocks[batchIdx] = uploadSingle(batchIdx)
+            continue
+
+        if journal:
+            journal.setBlocks([(positions[batchIdx], blocks[batchIdx].id) for batchIdx in range(start, idx)])
+        for batchIdx in range(start, idx):
+            uploadFile(batchIdx)
+
+    return [block for block, (_, parentIdx) in zip(blocks, pending) if parentIdx is None]
 
 
 def convert(mdFile, notionPyRendererCls=NotionPyRenderer):
@@ -118,9 +329,140 @@ def convert(mdFile, notionPyRendererCls=NotionPyRenderer):
     @param {NotionPyRenderer} notionPyRendererCls Class inheritting from the renderer
     incase you want to render the Markdown => Notion.so differently
     """
-    return mistletoe.markdown(mdFile, notionPyRendererCls)
+    with instrument.timed("convert", name=getattr(mdFile, "name", None)) as convertStats:
+        rendered = convertText(mdFile, notionPyRendererCls)
+        convertStats["blocks"] = len(rendered)
+    return rendered
+
+#Matches the start of a ``` or ~~~ code fence or a $$ block equation
+FENCE_RE = re.compile(r" {0,3}(`{3,}|~{3,}|\${2,})")
+#Matches the start of a <pre>, <script> or <style> raw HTML block, like mistletoe's HTMLBlock
+HTML_MULTIBLOCK_RE = re.compile(r"<(script|pre|style)[ >\n]")
+
+def htmlBlockEnd(line):
+    """
+    @param {str} line A line of markdown
+    @returns {str|None} What ends the raw HTML block that line starts (in lower case),
+    if it's one that can have blank lines in it (types 1-5 in CommonMark). Follows
+    mistletoe's HTMLBlock.start()
+    """
+    stripped = line.lstrip()
+    if len(line) - len(stripped) >= 4:
+        return None
+    match = HTML_MULTIBLOCK_RE.match(stripped)
+    if match:
+        return f"</{match.group(1).casefold()}>"
+    if stripped.startswith("<!--"):
+        return "-->"
+    if stripped.startswith("<?"):
+        return "?>"
+    if stripped.startswith("<!") and stripped[2:3].isupper():
+        return ">"
+    if stripped.startswith("<![CDATA["):
+        return "]]>"
+    return None
+
+def markdownChunks(lines, chunkLines=1000):
+    """
+    Splits markdown into chunks of at least chunkLines lines, only at the start
+    of a top level block (an unindented line after a blank line, outside of any
+    code fence or raw HTML block that can have blank lines in it) so every chunk
+    parses the same as it would in the whole file
+    @param {iterable} lines Lines of markdown, only read as far as needed
+    @param {int} [chunkLines=1000] The number of lines after which to split at the
+    next top level block
+    @returns {iterator} Lists of lines
+    """
+    chunk = []
+    fence = None #The marker of the fence we're in, if any
+    htmlEnd = None #What ends the raw HTML block we're in, if any
+    prevBlank = False
+    for line in lines:
+        stripped = line.strip()
+        if fence:
+            if stripped.startswith(fence) and not stripped.lstrip(fence[0]).strip():
+                fence = None
+        elif htmlEnd:
+            if htmlEnd in line.casefold():
+                htmlEnd = None
+        else:
+            if len(chunk) >= chunkLines and prevBlank and stripped and not line[0].isspace():
+                yield chunk
+                chunk = []
+            match = FENCE_RE.match(line)
+            if match and match.group(1)[0] not in line[match.end():]: #Not e.g. ```inline```
+                fence = match.group(1)
+            else:
+                #The end can be on the line it starts on too
+                htmlEnd = htmlBlockEnd(line)
+                if htmlEnd and htmlEnd in line.casefold():
+                    htmlEnd = None
+        chunk.append(line)
+        prevBlank = not stripped
+    if chunk:
+        yield chunk
+
+def convertStream(mdFile, notionPyRendererCls=NotionPyRenderer, chunkLines=1000):
+    """
+    Like convert() but yields the top level block descriptors as it goes instead of
+    parsing the whole file first. The file is read, parsed and rendered a chunk of
+    about chunkLines lines at a time (see markdownChunks()), so memory use stays flat
+    no matter how big the file is.
+    Reference-style links can only use definitions from earlier in the file (or the
+    same chunk). Like any mistletoe renderer, don't convert anything else on the
+    same thread until the generator is finished.
+    @param {file|string} mdFile The file handle to a markdown file, or a markdown string
+    @param {NotionPyRenderer} notionPyRendererCls See convert()
+    @param {int} [chunkLines=1000] See markdownChunks()
+    @returns {iterator} Block descriptors
+    """
+    lines = mdFile.splitlines(keepends=True) if isinstance(mdFile, str) else mdFile
+    footnotes = {}
+    with notionPyRendererCls() as renderer:
+        for chunk in markdownChunks(lines, chunkLines):
+            #Like mistletoe's Document but keeping the link reference definitions
+            #from the chunks before
+            document = block_token.Document([])
+            document.footnotes = footnotes
+            block_token._root_node = span_token._root_node = document
+            try:
+                document.children = block_token.tokenize(
+                    [line if line.endswith("\n") else line + "\n" for line in chunk])
+            finally:
+                block_token._root_node = span_token._root_node = None
+            del chunk
+            yield from renderer.render(document)
+
+def convertCached(mdFile, notionPyRendererCls=NotionPyRenderer, convertCache=None, stream=False):
+    """
+    convert() that takes the block descriptors from convertCache if the same
+    markdown was already converted with the same renderer, and adds them to it if not
+    @param {file|string} mdFile The file handle to a markdown file, or a markdown string
+    @param {NotionPyRenderer} notionPyRendererCls See convert()
+    @param {ConvertCache|None} [convertCache=None] The cache, mdFile is just converted
+    without one
+    @param {bool} [stream=False] Convert with convertStream() instead, for files too big
+    to hold all at once. Reference-style links can then only use definitions from
+    before them. Streamed conversions aren't added to convertCache (it only holds
+    whole conversions) but are still taken from it
+    @returns {iterable} Block descriptors
+    """
+    if convertCache is None:
+        return convertStream(mdFile, notionPyRendererCls) if stream else convert(mdFile, notionPyRendererCls)
+    mdText = mdFile if isinstance(mdFile, str) else mdFile.read()
+    key = convertCache.key(mdText, notionPyRendererCls)
+    rendered = convertCache.get(key)
+    if rendered is not None:
+        return rendered
+    if stream:
+        return convertStream(mdText, notionPyRendererCls)
+    rendered = convert(mdText, notionPyRendererCls)
+    convertCache.set(key, rendered)
+    return rendered
 
-def upload(mdFile, notionPage, imagePathFunc=None, notionPyRendererCls=NotionPyRenderer):
+def upload(mdFile, notionPage, imagePathFunc=None, notionPyRendererCls=NotionPyRenderer,
+        batchSize=None, uploadWorkers=None, uploadCache=None, journal=None, convertCache=None,
+        imageOptimizer=None, stream=False):
     """
     Uploads a single markdown file at mdFilePath to Notion.so as a child of
     notionPage.
@@ -131,85 +473,280 @@ def upload(mdFile, notionPage, imagePathFunc=None, notionPyRendererCls=NotionPyR
     locations relative to your md file. Should return a pathlib.Path
     @param {NotionPyRenderer} notionPyRendererCls Class inheritting from the renderer
     incase you want to render the Markdown => Notion.so differently
+    @param {int|None} [batchSize=None] If given, upload this many blocks per Notion.so
+    transaction with uploadBlocksBatched() instead of one block at a time
+    @param {int|None} [uploadWorkers=None] If given, upload local files on this many
+    threads while the blocks are being created. Files that fail to upload are reported
+    at the end instead of stopping the upload
+    @param {UploadCache|None} [uploadCache=None] If given, local files that were already
+    uploaded (earlier in this file or in a previous run) are reused instead of uploaded
+    again
+    @param {FileJournal|None} [journal=None] If given, record what's uploaded in it and
+    skip everything it says was uploaded already, to resume an upload that was stopped
+    part way. Blocks are skipped by their position, so resume with the same markdown
+    @param {ConvertCache|None} [convertCache=None] If given, mdFile isn't converted
+    again if it was already converted (in this run or a previous one)
+    @param {ImageOptimizer|None} [imageOptimizer=None] If given, shrink local images
+    with it before they're uploaded
+    @param {bool} [stream=False] If True, convert the Markdown file as it's being uploaded
+    with convertStream(), see convertCached()
+    @returns {tuple[]} (path, Exception) for every file that failed to upload
     """
-    # Convert the Markdown file
-    rendered = convert(mdFile, notionPyRendererCls)
+    rendered = convertCached(mdFile, notionPyRendererCls, convertCache, stream)
+    return uploadDescriptors(rendered, notionPage, mdFile.name, imagePathFunc, batchSize,
+        uploadWorkers, uploadCache, journal, imageOptimizer)
 
-    # Upload all the blocks
-    for idx, blockDescriptor in enumerate(rendered):
-        pct = (idx+1)/len(rendered) * 100
-        print(f"\rUploading {blockDescriptor['type'].__name__}, {idx+1}/{len(rendered)} ({pct:.1f}%)", end='')
-        uploadBlock(blockDescriptor, notionPage, mdFile.name, imagePathFunc)
+def uploadDescriptors(rendered, notionPage, mdFilePath, imagePathFunc=None, batchSize=None,
+        uploadWorkers=None, uploadCache=None, journal=None, imageOptimizer=None):
+    """
+    The upload half of upload(), for block descriptors that have already been converted
+    @param {iterable} rendered Block descriptors, output from convert() or convertStream()
+    @param {NotionBlock} notionPage The Notion.so block to add the blocks to
+    @param {string} mdFilePath The path to the markdown file to find images with
+    @see upload() for the rest of the parameters
+    """
+    uploadPool = None
+    if uploadWorkers or uploadCache is not None or imageOptimizer is not None:
+        uploadPool = FileUploadPool(uploadWorkers or 1, uploadCache, imageOptimizer)
+    total = len(rendered) if hasattr(rendered, "__len__") else None
+    instrument.emit("uploadStart", name=mdFilePath, total=total)
+    with instrument.timed("upload", name=mdFilePath):
+        if batchSize:
+            print(f"Uploading {total if total is not None else 'all'} blocks in batches of {batchSize}...")
+            #Take batchSize top level blocks at a time so a stream of them is uploaded
+            #as it comes in. Each of those has at least batchSize blocks to fill batches
+            rendered = iter(rendered)
+            firstIndex = 0
+            while True:
+                descriptors = list(islice(rendered, batchSize))
+                if not descriptors:
+                    break
+                uploadBlocksBatched(descriptors, notionPage, mdFilePath, imagePathFunc, batchSize,
+                    uploadPool=uploadPool, journal=journal, firstIndex=firstIndex)
+                firstIndex += len(descriptors)
+        else:
+            # Upload all the blocks, reporting progress through instrument
+            for idx, blockDescriptor in enumerate(rendered):
+                uploadBlock(blockDescriptor, notionPage, mdFilePath, imagePathFunc, uploadPool,
+                    journal=journal, position=str(idx))
 
+    errors = []
+    if uploadPool:
+        print("Waiting for file uploads...")
+        with uploadPool:
+            errors = uploadPool.wait()
+        for path, e in errors:
+            print(f"ERROR: Could not upload file '{path}': {e}")
+    if journal and not errors:
+        journal.setDone()
+    return errors
 
-def filesFromPathsUrls(paths):
+
+def sync(mdFile, notionPage, imagePathFunc=None, notionPyRendererCls=NotionPyRenderer,
+        uploadWorkers=None, uploadCache=None, convertCache=None, imageOptimizer=None):
     """
-    Takes paths or URLs and yields file (path, fileName, file) tuples for 
-    them
+    Like upload() but for a notionPage that was already uploaded to from an older
+    version of mdFile. Only the blocks that changed are uploaded, moved, updated or
+    removed, see syncBlocks()
+    @param {file} mdFile The file handle to a markdown file
+    @param {NotionBlock} notionPage The Notion.so block to sync the markdown to
+    @param {callable|None) [imagePathFunc=None] See upload()
+    @param {NotionPyRenderer} notionPyRendererCls See upload()
+    @param {int|None} [uploadWorkers=None] See upload()
+    @param {UploadCache|None} [uploadCache=None] See upload()
+    @param {ConvertCache|None} [convertCache=None] See upload()
+    @param {ImageOptimizer|None} [imageOptimizer=None] See upload()
+    @returns {SyncStats} What was changed
+    """
+    rendered = convertCached(mdFile, notionPyRendererCls, convertCache)
+    return syncDescriptors(rendered, notionPage, mdFile.name, imagePathFunc, uploadWorkers,
+        uploadCache, imageOptimizer)
+
+def syncDescriptors(rendered, notionPage, mdFilePath, imagePathFunc=None, uploadWorkers=None,
+        uploadCache=None, imageOptimizer=None):
+    """
+    The upload half of sync(), for block descriptors that have already been converted
+    @param {dict[]} rendered Block descriptors, output from convert()
+    @param {NotionBlock} notionPage The Notion.so block to sync the blocks to
+    @param {string} mdFilePath The path to the markdown file to find images with
+    @see sync() for the rest of the parameters
+    """
+    uploadPool = None
+    if uploadWorkers or uploadCache is not None or imageOptimizer is not None:
+        uploadPool = FileUploadPool(uploadWorkers or 1, uploadCache, imageOptimizer)
+    def createBlock(blockDescriptor, blockParent):
+        return uploadBlock(blockDescriptor, blockParent, mdFilePath, imagePathFunc, uploadPool)
+    stats = syncBlocks(rendered, notionPage, createBlock)
+
+    if uploadPool:
+        with uploadPool:
+            for path, e in uploadPool.wait():
+                print(f"ERROR: Could not upload file '{path}': {e}")
+    return stats
+
+
+def expandPathsUrls(paths):
+    """
+    Takes paths, globs or URLs and yields (path, fileName) tuples for every file
+    they refer to
     """
     for path in paths:
         if '://' in path:
-            r = requests.get(path)
-            if not r.status_code < 300: #TODO: Make this better..., should only accept success
-                raise RuntimeError(f'Could not get file {path}, HTTP {r.status_code}')
             fileName = path.split('?')[0]
             fileName = fileName.split('/')[-1]
-            fileLike = io.StringIO(r.text)
-            fileLike.name = path
-            yield (path, fileName, fileLike)
+            yield (path, fileName)
         else:
             globPaths = glob.glob(path, recursive=True)
             if not globPaths:
                 raise RuntimeError(f'No file found for glob {path}')
             for path in globPaths:
-                with open(path, "r", encoding="utf-8") as file:
-                    yield (path, os.path.basename(path), file)
-
-def cli(argv):
-    parser = argparse.ArgumentParser(description='Uploads Markdown files to Notion.so')
-    parser.add_argument('token_v2', type=str,
-                        help='the token for your Notion.so session')
-    parser.add_argument('page_url', type=str,
-                        help='the url of the Notion.so page you want to upload your Markdown files to')
-    parser.add_argument('md_path_url', type=str, nargs='+',
-                        help='A path, glob, or url to the Markdown file you want to upload')
-    parser.add_argument('--create', action='store_const', dest='mode', const='create',
-                        help='Create a new child page (default)')
-    parser.add_argument('--append', action='store_const', dest='mode', const='append',
-                        help='Append to page instead of creating a child page')
-    parser.add_argument('--clear-previous', action='store_const', dest='mode', const='clear',
-                        help='Clear a previous child page with the same name if it exists')
-    parser.set_defaults(mode='create')
-    parser.add_argument('--html-img', action='store_true', default=False,
-                        help="Upload images in HTML <img> tags (disabled by default)")
-    parser.add_argument('--latex', action='store_true', default=False,
-                        help="Support for latex inline ($..$) and block ($$..$$) equations (disabled by default)")
-
-    args = parser.parse_args(argv)
-
-    notionPyRendererCls = NotionPyRenderer
-    if args.html_img:
-        notionPyRendererCls = addHtmlImgTagExtension(notionPyRendererCls)
-    if args.latex:
-        notionPyRendererCls = addLatexExtension(notionPyRendererCls)
-
-    print("Initializing Notion.so client...")
-    client = NotionClient(token_v2=args.token_v2)
-    print("Getting target PageBlock...")
-    page = client.get_block(args.page_url)
-    uploadPage = page
-
-    for mdPath, mdFileName, mdFile in filesFromPathsUrls(args.md_path_url):
-        if args.mode == 'create' or args.mode == 'clear':
-            # Clear any old pages if it's a PageBlock that has the same name
-            if args.mode == 'clear':
-                for child in [c for c in page.children if isinstance(c, PageBlock) and c.title == mdFileName]:
+                yield (path, os.path.basename(path))
+
+def readPathUrl(path, session=None, fetcher=None):
+    """
+    Reads the whole text of a file path or URL from expandPathsUrls()
+    @param {str} path
+    @param {requests.Session|None} [session=None] The session to get URLs with
+    @param {UrlFetcher|None} [fetcher=None] The fetcher to get URLs with, instead
+    of a new one using session
+    """
+    if '://' in path:
+        return (fetcher or UrlFetcher(session)).fetch(path)
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read()
+
+def filesFromPathsUrls(paths, session=None, fetcher=None):
+    """
+    Takes paths or URLs and yields file (path, fileName, file) tuples for 
+    them
+    @param {requests.Session|None} [session=None] See readPathUrl()
+    @param {UrlFetcher|None} [fetcher=None] See openPathsUrls()
+    """
+    return openPathsUrls(expandPathsUrls(paths), session, fetcher)
+
+def openPathsUrls(pathsUrls, session=None, fetcher=None):
+    """
+    filesFromPathsUrls() for (path, fileName) tuples that were already expanded
+    with expandPathsUrls(). The URLs coming up are fetched ahead of time, up to
+    the fetcher's maxWorkers at once
+    @param {UrlFetcher|None} [fetcher=None] The fetcher to get URLs with, a new one
+    using session if not given
+    """
+    fetcher = fetcher or UrlFetcher(session)
+    def prefetched():
+        for path, fileName in pathsUrls:
+            yield (path, fileName, fetcher.submit(path) if '://' in path else None)
+    for path, fileName, future in runAhead(prefetched(), fetcher.maxWorkers):
+        if future:
+            fileLike = io.StringIO(future.result())
+            fileLike.name = path
+            yield (path, fileName, fileLike)
+        else:
+            with open(path, "r", encoding="utf-8") as file:
+                yield (path, fileName, file)
+
+def fileJournal(journal, mdPath):
+    """
+    @returns {FileJournal|None} The part of journal for mdPath, if there's a journal
+    """
+    return journal.file(mdPath) if journal else None
+
+class ChildPages:
+    """
+    The child pages of a page by title. The children are read once and kept up to
+    date as pages are added and removed through it, so finding the page for every
+    file of a run doesn't have to go through all the children again.
+    """
+
+    def __init__(self, page):
+        """
+        @param {NotionBlock} page The page whose children to index
+        """
+        self.page = page
+        self._byTitle = {}
+        for child in page.children:
+            if isinstance(child, PageBlock):
+                self._byTitle.setdefault(child.title, []).append(child)
+
+    def find(self, title):
+        """
+        @returns {PageBlock[]} The child pages with the title, in order
+        """
+        return list(self._byTitle.get(title, []))
+
+    def add(self, title):
+        """
+        Makes a new child page
+        @returns {PageBlock} The new page
+        """
+        newPage = self.page.children.add_new(PageBlock, title=title)
+        self._byTitle.setdefault(title, []).append(newPage)
+        return newPage
+
+    def remove(self, titles, keepIds=(), batchSize=100):
+        """
+        Removes every child page with one of the titles, batchSize pages per
+        Notion.so transaction instead of a round trip for every page
+        @param {iterable} titles The titles of the pages to remove
+        @param {set} [keepIds=()] The ids of pages to keep even if they have one of the titles
+        @param {int} [batchSize=100] The max number of pages to remove per transaction
+        @returns {PageBlock[]} The pages that were removed
+        """
+        stale = []
+        for title in dict.fromkeys(titles):
+            pages = self._byTitle.get(title, [])
+            stale += [p for p in pages if p.id not in keepIds]
+            self._byTitle[title] = [p for p in pages if p.id in keepIds]
+        notionClient = self.page._client #Hacky internals stuff...
+        for start in range(0, len(stale), batchSize):
+            with notionClient.as_atomic_transaction():
+                for child in stale[start:start + batchSize]:
                     print(f"Removing previous {child.title}...")
                     child.remove()
-            # Make the new page in Notion.so
-            uploadPage = page.children.add_new(PageBlock, title=mdFileName)
-        print(f"Uploading {mdPath} to Notion.so at page {uploadPage.title}...")
-        upload(mdFile, uploadPage, None, notionPyRendererCls)
+        return stale
+
+def targetPage(page, mode, mdFileName, journal=None, childPages=None):
+    """
+    Gets the page to upload a file to for the mode we're in
+    @param {NotionBlock} page The page given on the command line
+    @param {str} mode One of the addModeArguments() modes
+    @param {str} mdFileName The name of the file being uploaded
+    @param {FileJournal|None} [journal=None] If given, the page is recorded in it and
+    the page it already has (from an upload that was stopped part way) is used instead
+    @param {ChildPages|None} [childPages=None] The children of page, pass the same one
+    for every file of a run so they're only read once
+    @returns {tuple} (NotionBlock, bool) The page, and whether to sync to it
+    """
+    if mode == 'append':
+        return (page, False)
+    if journal and journal.pageId:
+        return (page._client.get_block(journal.pageId), False)
+    if childPages is None:
+        childPages = ChildPages(page)
+    if mode == 'sync':
+        syncPages = childPages.find(mdFileName)
+        if syncPages:
+            return (syncPages[0], True)
+    # Clear any old pages if it's a PageBlock that has the same name
+    if mode == 'clear':
+        childPages.remove([mdFileName])
+    # Make the new page in Notion.so
+    newPage = childPages.add(mdFileName)
+    if journal:
+        journal.setPage(newPage.id)
+    return (newPage, False)
+
+def clearPreviousPages(childPages, mdPaths, journal=None):
+    """
+    Removes the previous pages of every file to upload at once for --clear-previous,
+    instead of one at a time as each file is uploaded
+    @param {ChildPages} childPages The children of the page given on the command line
+    @param {tuple[]} mdPaths (path, fileName) for every file to upload
+    @param {UploadJournal|None} [journal=None] Pages it has recorded are kept, they're
+    the ones being resumed
+    """
+    keepIds = { journal.file(mdPath).pageId for mdPath, mdFileName in mdPaths } if journal else set()
+    childPages.remove([mdFileName for mdPath, mdFileName in mdPaths], keepIds)
 
 
 if __name__ == "__main__":
@@ -27,6 +27,10 @@ setup(
         'notion>=0.0.28',
         'requests>=2.22.0',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+        'images': ['Pillow>=7.0'],
+    },
     keywords='notion notion.so notion-py markdown md converter',
     packages=['md2notion']
 )
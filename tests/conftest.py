@@ -1,3 +1,99 @@
+import uuid
+import pytest
+from contextlib import contextmanager
+from notion.block import BLOCK_TYPES, PageBlock
+from notion.client import NotionClient
+from notion.store import RecordStore
+from tests.stubServer import StubNotionServer
+
 def pytest_generate_tests(metafunc):
     if "headerLevel" in metafunc.fixturenames:
-        metafunc.parametrize("headerLevel", map(lambda n: n+1, range(6)))
\ No newline at end of file
+        metafunc.parametrize("headerLevel", map(lambda n: n+1, range(6)))
+
+class MockNotionClient:
+    '''
+    A notion-py NotionClient that keeps all its records in memory instead of
+    talking to Notion.so, so real notion-py Blocks can be used in tests
+    '''
+    _monitor = None
+
+    def __init__(self):
+        self._store = RecordStore(self)
+        self.transactions = []
+        self._ops = None
+
+    def get_record_data(self, table, id, force_refresh=False):
+        data = self._store._get(table, id)
+        return data if isinstance(data, dict) else None
+
+    def get_block(self, id, force_refresh=False):
+        data = self.get_record_data("block", id)
+        if not data or not data.get("alive", True):
+            return None
+        return BLOCK_TYPES.get(data["type"], PageBlock)(self, id)
+
+    def refresh_records(self, **kwargs):
+        pass
+
+    def in_transaction(self):
+        return self._ops is not None
+
+    @contextmanager
+    def as_atomic_transaction(self):
+        if self.in_transaction():
+            yield
+            return
+        self._ops = []
+        try:
+            yield
+        finally:
+            ops, self._ops = self._ops, None
+        self.submit_transaction(ops)
+
+    def submit_transaction(self, operations, update_last_edited=True):
+        if isinstance(operations, dict):
+            operations = [operations]
+        if self.in_transaction():
+            self._ops += operations
+            return
+        if operations:
+            self.transactions.append(operations)
+        self._store.run_local_operations(operations)
+
+    def create_record(self, table, parent, **kwargs):
+        recordId = str(uuid.uuid4())
+        childListKey = kwargs.pop("child_list_key", None) or parent.child_list_key
+        with self.as_atomic_transaction():
+            self.submit_transaction({ "id": recordId, "table": table, "path": [], "command": "set",
+                "args": { "id": recordId, "alive": True, "parent_id": parent.id,
+                    "parent_table": parent._table, **kwargs } })
+            if childListKey:
+                self.submit_transaction({ "id": parent.id, "table": parent._table,
+                    "path": [childListKey], "command": "listAfter", "args": { "id": recordId } })
+        return recordId
+
+    def addPage(self, title=""):
+        '''Makes a new root PageBlock'''
+        pageId = str(uuid.uuid4())
+        self._store.run_local_operation("block", pageId, [], "set",
+            { "id": pageId, "type": "page", "alive": True })
+        page = self.get_block(pageId)
+        page.title = title
+        return page
+
+@pytest.fixture
+def notionClient():
+    return MockNotionClient()
+
+@pytest.fixture
+def stubServer():
+    with StubNotionServer(seed=0) as server, server.patchNotionPy():
+        yield server
+
+@pytest.fixture
+def stubPage(stubServer):
+    '''Makes a new top level page on stubServer, returning it as a notion-py PageBlock'''
+    def newPage(title='Page'):
+        client = NotionClient(token_v2='anything')
+        return client.get_block(stubServer.pageUrl(stubServer.addPage(title)))
+    return newPage
@@ -0,0 +1,316 @@
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest.mock import patch
+from notion.settings import S3_URL_PREFIX
+
+
+def applyOperation(records, table, id, path, command, args):
+    """
+    Applies a submitTransaction operation to records, the same way Notion.so (and
+    notion-py's RecordStore.run_local_operation()) does
+    @param {dict} records table => id => record
+    """
+    record = records.setdefault(table, {}).setdefault(id, {})
+    path = list(path)
+    ref = record
+    while len(path) > 1 or (path and command != "set"):
+        comp = path.pop(0)
+        if comp not in ref:
+            ref[comp] = [] if "list" in command else {}
+        ref = ref[comp]
+
+    if command == "update":
+        ref.update(args)
+    elif command == "set":
+        if path:
+            ref[path[0]] = args
+        else:
+            ref.clear()
+            ref.update(args)
+    elif command == "listAfter":
+        if "after" in args and args["after"] in ref:
+            ref.insert(ref.index(args["after"]) + 1, args["id"])
+        else:
+            ref.append(args["id"])
+    elif command == "listBefore":
+        if "before" in args and args["before"] in ref:
+            ref.insert(ref.index(args["before"]), args["id"])
+        else:
+            ref.insert(0, args["id"])
+    elif command == "listRemove":
+        if args["id"] in ref:
+            ref.remove(args["id"])
+    else:
+        raise ValueError(f"Unknown command {command}")
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    http.server.ThreadingHTTPServer, which isn't in Python 3.6
+    """
+    daemon_threads = True
+
+
+class StubStats:
+    """
+    What a StubNotionServer has been asked to do
+    """
+
+    def __init__(self):
+        self.requests = Counter() #By endpoint
+        self.operations = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.rateLimited = 0
+        self.errors = 0
+
+    @property
+    def totalRequests(self):
+        return sum(self.requests.values())
+
+    def __repr__(self):
+        return f"{self.totalRequests} requests ({self.operations} operations, " \
+            f"{self.rateLimited} rate limited, {self.errors} errors), " \
+            f"{self.bytesIn} bytes in, {self.bytesOut} bytes out"
+
+
+class StubNotionServer:
+    """
+    A local stand-in for the parts of the Notion.so API that notion-py (and
+    md2notion) use, for testing and benchmarking uploads without a Notion.so account.
+    It keeps every record in memory, applies transactions like Notion.so does, and
+    accepts file uploads itself. It can add latency, fail requests at random, and
+    rate limit with 429s, and it counts the requests and bytes it sees.
+    Use it as a context manager and point notion-py at it with patchNotionPy():
+        with StubNotionServer(latency=0.05) as server, server.patchNotionPy():
+            client = NotionClient(token_v2="anything")
+            page = client.get_block(server.pageUrl(server.addPage("Test")))
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0, errorRate=0, errorStatus=500,
+            rateLimit=None, seed=None):
+        """
+        @param {str} [host="127.0.0.1"] The host to listen on
+        @param {int} [port=0] The port to listen on, any free port by default
+        @param {float} [latency=0] Seconds to wait before answering every request
+        @param {float} [errorRate=0] The fraction of requests to fail with errorStatus
+        @param {int} [errorStatus=500] The HTTP status to fail requests with
+        @param {float|None} [rateLimit=None] If given, answer requests over this many
+        per second with 429s
+        @param {int|None} [seed=None] Seed for the random errors
+        """
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.rateLimit = rateLimit
+        self.stats = StubStats()
+        self.userId = str(uuid.uuid4())
+        self.spaceId = str(uuid.uuid4())
+        self.records = {
+            "notion_user": { self.userId: { "id": self.userId, "email": "stub@example.com" } },
+            "space": { self.spaceId: { "id": self.spaceId, "name": "Stub", "pages": [] } },
+        }
+        self.files = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._allowance = rateLimit
+        self._lastRequest = time.monotonic()
+        self._httpServer = ThreadingHTTPServer((host, port), self._handlerClass())
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpServer.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpServer.shutdown()
+        self._httpServer.server_close()
+
+    @property
+    def url(self):
+        host, port = self._httpServer.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def apiBaseUrl(self):
+        return self.url + "api/v3/"
+
+    @contextmanager
+    def patchNotionPy(self):
+        """
+        Sends all of notion-py's API requests to this server while active
+        """
+        with patch("notion.client.API_BASE_URL", self.apiBaseUrl):
+            yield
+
+    def addPage(self, title=""):
+        """
+        Makes a new top level page
+        @returns {str} The id of the page
+        """
+        pageId = str(uuid.uuid4())
+        with self._lock:
+            self.records.setdefault("block", {})[pageId] = {
+                "id": pageId, "type": "page", "alive": True, "version": 1,
+                "parent_id": self.spaceId, "parent_table": "space",
+                "properties": { "title": [[title]] }
+            }
+            self.records["space"][self.spaceId]["pages"].append(pageId)
+        return pageId
+
+    def pageUrl(self, pageId):
+        """
+        @returns {str} A Notion.so url for the page, for NotionClient.get_block()
+        """
+        return "https://www.notion.so/Page-" + pageId.replace("-", "")
+
+    def children(self, blockId):
+        """
+        @returns {dict[]} The alive child block records of a block, in order
+        """
+        blocks = self.records.get("block", {})
+        return [blocks[c] for c in blocks[blockId].get("content", []) \
+            if c in blocks and blocks[c].get("alive", True)]
+
+    def _checkLimits(self):
+        """
+        @returns {tuple|None} (status, headers) to fail the request with, if any
+        """
+        with self._lock:
+            if self.rateLimit:
+                #Token bucket, refilled at rateLimit requests per second
+                now = time.monotonic()
+                self._allowance = min(self.rateLimit,
+                    self._allowance + (now - self._lastRequest) * self.rateLimit)
+                self._lastRequest = now
+                if self._allowance < 1:
+                    self.stats.rateLimited += 1
+                    retryAfter = (1 - self._allowance) / self.rateLimit
+                    return (429, { "Retry-After": f"{retryAfter:.3f}" })
+                self._allowance -= 1
+            if self.errorRate and self._random.random() < self.errorRate:
+                self.stats.errors += 1
+                return (self.errorStatus, {})
+        return None
+
+    def _recordResponse(self, table, id):
+        record = self.records.get(table, {}).get(id)
+        return { "role": "editor", "value": record } if record is not None else { "role": "none" }
+
+    def _post(self, endpoint, data):
+        """
+        @returns {dict} The response for an API endpoint
+        """
+        records = self.records
+        if endpoint == "loadUserContent":
+            return { "recordMap": {
+                "notion_user": { self.userId: self._recordResponse("notion_user", self.userId) },
+                "space": { self.spaceId: self._recordResponse("space", self.spaceId) },
+            }}
+        if endpoint == "getRecordValues":
+            return { "results": [self._recordResponse(r["table"], r["id"]) for r in data["requests"]] }
+        if endpoint == "loadPageChunk":
+            #The page and everything in it, but not subpages' contents
+            blockIds = [data["pageId"]]
+            found = {}
+            while blockIds:
+                blockId = blockIds.pop()
+                if blockId in found or blockId not in records.get("block", {}):
+                    continue
+                found[blockId] = self._recordResponse("block", blockId)
+                block = records["block"][blockId]
+                if block.get("type") != "page" or blockId == data["pageId"]:
+                    blockIds += block.get("content", [])
+            return { "recordMap": { "block": found }, "cursor": { "stack": [] } }
+        if endpoint == "submitTransaction":
+            for op in data["operations"]:
+                applyOperation(records, **op)
+            self.stats.operations += len(data["operations"])
+            return {}
+        if endpoint == "getUploadFileUrl":
+            fileKey = f"{uuid.uuid4()}/{data['name']}"
+            return {
+                "url": S3_URL_PREFIX + fileKey,
+                "signedPutUrl": self.url + "s3/" + fileKey,
+            }
+        if endpoint == "queryCollection":
+            view = records.get("collection_view", {}).get(data["collectionViewId"], {})
+            rows = [b for b in records.get("block", {}).values() \
+                if b.get("parent_id") == data["collectionId"] and b.get("alive", True)]
+            order = view.get("page_sort", [])
+            rows.sort(key=lambda b: order.index(b["id"]) if b["id"] in order else len(order))
+            return {
+                "result": { "type": "table", "blockIds": [b["id"] for b in rows], "total": len(rows) },
+                "recordMap": { "block": { b["id"]: self._recordResponse("block", b["id"]) for b in rows } },
+            }
+        return None
+
+    def _handlerClass(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass #Don't spam the benchmarks
+
+            def _read(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.stats.bytesIn += len(body)
+                return body
+
+            def _respond(self, status, body=b"", headers={}):
+                self.send_response(status)
+                for key, val in headers.items():
+                    self.send_header(key, val)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.stats.bytesOut += len(body)
+
+            def _handle(self, endpoint, respond):
+                body = self._read()
+                with server._lock:
+                    server.stats.requests[endpoint] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                failure = server._checkLimits()
+                if failure:
+                    self._respond(failure[0], b"{}", failure[1])
+                    return
+                respond(body)
+
+            def do_POST(self):
+                endpoint = self.path.split("/")[-1]
+                def respond(body):
+                    with server._lock:
+                        result = server._post(endpoint, json.loads(body or b"{}"))
+                    if result is None:
+                        self._respond(404, b"{}")
+                        return
+                    self._respond(200, json.dumps(result).encode("utf-8"),
+                        { "Content-Type": "application/json" })
+                self._handle(endpoint, respond)
+
+            def do_PUT(self):
+                def respond(body):
+                    with server._lock:
+                        server.files[self.path[len("/s3/"):]] = body
+                    self._respond(200)
+                self._handle("s3", respond)
+
+        return Handler
@@ -2,9 +2,12 @@
 Tests NotionPyRenderer parsing
 '''
 import re
+from collections.abc import Mapping
+import pytest
 import mistletoe
 import notion
-from md2notion.NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension, addLatexExtension
+from md2notion.NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension, addHtmlFormattingExtension, \
+    addLatexExtension
 
 def test_header(capsys, headerLevel):
     '''it renders a range of headers, warns if it cant render properly'''
@@ -15,7 +18,7 @@ def test_header(capsys, headerLevel):
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     if headerLevel > 3: #Should print error
         assert re.search(r"not support", captured.out, re.I) #Should print out warning
     if headerLevel == 1:
@@ -34,7 +37,7 @@ def test_list():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.BulletedListBlock
     assert output['title'] == 'asdf'
 
@@ -46,7 +49,7 @@ def test_list_numbered():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.NumberedListBlock
     assert output['title'] == 'asdf'
 
@@ -62,14 +65,14 @@ def test_list2():
 
     #assert
     assert len(output) == 3
-    assert isinstance(output[0], dict)
+    assert isinstance(output[0], Mapping)
     assert output[0]['type'] == notion.block.BulletedListBlock
     assert output[0]['title'] == '[] Really'
-    assert isinstance(output[1], dict)
+    assert isinstance(output[1], Mapping)
     assert output[1]['type'] == notion.block.TodoBlock
     assert output[1]['title'] == 'big'
     assert output[1]['checked'] == False
-    assert isinstance(output[2], dict)
+    assert isinstance(output[2], Mapping)
     assert output[2]['type'] == notion.block.TodoBlock
     assert output[2]['title'] == 'uwu'
     assert output[2]['checked'] == True
@@ -82,7 +85,7 @@ def test_quote():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.QuoteBlock
     assert output['title'] == "Quoth thee 'Mr. Obama... Hewwo? MR OBAMA??'"
 
@@ -94,7 +97,7 @@ def test_image():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.ImageBlock
 
 def test_imageInLink():
@@ -104,10 +107,10 @@ def test_imageInLink():
 
     #assert
     assert len(output) == 2
-    assert isinstance(output[0], dict)
+    assert isinstance(output[0], Mapping)
     assert output[0]['type'] == notion.block.TextBlock
     assert output[0]['title'] == "[](https://cobertos.com)" #Should extract the image
-    assert isinstance(output[1], dict) #The ImageBlock can't be in a link in Notion, so we get it outside
+    assert isinstance(output[1], Mapping) #The ImageBlock can't be in a link in Notion, so we get it outside
     assert output[1]['type'] == notion.block.ImageBlock
 
 def test_imageBlockText():
@@ -117,10 +120,10 @@ def test_imageBlockText():
 
     #assert
     assert len(output) == 2
-    assert isinstance(output[0], dict)
+    assert isinstance(output[0], Mapping)
     assert output[0]['type'] == notion.block.TextBlock
     assert output[0]['title'] == "**texttexttexttext**" #Should extract the image
-    assert isinstance(output[1], dict) #The ImageBlock can't be inline with anything else so it comes out
+    assert isinstance(output[1], Mapping) #The ImageBlock can't be inline with anything else so it comes out
     assert output[1]['type'] == notion.block.ImageBlock
 
 def test_imageInHtml():
@@ -131,10 +134,10 @@ def test_imageInHtml():
 
     #assert
     assert len(output) == 2
-    assert isinstance(output[0], dict)
+    assert isinstance(output[0], Mapping)
     assert output[0]['type'] == notion.block.TextBlock
     assert output[0]['title'] == "headtail" #Should extract the image
-    assert isinstance(output[1], dict) #The ImageBlock can't be inline with anything else so it comes out
+    assert isinstance(output[1], Mapping) #The ImageBlock can't be inline with anything else so it comes out
     assert output[1]['type'] == notion.block.ImageBlock
     assert output[1]['caption'] is None
 
@@ -149,16 +152,50 @@ tail
 
     #assert
     assert len(output) == 3
-    assert isinstance(output[0], dict)
+    assert isinstance(output[0], Mapping)
     assert output[0]['type'] == notion.block.TextBlock
     assert output[0]['title'] == "<div>text in div</div>" #Should extract the image
-    assert isinstance(output[1], dict)
+    assert isinstance(output[1], Mapping)
     assert output[1]['type'] == notion.block.ImageBlock
     assert output[1]['caption'] == "ImCaption"
-    assert isinstance(output[2], dict)
+    assert isinstance(output[2], Mapping)
     assert output[2]['type'] == notion.block.TextBlock
     assert output[2]['title'] == "tail"
 
+@pytest.mark.parametrize('html', [
+    '<div class="note">\n<p>text <b>bold</b></p>\n</div>', #Nothing to take out, isn't parsed
+    '<div>\n<!-- comment -->text &amp; <br/>more</DIV>', #Parsed
+])
+def test_htmlBlock_as_text(html):
+    '''it keeps html without images as it is, except what the html parser takes out'''
+    #arrange/act
+    output = mistletoe.markdown(html, addHtmlImgTagExtension(NotionPyRenderer))
+
+    #assert
+    assert [b['type'] for b in output] == [notion.block.TextBlock]
+    assert output[0]['title'] == html.replace('<!-- comment -->', '').replace('&amp;', '&') \
+        .replace('</DIV>', '</div>')
+
+def test_htmlFormatting():
+    '''it turns simple inline tags into Notion.so formatting, even across html spans'''
+    #arrange/act
+    output = mistletoe.markdown('a <b>bold</b>, <EM>it</EM>, <code>c</code>, <del>no</del> and '
+        '<a href="https://cobertos.com">a <i>link</i></a><a>plain</a> <span>kept</span><img src="a.png" />',
+        addHtmlFormattingExtension(NotionPyRenderer))
+
+    #assert
+    assert [b['type'] for b in output] == [notion.block.TextBlock, notion.block.ImageBlock]
+    assert output[0]['title'] == 'a **bold**, *it*, `c`, ~no~ and [a *link*](https://cobertos.com)plain <span>kept</span>'
+    assert output[1]['source'] == 'a.png'
+
+def test_htmlFormatting_block():
+    '''it turns simple inline tags in html blocks into Notion.so formatting'''
+    #arrange/act
+    output = mistletoe.markdown('<p>\n<strong>bold</strong> <br/>line\n</p>', addHtmlFormattingExtension(NotionPyRenderer))
+
+    #assert
+    assert [b['title'] for b in output] == ['<p>\n**bold** <br/>line\n</p>']
+
 def test_latex_inline():
     output = mistletoe.markdown(r"""
 # Test for latex blocks
@@ -233,7 +270,7 @@ def test_table():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.CollectionViewBlock
 
     assert isinstance(output['schema'], dict)
@@ -257,6 +294,22 @@ def test_table():
     assert output['rows'][0] == ['Test100', 'Test200', 'Test300']
     assert output['rows'][1] == ['', 'Test400', '']
 
+def test_table_stable_column_ids():
+    '''it gives columns the same ids every time, unique even for columns with the same name'''
+    #arrange
+    mdText = '| A | A | A | B |\n|---|---|---|---|\n| 1 | 2 | 3 | 4 |\n'
+
+    #act
+    first = mistletoe.markdown(mdText, NotionPyRenderer)[0]['schema']
+    second = mistletoe.markdown(mdText, NotionPyRenderer)[0]['schema']
+
+    #assert
+    assert first == second
+    assert list(first.keys()) == list(second.keys())
+    assert len(first) == 4
+    assert all(len(colId) == 4 and all(32 <= ord(c) < 126 for c in colId) \
+        for colId in list(first.keys())[:-1])
+
 def test_nested_list():
     '''it should render nested lists'''
     #arrange/act
@@ -269,13 +322,13 @@ def test_nested_list():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.BulletedListBlock
     assert output['title'] == 'Awoo'
 
     assert len(output['children']) == 1
     outputChild = output['children'][0]
-    assert isinstance(outputChild, dict)
+    assert isinstance(outputChild, Mapping)
     assert outputChild['type'] == notion.block.BulletedListBlock
     assert outputChild['title'] == 'Hewwo'
 
@@ -294,7 +347,7 @@ def get_favorite_fruit():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.CodeBlock
     assert output['title_plaintext'] == expected
     assert output['language'] == 'Python'
@@ -313,11 +366,55 @@ def test_code_block_without_language():
     #assert
     assert len(output) == 1
     output = output[0]
-    assert isinstance(output, dict)
+    assert isinstance(output, Mapping)
     assert output['type'] == notion.block.CodeBlock
     assert output['title_plaintext'] == expected
     assert output['language'] == "Plain Text"
 
+@pytest.mark.parametrize('language,expected', [
+    ('python', 'Python'),
+    ('PY', 'Python'),
+    ('js', 'JavaScript'),
+    ('java', 'Java'),
+    ('sh', 'Shell'),
+    ('bash', 'Bash'),
+    ('yml', 'YAML'),
+    ('c', 'C'),
+    ('cpp', 'C++'),
+    ('type', 'TypeScript'),
+])
+def test_code_block_language_aliases(language, expected):
+    '''it should resolve code fence languages by name, alias and prefix'''
+    #arrange/act
+    output = mistletoe.markdown(f"```{language}\nx\n```", NotionPyRenderer)
+
+    #assert
+    assert output[0]['language'] == expected
+
+def test_code_block_unknown_language(capsys):
+    '''it should warn about languages Notion.so doesn't have'''
+    #arrange/act
+    output = mistletoe.markdown("```my_made_up_language\nx\n```", NotionPyRenderer)
+    captured = capsys.readouterr()
+
+    #assert
+    assert output[0]['language'] == ""
+    assert re.search(r"no corresponding syntax", captured.out, re.I)
+
+def test_code_block_language_aliases_subclass():
+    '''it should let subclasses add their own aliases'''
+    #arrange
+    class GqlRenderer(NotionPyRenderer):
+        codeLanguageAliases = { **NotionPyRenderer.codeLanguageAliases, 'gql': 'GraphQL' }
+
+    #act
+    output = mistletoe.markdown("```gql\nx\n```", GqlRenderer)
+    baseOutput = mistletoe.markdown("```gql\nx\n```", NotionPyRenderer)
+
+    #assert
+    assert output[0]['language'] == 'GraphQL'
+    assert baseOutput[0]['language'] == ''
+
 def test_big_file():
     '''it should be able to render a full Markdown file'''
     #arrange/act
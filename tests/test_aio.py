@@ -0,0 +1,122 @@
+'''
+Tests the asyncio upload engine against a local stand-in for Notion.so
+'''
+import asyncio
+import pytest
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import mistletoe
+from md2notion.NotionPyRenderer import NotionPyRenderer
+from md2notion.aio import AsyncNotionClient, uploadAsync
+from notion.settings import S3_URL_PREFIX
+
+def stubNotionApp(requests):
+    '''A tiny Notion.so API that records every request made to it'''
+    async def loadUserContent(request):
+        requests.append(('loadUserContent', await request.json()))
+        return web.json_response({ 'recordMap': { 'notion_user': { 'user-id': {} } } })
+    async def submitTransaction(request):
+        requests.append(('submitTransaction', await request.json()))
+        return web.json_response({})
+    async def getUploadFileUrl(request):
+        data = await request.json()
+        requests.append(('getUploadFileUrl', data))
+        return web.json_response({
+            'url': S3_URL_PREFIX + 'file-id/' + data['name'],
+            'signedPutUrl': str(request.url.with_path('/put/' + data['name']))
+        })
+    async def put(request):
+        requests.append(('put', await request.read()))
+        return web.Response()
+    @web.middleware
+    async def recordCookies(request, handler):
+        requests.append(('cookies', (request.path, dict(request.cookies))))
+        return await handler(request)
+    app = web.Application(middlewares=[recordCookies])
+    app.router.add_post('/api/v3/loadUserContent', loadUserContent)
+    app.router.add_post('/api/v3/submitTransaction', submitTransaction)
+    app.router.add_post('/api/v3/getUploadFileUrl', getUploadFileUrl)
+    app.router.add_put('/put/{name}', put)
+    return app
+
+def runWithStub(coroutineFunc):
+    requests = []
+    async def run():
+        server = TestServer(stubNotionApp(requests))
+        await server.start_server()
+        try:
+            async with AsyncNotionClient('token', apiBaseUrl=str(server.make_url('/api/v3/'))) as client:
+                return await coroutineFunc(client)
+        finally:
+            await server.close()
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run()), requests
+    finally:
+        loop.close()
+
+def test_uploadAsync():
+    '''creates the blocks and their children in order, in batches'''
+    #arrange
+    rendered = mistletoe.markdown("# Title\n\n* list\n  * nested\n\nText\n", NotionPyRenderer)
+
+    #act
+    errors, requests = runWithStub(lambda client: uploadAsync(client, rendered, 'page-id', '', batchSize=2))
+
+    #assert
+    assert errors == []
+    transactions = [data['operations'] for endpoint, data in requests if endpoint == 'submitTransaction']
+    assert len(transactions) == 2
+    creates = [op for ops in transactions for op in ops if op['path'] == [] and op['table'] == 'block']
+    assert [op['args']['type'] for op in creates] == ['header', 'bulleted_list', 'bulleted_list', 'text']
+    assert all(op['args']['created_by_id'] == 'user-id' for op in creates)
+    assert creates[2]['args']['parent_id'] == creates[1]['id']
+    appends = [op for ops in transactions for op in ops if op['command'] == 'listAfter']
+    assert [op['id'] for op in appends] == ['page-id', 'page-id', creates[1]['id'], 'page-id']
+
+def test_uploadAsync_image_local():
+    '''uploads local files and points their blocks at them'''
+    #arrange
+    rendered = mistletoe.markdown("![](TEST_IMAGE.png)\n\n![](NON_EXIST.png)", NotionPyRenderer)
+
+    #act
+    errors, requests = runWithStub(lambda client: uploadAsync(client, rendered, 'page-id', 'tests/DUMMY.md'))
+
+    #assert
+    assert errors == []
+    puts = [data for endpoint, data in requests if endpoint == 'put']
+    with open('tests/TEST_IMAGE.png', 'rb') as f:
+        assert puts == [f.read()]
+    fileOps = [data['operations'] for endpoint, data in requests if endpoint == 'submitTransaction'][-1]
+    assert { 'id': fileOps[0]['id'], 'table': 'block', 'command': 'set', 'path': ['properties', 'source'],
+        'args': [[S3_URL_PREFIX + 'file-id/TEST_IMAGE.png']] } in fileOps
+
+def test_uploadAsync_collection():
+    '''creates tables with all their rows without reading anything back'''
+    #arrange
+    rendered = mistletoe.markdown("| A | B |\n|---|---|\n| 1 | 2 |\n| 3 | 4 |\n", NotionPyRenderer)
+
+    #act
+    errors, requests = runWithStub(lambda client: uploadAsync(client, rendered, 'page-id', ''))
+
+    #assert
+    ops = [data['operations'] for endpoint, data in requests if endpoint == 'submitTransaction'][0]
+    tables = [op['table'] for op in ops if op['path'] == []]
+    assert tables == ['block', 'collection', 'collection_view', 'block', 'block']
+    rows = [op['args'] for op in ops if op['path'] == [] and op['args'].get('parent_table') == 'collection']
+    assert [r['properties']['title'] for r in rows] == [[['2']], [['4']]]
+
+def test_AsyncNotionClient_cookies():
+    '''only sends token_v2 to the API, not with the file uploads'''
+    #arrange
+    rendered = mistletoe.markdown("![](TEST_IMAGE.png)", NotionPyRenderer)
+
+    #act
+    errors, requests = runWithStub(lambda client: uploadAsync(client, rendered, 'page-id', 'tests/DUMMY.md'))
+
+    #assert
+    cookies = [data for endpoint, data in requests if endpoint == 'cookies']
+    assert ('/put/TEST_IMAGE.png', {}) in cookies
+    assert ('/api/v3/getUploadFileUrl', { 'token_v2': 'token' }) in cookies
+    assert all(c == { 'token_v2': 'token' } for path, c in cookies if path.startswith('/api/'))
@@ -0,0 +1,73 @@
+'''
+Tests BlockDescriptor
+'''
+import pickle
+from collections.abc import Mapping
+import mistletoe
+from unittest.mock import Mock
+from notion.block import TextBlock, ImageBlock
+from md2notion.blockDescriptor import BlockDescriptor
+from md2notion.NotionPyRenderer import NotionPyRenderer
+from md2notion.upload import uploadBlock
+
+def test_BlockDescriptor_dict_compatible():
+    '''it works like a dict'''
+    #arrange
+    descriptor = BlockDescriptor(ImageBlock, source='a.png', caption='A')
+
+    #act
+    descriptor['caption'] = 'B'
+    descriptor['custom'] = 1
+    del descriptor['source']
+
+    #assert
+    assert descriptor == { 'type': ImageBlock, 'caption': 'B', 'custom': 1 }
+    assert dict(descriptor) == { 'type': ImageBlock, 'caption': 'B', 'custom': 1 }
+    assert list(descriptor.keys()) == ['type', 'caption', 'custom']
+    assert len(descriptor) == 3
+    assert 'source' not in descriptor
+    assert descriptor.get('source') is None
+    assert descriptor.type is ImageBlock
+    assert not hasattr(descriptor, '__dict__')
+    #A Mapping, but not a dict any more
+    assert isinstance(descriptor, Mapping)
+    assert not isinstance(descriptor, dict)
+
+def test_BlockDescriptor_pickle():
+    '''it can be pickled (to convert on other processes)'''
+    #arrange
+    descriptor = BlockDescriptor(TextBlock, title='Hi', custom=[1])
+
+    #act
+    unpickled = pickle.loads(pickle.dumps(descriptor))
+
+    #assert
+    assert unpickled == descriptor
+    assert isinstance(unpickled, BlockDescriptor)
+
+def test_renderer_subclass_nested_output():
+    '''it still flattens nested lists and plain dicts from subclassed render methods'''
+    #arrange
+    class NestedRenderer(NotionPyRenderer):
+        def render_thematic_break(self, token):
+            return [[{ 'type': TextBlock, 'title': 'A' }], [BlockDescriptor(TextBlock, title='B')]]
+
+    #act
+    output = mistletoe.markdown('---\n', NestedRenderer)
+
+    #assert
+    assert output == [{ 'type': TextBlock, 'title': 'A' }, { 'type': TextBlock, 'title': 'B' }]
+
+def test_uploadBlock_leaves_descriptor():
+    '''it doesn't modify the descriptor it uploads'''
+    #arrange
+    descriptor = BlockDescriptor(TextBlock, title='Hi', children=[BlockDescriptor(TextBlock, title='Child')])
+    notionBlock = Mock()
+    notionBlock.children.add_new = Mock(return_value=Mock())
+
+    #act
+    uploadBlock(descriptor, notionBlock, '')
+
+    #assert
+    notionBlock.children.add_new.assert_called_with(TextBlock, title='Hi')
+    assert descriptor == { 'type': TextBlock, 'title': 'Hi', 'children': [{ 'type': TextBlock, 'title': 'Child' }] }
@@ -0,0 +1,109 @@
+'''
+Tests the serialized block descriptor bundles and the convert/push cli
+'''
+import io
+import pytest
+from notion.block import TextBlock, CodeBlock, CollectionViewBlock, EmbedBlock
+from md2notion.blockDescriptor import BlockDescriptor
+from md2notion.bundle import descriptorToJson, descriptorFromJson, writeBundle, readBundle, \
+    openBundle, blockClassName, blockClassFromName
+from tests.stubServer import StubNotionServer
+from md2notion.upload import convert, cli
+
+def test_descriptor_roundtrip():
+    '''it round trips every block descriptor from a full document'''
+    #arrange
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        rendered = convert(mdFile)
+
+    #act
+    roundTripped = [descriptorFromJson(descriptorToJson(d)) for d in rendered]
+
+    #assert
+    assert roundTripped == rendered
+    assert any(d['type'] is CollectionViewBlock for d in roundTripped)
+    assert all(isinstance(d, BlockDescriptor) for d in roundTripped)
+
+def test_descriptor_roundtrip_custom_class():
+    '''it stores classes that aren't notion-py's block types by their import path'''
+    #arrange
+    descriptor = BlockDescriptor(EmbedBlock, source='https://example.com')
+
+    #act
+    data = descriptorToJson(descriptor)
+
+    #assert
+    assert blockClassName(TextBlock) == 'text'
+    assert data['type'] == 'notion.block:EmbedBlock'
+    assert descriptorFromJson(data) == descriptor
+
+@pytest.mark.parametrize('name', ['tests.test_bundle:TextBlock', 'os:system', 'notion.block:uuid',
+    'md2notion.upload:NotionClient', 'notion.block:Missing'])
+def test_blockClassFromName_untrusted(name):
+    '''only takes Block classes from notion-py and md2notion'''
+    #act/assert
+    with pytest.raises(ValueError):
+        blockClassFromName(name)
+
+def test_readBundle():
+    '''it reads back every document, even ones that aren't iterated over'''
+    #arrange
+    bundleFile = io.StringIO()
+    writeBundle(bundleFile, [
+        ('a.md', 'a.md', [BlockDescriptor(TextBlock, title='A1'), BlockDescriptor(TextBlock, title='A2')]),
+        ('b.md', 'b.md', []),
+        ('c/c.md', 'c.md', [BlockDescriptor(CodeBlock, language='Python', title_plaintext='x')]),
+    ])
+    bundleFile.seek(0)
+
+    #act
+    documents = []
+    for mdPath, mdFileName, rendered in readBundle(bundleFile):
+        documents.append((mdPath, mdFileName, list(rendered) if mdPath != 'a.md' else None))
+
+    #assert
+    assert documents == [
+        ('a.md', 'a.md', None),
+        ('b.md', 'b.md', []),
+        ('c/c.md', 'c.md', [{ 'type': CodeBlock, 'language': 'Python', 'title_plaintext': 'x' }]),
+    ]
+
+def test_readBundle_not_bundle():
+    '''it refuses to read files that aren't bundles'''
+    #act/assert
+    with pytest.raises(ValueError):
+        list(readBundle(io.StringIO('{"type": "text"}\n')))
+
+def test_cli_convert_push(tmp_path):
+    '''converts to a gzipped bundle and pushes it to a page'''
+    #arrange
+    bundlePath = str(tmp_path / 'bundle.jsonl.gz')
+
+    #act
+    cli(['convert', bundlePath, 'tests/TEST.md', 'tests/COMPREHENSIVE_TEST.md'])
+    with StubNotionServer() as server, server.patchNotionPy():
+        pageId = server.addPage('Root')
+        cli(['push', 'token_v2', server.pageUrl(pageId), bundlePath, '--batch-size', '50'])
+
+    #assert
+    with openBundle(bundlePath) as bundleFile:
+        names = [name for path, name, rendered in readBundle(bundleFile)]
+    assert names == ['TEST.md', 'COMPREHENSIVE_TEST.md']
+    subpages = server.children(pageId)
+    assert [p['properties']['title'] for p in subpages] == [[['TEST.md']], [['COMPREHENSIVE_TEST.md']]]
+    assert len(server.children(subpages[1]['id'])) > 100
+    assert len(server.files) == 1 #The local image, found relative to the original markdown
+
+def test_cli_convert_cache_flag(tmp_path, monkeypatch):
+    '''takes --convert-cache before the positional arguments without swallowing one'''
+    #arrange
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    bundlePath = str(tmp_path / 'bundle.jsonl')
+
+    #act
+    cli(['convert', '--convert-cache', bundlePath, 'tests/TEST.md'])
+
+    #assert
+    with openBundle(bundlePath) as bundleFile:
+        assert [name for path, name, rendered in readBundle(bundleFile)] == ['TEST.md']
+    assert (tmp_path / 'cache' / 'md2notion' / 'conversions.sqlite').exists()
@@ -0,0 +1,165 @@
+'''
+Tests the persistent caches
+'''
+from md2notion.cache import UploadCache, ConvertCache, hashFile, userCacheDir
+from notion.block import TextBlock
+from md2notion.blockDescriptor import BlockDescriptor
+from md2notion.NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension, addLatexExtension
+from md2notion.upload import convert, convertCached
+from unittest.mock import patch
+
+class CustomBlock(TextBlock):
+    pass
+
+class CustomRenderer(NotionPyRenderer):
+    '''Renders paragraphs to CustomBlocks'''
+    def render_paragraph(self, token):
+        return self.renderMultipleToStringAndCombine(token.children,
+            lambda blockStr: BlockDescriptor(CustomBlock, title=blockStr))
+
+def test_hashFile():
+    '''hashes files by their content'''
+    #act/assert
+    assert hashFile('tests/TEST_IMAGE.png') == hashFile('tests/TEST_IMAGE.png')
+    assert hashFile('tests/TEST_IMAGE.png') != hashFile('tests/TEST.md')
+
+def test_userCacheDir(monkeypatch, tmp_path):
+    '''uses XDG_CACHE_HOME if set'''
+    #arrange
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+
+    #act/assert
+    assert userCacheDir() == tmp_path / 'md2notion'
+
+def test_UploadCache(tmp_path):
+    '''persists urls between instances'''
+    #arrange
+    with UploadCache(tmp_path / 'uploads.sqlite') as cache:
+        cache.set('hash', 'https://example.com/file.png')
+
+    #act
+    with UploadCache(tmp_path / 'uploads.sqlite') as cache:
+        url = cache.get('hash')
+        missing = cache.get('otherHash')
+
+    #assert
+    assert url == 'https://example.com/file.png'
+    assert missing is None
+
+def test_UploadCache_spaces():
+    '''only reuses urls in the workspace they were uploaded to'''
+    #arrange
+    cache = UploadCache(':memory:')
+    cache.set('hash', 'url1', 'space1')
+
+    #act/assert
+    assert cache.get('hash', 'space1') == 'url1'
+    assert cache.get('hash', 'space2') is None
+    assert cache.get('hash') is None
+
+def test_UploadCache_invalidate():
+    '''forgets single files or everything'''
+    #arrange
+    cache = UploadCache(':memory:')
+    cache.set('hash1', 'url1')
+    cache.set('hash2', 'url2')
+    cache.set('hash3', 'url3')
+
+    #act/assert
+    cache.invalidate('hash1')
+    assert cache.get('hash1') is None
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+def test_UploadCache_evict():
+    '''forgets the least recently used files'''
+    #arrange
+    cache = UploadCache(':memory:')
+    with patch('md2notion.cache.time.time', return_value=100):
+        cache.set('hash1', 'url1')
+    with patch('md2notion.cache.time.time', return_value=200):
+        cache.set('hash2', 'url2')
+        cache.set('hash3', 'url3')
+
+    #act
+    with patch('md2notion.cache.time.time', return_value=250):
+        cache.evict(maxAge=100)
+    #assert
+    assert cache.get('hash1') is None
+    assert len(cache) == 2
+
+    #act
+    with patch('md2notion.cache.time.time', return_value=300):
+        cache.get('hash2')
+    cache.evict(maxEntries=1)
+    #assert
+    assert cache.get('hash2') == 'url2'
+    assert cache.get('hash3') is None
+
+def test_ConvertCache(tmp_path):
+    '''persists conversions between instances'''
+    #arrange
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        mdText = mdFile.read()
+    rendered = convert(mdText)
+    with ConvertCache(tmp_path / 'conversions.sqlite') as cache:
+        cache.set(ConvertCache.key(mdText, NotionPyRenderer), rendered)
+
+    #act
+    with ConvertCache(tmp_path / 'conversions.sqlite') as cache:
+        cached = cache.get(ConvertCache.key(mdText, NotionPyRenderer))
+        missing = cache.get(ConvertCache.key(mdText + '\n', NotionPyRenderer))
+
+    #assert
+    assert cached == rendered
+    assert missing is None
+
+def test_ConvertCache_key():
+    '''keys by the markdown and the renderer with its extensions'''
+    #act
+    keys = [
+        ConvertCache.key('# Hi', NotionPyRenderer),
+        ConvertCache.key('# Hi!', NotionPyRenderer),
+        ConvertCache.key('# Hi', addLatexExtension(NotionPyRenderer)),
+        ConvertCache.key('# Hi', addHtmlImgTagExtension(NotionPyRenderer)),
+        ConvertCache.key('# Hi', addHtmlImgTagExtension(addLatexExtension(NotionPyRenderer))),
+    ]
+
+    #assert
+    assert len(set(keys)) == len(keys)
+    assert ConvertCache.key('# Hi', addLatexExtension(NotionPyRenderer)) == keys[2]
+
+def test_convertCached():
+    '''only converts markdown that isn't in the cache'''
+    #arrange
+    cache = ConvertCache(':memory:')
+    mdText = '| A | B |\n|---|---|\n| 1 | 2 |\n\nText\n'
+    first = list(convertCached(mdText, NotionPyRenderer, cache))
+
+    #act
+    with patch('md2notion.upload.convert') as convert, \
+        patch('md2notion.upload.convertStream') as convertStream:
+        second = list(convertCached(mdText, NotionPyRenderer, cache))
+        streamed = list(convertCached(mdText, NotionPyRenderer, cache, stream=True))
+
+    #assert
+    convert.assert_not_called()
+    convertStream.assert_not_called()
+    assert streamed == first
+    assert second == first
+    assert len(cache) == 1
+
+def test_convertCached_custom_block():
+    '''reads back block classes from custom renderers, which bundles don't take'''
+    #arrange
+    cache = ConvertCache(':memory:')
+    first = list(convertCached('Text\n', CustomRenderer, cache))
+
+    #act
+    second = list(convertCached('Text\n', CustomRenderer, cache))
+
+    #assert
+    assert first[0]['type'] is CustomBlock
+    assert second == first
+    assert second[0]['type'] is CustomBlock
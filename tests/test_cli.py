@@ -0,0 +1,59 @@
+'''
+Tests that the cli only imports what it needs, with python -X importtime
+'''
+import subprocess
+import sys
+
+#How long md2notion can take to import, in milliseconds. Loose, so slow machines
+#pass, but well under what importing everything up front takes
+HELP_BUDGET_MS = 150
+CONVERT_BUDGET_MS = 1500
+
+def importTimes(args, runs=2):
+    '''
+    Runs python -X importtime with args
+    @param {str[]} args The arguments to python, after -X importtime
+    @param {int} [runs=2] How many times to run it, the fastest one is kept (the
+    first run might be compiling .pyc files)
+    @returns {tuple} (set of every module imported, milliseconds spent importing
+    md2notion and everything it imported)
+    '''
+    fastest = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', *args],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        modules = set()
+        total = 0
+        started = False
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules.add(name.strip())
+            started = started or name.strip() == 'md2notion'
+            #Only the outermost imports, the nested ones are in their cumulative time
+            if started and not name.startswith('  '):
+                total += int(cumulative)
+        if fastest is None or total < fastest[1]:
+            fastest = (modules, total)
+    return (fastest[0], fastest[1] / 1000)
+
+def test_help_imports():
+    '''--help doesn't import notion-py, requests or mistletoe'''
+    #act
+    modules, ms = importTimes(['-m', 'md2notion', '--help'])
+
+    #assert
+    assert 'md2notion.cli' in modules
+    assert not {'notion.client', 'notion.block', 'requests', 'mistletoe', 'md2notion.upload'} & modules
+    assert ms < HELP_BUDGET_MS
+
+def test_convert_imports(tmp_path):
+    '''convert only imports what converting needs'''
+    #act
+    modules, ms = importTimes(['-m', 'md2notion', 'convert', str(tmp_path / 'bundle.jsonl'), 'tests/TEST.md'])
+
+    #assert
+    assert 'md2notion.NotionPyRenderer' in modules
+    assert not {'md2notion.rateLimit', 'md2notion.journal', 'md2notion.images', 'PIL'} & modules
+    assert ms < CONVERT_BUDGET_MS
@@ -0,0 +1,88 @@
+'''
+Tests fetching markdown from urls
+'''
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler
+from md2notion.cache import UrlCache
+from md2notion.fetch import UrlFetcher, FetchError
+from md2notion.upload import openPathsUrls
+from tests.stubServer import ThreadingHTTPServer
+
+class MarkdownHandler(BaseHTTPRequestHandler):
+    '''Serves /doc{n}.md with an ETag, /big.md and 404s for anything else'''
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/big.md':
+            body = b'x' * 2048
+        elif self.path.startswith('/doc'):
+            body = f'# {self.path} ✓\n'.encode('utf-8')
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{len(body)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    MarkdownHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MarkdownHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def test_UrlFetcher_conditional(server):
+    '''it fetches again conditionally and uses the cached text when nothing changed'''
+    #arrange
+    fetcher = UrlFetcher(urlCache=UrlCache(':memory:'))
+    first = fetcher.fetch(server + '/doc1.md')
+
+    #act
+    second = fetcher.fetch(server + '/doc1.md')
+
+    #assert
+    assert first == second == '# /doc1.md ✓\n'
+    assert fetcher.notModified == 1
+    assert MarkdownHandler.requests[1][1] is not None #Sent If-None-Match
+
+def test_UrlFetcher_errors(server):
+    '''it only accepts 2xx responses no bigger than maxBytes'''
+    #arrange
+    fetcher = UrlFetcher(maxBytes=1024)
+
+    #act/assert
+    with pytest.raises(FetchError):
+        fetcher.fetch(server + '/missing.md')
+    with pytest.raises(FetchError):
+        fetcher.fetch(server + '/big.md')
+    assert fetcher.fetch(server + '/doc1.md') == '# /doc1.md ✓\n'
+
+def test_openPathsUrls_prefetch(server):
+    '''it fetches urls ahead of time and yields everything in order'''
+    #arrange
+    pathsUrls = [(server + f'/doc{i}.md', f'doc{i}.md') for i in range(10)] + [('tests/TEST.md', 'TEST.md')]
+
+    #act
+    with UrlFetcher(maxWorkers=4) as fetcher:
+        files = [(path, fileName, f.read()) for path, fileName, f in openPathsUrls(pathsUrls, fetcher=fetcher)]
+
+    #assert
+    assert [f[1] for f in files] == [fileName for path, fileName in pathsUrls]
+    assert files[3][2] == '# /doc3.md ✓\n'
+    assert files[-1][2].startswith('#')
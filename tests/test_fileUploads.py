@@ -0,0 +1,159 @@
+'''
+Tests uploading files for blocks
+'''
+import requests
+from pathlib import Path
+from notion.client import NotionClient
+from md2notion.fileUploads import FileUploadPool, setBlockFile, uploadFileToNotion
+from md2notion.rateLimit import RateLimiter
+from tests.stubServer import StubNotionServer
+from md2notion.cache import UploadCache, hashFile
+from md2notion.upload import uploadBlock
+from notion.block import ImageBlock
+from notion.settings import S3_URL_PREFIX
+from unittest.mock import Mock, MagicMock, patch
+
+def test_setBlockFile():
+    '''points a block at an uploaded file'''
+    #arrange
+    block = Mock()
+    url = S3_URL_PREFIX + 'abcd-1234/TEST_IMAGE.png'
+
+    #act
+    setBlockFile(block, url)
+
+    #assert
+    assert block.source == url
+    assert block.display_source == url
+    assert block.file_id == 'abcd-1234'
+
+@patch('md2notion.fileUploads.uploadFileToNotion')
+def test_FileUploadPool(uploadFileToNotion):
+    '''uploads files on the pool and sets them on the blocks when waited on'''
+    #arrange
+    uploadFileToNotion.side_effect = lambda client, path, session, uploadName: S3_URL_PREFIX + 'id/' + path
+    block1 = MagicMock()
+    block2 = MagicMock()
+
+    #act
+    with FileUploadPool(2) as pool:
+        pool.submit(block1, 'a.png')
+        pool.submit(block2, Path('b.png'))
+        errors = pool.wait()
+
+    #assert
+    assert errors == []
+    assert block1.source == S3_URL_PREFIX + 'id/a.png'
+    assert block2.source == S3_URL_PREFIX + 'id/b.png'
+
+@patch('md2notion.fileUploads.uploadFileToNotion')
+def test_FileUploadPool_errors(uploadFileToNotion):
+    '''collects errors per file instead of raising'''
+    #arrange
+    error = IOError('Nope')
+    def upload(client, path, session, uploadName):
+        if path == 'b.png':
+            raise error
+        return S3_URL_PREFIX + 'id/' + path
+    uploadFileToNotion.side_effect = upload
+    block1 = MagicMock()
+    block2 = MagicMock()
+
+    #act
+    with FileUploadPool(2) as pool:
+        pool.submit(block1, 'a.png')
+        pool.submit(block2, 'b.png')
+        errors = pool.wait()
+
+    #assert
+    assert errors == [('b.png', error)]
+    assert block1.source == S3_URL_PREFIX + 'id/a.png'
+
+def test_uploadBlock_image_local_pool():
+    '''hands off local images to the pool instead of uploading them'''
+    #arrange
+    blockDescriptor = {
+        'type': ImageBlock,
+        'title': 'test',
+        'source': 'TEST_IMAGE.png'
+    }
+    notionBlock = Mock()
+    notionBlock.children.add_new.return_value = newBlock = Mock(spec=blockDescriptor['type'])
+    pool = Mock()
+
+    #act
+    uploadBlock(blockDescriptor, notionBlock, 'tests/DUMMY.md', uploadPool=pool)
+
+    #assert
+    newBlock.upload_file.assert_not_called()
+    pool.submit.assert_called_with(newBlock, Path('tests/TEST_IMAGE.png'), None)
+
+@patch('md2notion.fileUploads.uploadFileToNotion')
+def test_FileUploadPool_cache(uploadFileToNotion):
+    '''only uploads a file once when it's already in the cache'''
+    #arrange
+    uploadFileToNotion.return_value = S3_URL_PREFIX + 'id/TEST_IMAGE.png'
+    cache = UploadCache(':memory:')
+    client = MagicMock()
+    client.current_space.id = 'space1'
+    blocks = [MagicMock(_client=client) for i in range(3)]
+
+    #act
+    with FileUploadPool(3, cache) as pool:
+        for block in blocks:
+            pool.submit(block, 'tests/TEST_IMAGE.png')
+        pool.wait()
+
+    #assert
+    assert uploadFileToNotion.call_count == 1
+    assert all(block.source == S3_URL_PREFIX + 'id/TEST_IMAGE.png' for block in blocks)
+    assert cache.get(hashFile('tests/TEST_IMAGE.png'), 'space1') == S3_URL_PREFIX + 'id/TEST_IMAGE.png'
+
+@patch('md2notion.fileUploads.uploadFileToNotion')
+def test_FileUploadPool_cache_spaces(uploadFileToNotion):
+    '''uploads a file again for another workspace, its url might not work there'''
+    #arrange
+    uploadFileToNotion.side_effect = lambda client, path, session, uploadName: \
+        S3_URL_PREFIX + client.current_space.id + '/TEST_IMAGE.png'
+    cache = UploadCache(':memory:')
+    clients = [MagicMock(), MagicMock()]
+    clients[0].current_space.id = 'space1'
+    clients[1].current_space.id = 'space2'
+    cache.set(hashFile('tests/TEST_IMAGE.png'), S3_URL_PREFIX + 'space1/TEST_IMAGE.png', 'space1')
+    blocks = [MagicMock(_client=clients[0]), MagicMock(_client=clients[1])]
+
+    #act
+    with FileUploadPool(2, cache) as pool:
+        for block in blocks:
+            pool.submit(block, 'tests/TEST_IMAGE.png')
+            pool.wait()
+
+    #assert
+    assert uploadFileToNotion.call_count == 1
+    assert [block.source for block in blocks] == [S3_URL_PREFIX + 'space1/TEST_IMAGE.png',
+        S3_URL_PREFIX + 'space2/TEST_IMAGE.png']
+    assert cache.get(hashFile('tests/TEST_IMAGE.png'), 'space2') == S3_URL_PREFIX + 'space2/TEST_IMAGE.png'
+
+def test_uploadFileToNotion_no_cookies():
+    '''doesn't send the token_v2 cookie to S3, but still goes through the RateLimiter'''
+    #arrange
+    sent = []
+    send = requests.adapters.HTTPAdapter.send
+    def recordSend(adapter, request, **kwargs):
+        sent.append(request)
+        return send(adapter, request, **kwargs)
+    limiter = RateLimiter()
+    with StubNotionServer() as server, server.patchNotionPy():
+        client = limiter.install(NotionClient(token_v2='secret'))
+
+        #act
+        with patch.object(requests.adapters.HTTPAdapter, 'send', recordSend):
+            url = uploadFileToNotion(client, 'tests/TEST_IMAGE.png')
+
+    #assert
+    post, put = sent
+    assert 'token_v2=secret' in post.headers['Cookie']
+    assert put.method == 'PUT'
+    assert 'Cookie' not in put.headers
+    assert limiter.stats.requests == 2 #getUploadFileUrl and the PUT
+    assert url.endswith('/TEST_IMAGE.png')
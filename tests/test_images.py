@@ -0,0 +1,92 @@
+'''
+Tests shrinking local images before they're uploaded
+'''
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+from notion.settings import S3_URL_PREFIX
+from md2notion.fileUploads import FileUploadPool
+from md2notion.images import ImageOptimizer, optimizeImage
+
+def screenshot(path, size=(3000, 1500)):
+    '''Saves a noisy PNG (which doesn't compress well, like a real screenshot)'''
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(path)
+    return str(path)
+
+def test_optimizeImage(tmp_path):
+    '''downscales and recompresses a large image, only the first time'''
+    #arrange
+    path = screenshot(tmp_path / 'big.png')
+
+    #act
+    optimized = optimizeImage(path, tmp_path / 'cache', maxDimension=1000)
+    with patch('md2notion.images.Image.open') as imageOpen:
+        optimizedAgain = optimizeImage(path, tmp_path / 'cache', maxDimension=1000)
+
+    #assert
+    assert optimized.endswith('.webp')
+    assert os.path.getsize(optimized) < os.path.getsize(path)
+    with Image.open(optimized) as img:
+        assert img.size == (1000, 500)
+    assert optimizedAgain == optimized
+    imageOpen.assert_not_called()
+
+def test_optimizeImage_jpeg_transparent(tmp_path):
+    '''flattens transparent images for JPEG'''
+    #arrange
+    path = str(tmp_path / 'big.png')
+    Image.new('RGBA', (2500, 100), (255, 0, 0, 0)).save(path)
+
+    #act
+    optimized = optimizeImage(path, tmp_path / 'cache', maxBytes=0, format='jpeg')
+
+    #assert
+    with Image.open(optimized) as img:
+        assert (img.format, img.mode, img.size) == ('JPEG', 'RGB', (2000, 80))
+
+@pytest.mark.parametrize('name,contents', [
+    ('small.png', None),
+    ('notes.pdf', b'%PDF-1.4 not an image' * 100000),
+])
+def test_optimizeImage_left_alone(tmp_path, name, contents):
+    '''leaves small images and files that aren't images as they are'''
+    #arrange
+    path = str(tmp_path / name)
+    if contents:
+        with open(path, 'wb') as f:
+            f.write(contents)
+    else:
+        screenshot(path, (100, 100))
+
+    #act
+    optimized = optimizeImage(path, tmp_path / 'cache', maxBytes=1024 * 1024)
+
+    #assert
+    assert optimized == path
+
+def test_ImageOptimizer_FileUploadPool(tmp_path):
+    '''uploads the optimized image under the image's name, optimizing each image once'''
+    #arrange
+    path = screenshot(tmp_path / 'big.png')
+    uploaded = []
+    def upload(client, path, session, uploadName):
+        uploaded.append((path, uploadName))
+        return S3_URL_PREFIX + 'id/' + os.path.basename(path)
+
+    #act
+    with ImageOptimizer(tmp_path / 'cache', workers=2) as imageOptimizer, \
+        patch('md2notion.fileUploads.uploadFileToNotion', side_effect=upload):
+        with FileUploadPool(2, imageOptimizer=imageOptimizer) as pool:
+            pool.submit(MagicMock(), path)
+            pool.submit(MagicMock(), path)
+            errors = pool.wait()
+        futures = len(imageOptimizer._futures)
+
+    #assert
+    assert errors == []
+    assert futures == 1
+    assert len(uploaded) == 2
+    assert all(p.startswith(str(tmp_path / 'cache')) and p.endswith('.webp') for p, name in uploaded)
+    assert [name for p, name in uploaded] == ['big.webp'] * 2
@@ -0,0 +1,137 @@
+'''
+Tests the instrument hooks and their sinks
+'''
+import io
+import json
+import pytest
+from md2notion import instrument
+from md2notion.instrument import StatsSink, SlowestSink, ProgressSink
+from tests.stubServer import StubNotionServer
+from md2notion.upload import convert, cli
+
+@pytest.fixture
+def events():
+    events = []
+    sink = instrument.addSink(lambda kind, fields: events.append((kind, fields)))
+    yield events
+    instrument.removeSink(sink)
+
+def test_timed(events):
+    '''reports how long the block took, and the error if it raised'''
+    #act
+    with instrument.timed('thing', name='a') as fields:
+        fields['bytes'] = 3
+    with pytest.raises(KeyError):
+        with instrument.timed('thing', name='b'):
+            raise KeyError('b')
+
+    #assert
+    assert [(kind, fields['name']) for kind, fields in events] == [('thing', 'a'), ('thing', 'b')]
+    assert events[0][1]['bytes'] == 3
+    assert events[0][1]['seconds'] >= 0
+    assert events[1][1]['error'] == 'KeyError'
+
+def test_timed_no_sinks():
+    '''doesn't time anything when nothing is listening'''
+    #act
+    with instrument.timed('thing', name='a') as fields:
+        pass
+
+    #assert
+    assert not instrument.enabled()
+    assert fields == { 'name': 'a' }
+
+def test_sink_kinds():
+    '''only reports and times the kinds of events its sinks get'''
+    #arrange
+    progress = instrument.addSink(ProgressSink(out=io.StringIO()))
+
+    #act
+    try:
+        with instrument.timed('render', name='Paragraph') as fields:
+            pass
+        states = (instrument.enabled(), instrument.enabled('render'), instrument.enabled('upload'))
+    finally:
+        instrument.removeSink(progress)
+
+    #assert
+    assert states == (True, False, True)
+    assert fields == { 'name': 'Paragraph' }
+
+def test_sink_kinds_all(events):
+    '''reports every kind of event to sinks without kinds'''
+    #act
+    states = (instrument.enabled('render'), instrument.enabled('anything'))
+
+    #assert
+    assert states == (True, True)
+
+def test_StatsSink_convert():
+    '''totals up render time per token type and convert time per file'''
+    #arrange
+    sink = instrument.addSink(StatsSink())
+
+    #act
+    try:
+        with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+            rendered = convert(mdFile)
+    finally:
+        instrument.removeSink(sink)
+    report = sink.report()
+
+    #assert
+    assert report['convert']['tests/COMPREHENSIVE_TEST.md']['blocks'] == len(rendered)
+    assert report['render']['Document']['count'] == 1
+    assert report['render']['Paragraph']['count'] > 1
+    assert report['render']['Paragraph']['maxSeconds'] <= report['render']['Paragraph']['seconds']
+
+def test_SlowestSink():
+    '''keeps the n slowest events, slowest first'''
+    #arrange
+    sink = SlowestSink(2)
+
+    #act
+    for idx, seconds in enumerate([0.1, 0.5, 0.2, 0.3]):
+        sink('block', { 'name': f'block{idx}', 'seconds': seconds })
+    sink('file', { 'name': 'a.md', 'seconds': 9 })
+
+    #assert
+    assert [fields['name'] for seconds, kind, fields in sink.slowest()] == ['block1', 'block3']
+    assert 'block1' in sink.table().splitlines()[1]
+
+def test_ProgressSink():
+    '''prints the progress of a file at most once per interval, and when it's done'''
+    #arrange
+    out = io.StringIO()
+    sink = ProgressSink(interval=60, out=out)
+
+    #act
+    sink('uploadStart', { 'name': 'a.md', 'total': 4 })
+    sink('block', { 'name': 'TextBlock', 'file': 'a.md', 'position': '0' })
+    sink('block', { 'name': 'TextBlock', 'file': 'a.md', 'position': '0.0' })
+    sink('batch', { 'name': 'a.md', 'blocks': 5, 'topLevel': 3 })
+    sink('upload', { 'name': 'a.md' })
+
+    #assert
+    assert out.getvalue() == '\rUploading a.md, 1/4 (25.0%) blocks\rUploading a.md, 4/4 (100.0%) blocks\n'
+
+def test_cli_stats(tmp_path, capsys):
+    '''writes the --stats report and prints the --slowest table'''
+    #arrange
+    statsPath = tmp_path / 'stats.json'
+    with StubNotionServer(seed=0) as server, server.patchNotionPy():
+        pageId = server.addPage('Root')
+
+        #act
+        cli(['token_v2', server.pageUrl(pageId), 'tests/COMPREHENSIVE_TEST.md',
+            '--stats', str(statsPath), '--slowest', '3'])
+
+    #assert
+    stats = json.loads(statsPath.read_text())
+    assert stats['file']['tests/COMPREHENSIVE_TEST.md']['count'] == 1
+    assert stats['block']['TextBlock']['count'] > 1
+    assert stats['upload']['tests/COMPREHENSIVE_TEST.md']['seconds'] > 0
+    output = capsys.readouterr().out
+    assert 'Slowest 3:' in output
+    assert '\rUploading tests/COMPREHENSIVE_TEST.md, 128/128 (100.0%) blocks\n' in output
+    assert not instrument.enabled()
@@ -0,0 +1,120 @@
+'''
+Tests resuming uploads with the UploadJournal
+'''
+import pytest
+from unittest.mock import patch
+from md2notion.journal import UploadJournal
+from md2notion.pipeline import convertText
+from md2notion.upload import convert, uploadDescriptors, uploadBlock, cli
+import md2notion.upload
+
+def crashAfter(items, count):
+    '''Yields count items and then fails like a dropped connection would'''
+    for idx, item in enumerate(items):
+        if idx == count:
+            raise ConnectionError('Connection lost')
+        yield item
+
+def test_UploadJournal_reopen(tmp_path):
+    '''it reads back what it recorded, dropping an entry cut off by a crash'''
+    #arrange
+    path = tmp_path / 'journal.jsonl'
+    with UploadJournal(path, fsync=False) as journal:
+        fileJournal = journal.file('a.md')
+        fileJournal.setPage('page')
+        fileJournal.setBlocks([('0', 'block0'), ('0.0', 'block00')])
+        fileJournal.setImageDone('0.0')
+        fileJournal.setTable('1', 'collection', 'view', ['b', 'title'])
+        fileJournal.addRows('1', ['row0', 'row1'])
+        fileJournal.addRows('1', ['row2'])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"file":"a.md","position":"2","blo') #Crashed while writing
+
+    #act
+    with UploadJournal(path) as journal:
+        fileJournal = journal.file('a.md')
+        fileJournal.setBlocks([('2', 'block2')])
+    with UploadJournal(path) as journal:
+        fileJournal = journal.file('a.md')
+
+        #assert
+        assert fileJournal.pageId == 'page'
+        assert [fileJournal.blockId(p) for p in ['0', '0.0', '1', '2']] == ['block0', 'block00', None, 'block2']
+        assert fileJournal.imageDone('0.0')
+        assert not fileJournal.imageDone('0')
+        assert fileJournal.table('1') == { 'collection': 'collection', 'view': 'view',
+            'props': ['b', 'title'], 'rows': ['row0', 'row1', 'row2'] }
+        assert not fileJournal.done
+        assert journal.file('b.md').pageId is None
+
+@pytest.mark.parametrize('batchSize', [None, 20])
+def test_upload_resume(stubServer, stubPage, tmp_path, batchSize):
+    '''it resumes an upload that stopped part way without creating anything twice'''
+    #arrange
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        rendered = convert(mdFile)
+    page = stubPage()
+    journal = UploadJournal(tmp_path / 'journal.jsonl', fsync=False)
+    with pytest.raises(ConnectionError):
+        uploadDescriptors(crashAfter(rendered, 70), page, 'tests/COMPREHENSIVE_TEST.md',
+            batchSize=batchSize, journal=journal.file('tests/COMPREHENSIVE_TEST.md'))
+    journal.close()
+    createdBefore = len(stubServer.children(page.id))
+
+    #act
+    journal = UploadJournal(tmp_path / 'journal.jsonl', fsync=False)
+    uploadDescriptors(rendered, page, 'tests/COMPREHENSIVE_TEST.md', batchSize=batchSize,
+        journal=journal.file('tests/COMPREHENSIVE_TEST.md'))
+
+    #assert
+    children = stubServer.children(page.id)
+    assert 0 < createdBefore < len(rendered)
+    assert [c['type'] for c in children] == [d['type']._type for d in rendered]
+    assert len(stubServer.files) == 1
+    assert journal.file('tests/COMPREHENSIVE_TEST.md').done
+
+def test_upload_resume_table_rows(stubServer, stubPage, tmp_path):
+    '''it resumes a table from the last chunk of rows that was created'''
+    #arrange
+    mdText = '| A | B |\n|---|---|\n' + ''.join(f'| {i} | b{i} |\n' for i in range(30))
+    blockDescriptor = convertText(mdText)[0]
+    page = stubPage()
+    journal = UploadJournal(tmp_path / 'journal.jsonl', fsync=False)
+    rowOperations = md2notion.upload.rowOperations
+    calls = []
+    def failSecondChunk(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise ConnectionError('Connection lost')
+        return rowOperations(*args, **kwargs)
+    with patch('md2notion.upload.rowOperations', failSecondChunk), pytest.raises(ConnectionError):
+        uploadBlock(blockDescriptor, page, '', rowChunkSize=10, journal=journal.file('a.md'))
+
+    #act
+    table = uploadBlock(blockDescriptor, page, '', rowChunkSize=10, journal=journal.file('a.md'))
+
+    #assert
+    propIds = journal.file('a.md').table('0')['props']
+    rows = page._client.get_block(table.id).collection.get_rows()
+    assert [row.get_property(propIds[0]) for row in rows] == [str(i) for i in range(30)]
+    assert len(stubServer.children(page.id)) == 1
+
+def test_cli_resume(stubServer, tmp_path):
+    '''it uploads to the page of the upload it resumes and skips finished files'''
+    #arrange
+    journalPath = str(tmp_path / 'journal.jsonl')
+    pageId = stubServer.addPage('Root')
+    resumedPageId = stubServer.addPage('TEST.md')
+    with UploadJournal(journalPath) as journal:
+        journal.file('tests/TEST.md').setPage(resumedPageId)
+    argv = ['token_v2', stubServer.pageUrl(pageId), 'tests/TEST.md', '--resume', journalPath]
+
+    #act
+    cli(argv)
+    transactionsBefore = stubServer.stats.requests['submitTransaction']
+    cli(argv)
+
+    #assert
+    assert stubServer.children(pageId) == []
+    assert len(stubServer.children(resumedPageId)) == 2
+    assert stubServer.stats.requests['submitTransaction'] == transactionsBefore
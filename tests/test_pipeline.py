@@ -0,0 +1,175 @@
+'''
+Tests the read -> convert -> upload pipeline
+'''
+import os
+import pickle
+import threading
+from md2notion.pipeline import runPipeline, runAhead, convertMany
+from md2notion.NotionPyRenderer import NotionPyRenderer, addLatexExtension, addHtmlImgTagExtension
+from md2notion.cache import ConvertCache
+from unittest.mock import patch
+from concurrent.futures.process import BrokenProcessPool
+from notion.block import HeaderBlock, EquationBlock, ImageBlock
+from md2notion.upload import convert, convertCached
+
+class CrashingRenderer(NotionPyRenderer):
+    '''Kills the process it's on when it renders CRASH'''
+    def render_raw_text(self, token):
+        if token.content == 'CRASH':
+            os._exit(1)
+        return super().render_raw_text(token)
+
+def test_runAhead():
+    '''only pulls window items ahead of the consumer'''
+    #arrange
+    pulled = []
+    def tasks():
+        for i in range(5):
+            pulled.append(i)
+            yield i
+
+    #act
+    it = runAhead(tasks(), 2)
+    first = next(it)
+
+    #assert
+    assert first == 0
+    assert pulled == [0, 1]
+    assert list(it) == [1, 2, 3, 4]
+
+def test_runPipeline():
+    '''reads, converts and uploads every file, preparing them in order'''
+    #arrange
+    files = { f'{i}.md': f'# Title {i}' for i in range(10) }
+    prepared = []
+    uploaded = {}
+    lock = threading.Lock()
+    def upload(path, target, rendered):
+        with lock:
+            uploaded[path] = (target, rendered)
+
+    #act
+    errors = runPipeline(files.items(), lambda path: files[path],
+        lambda path, fileName: prepared.append(path) or files[path], upload,
+        addLatexExtension(NotionPyRenderer), jobs=3)
+
+    #assert
+    assert errors == []
+    assert prepared == list(files.keys())
+    assert len(uploaded) == 10
+    target, rendered = uploaded['3.md']
+    assert target == '# Title 3'
+    assert rendered[0]['type'] == HeaderBlock
+    assert rendered[0]['title'] == 'Title 3'
+
+def test_runPipeline_errors():
+    '''keeps going when a file fails in any stage'''
+    #arrange
+    readError = IOError('Cant read')
+    uploadError = RuntimeError('Cant upload')
+    def read(path):
+        if path == 'bad_read.md':
+            raise readError
+        return '$$\nx\n$$\n'
+    def upload(path, target, rendered):
+        if path == 'bad_upload.md':
+            raise uploadError
+        assert rendered[0]['type'] == EquationBlock
+
+    #act
+    errors = runPipeline([('bad_read.md', ''), ('good.md', ''), ('bad_upload.md', '')], read,
+        lambda path, fileName: None, upload, addLatexExtension(NotionPyRenderer), jobs=2)
+
+    #assert
+    assert errors == [('bad_read.md', readError), ('bad_upload.md', uploadError)]
+
+def test_runPipeline_convertCache():
+    '''doesn't convert files again that are in the cache'''
+    #arrange
+    files = { f'{i}.md': f'# Title {i}' for i in range(4) }
+    cache = ConvertCache(':memory:')
+    uploaded = {}
+    def upload(path, target, rendered):
+        uploaded[path] = rendered
+    runPipeline(files.items(), lambda path: files[path], lambda path, fileName: None, upload,
+        jobs=2, convertCache=cache)
+    firstUploaded = dict(uploaded)
+
+    #act
+    with patch('md2notion.pipeline.ProcessPoolExecutor.submit') as submit:
+        errors = runPipeline(files.items(), lambda path: files[path], lambda path, fileName: None,
+            upload, jobs=2, convertCache=cache)
+
+    #assert
+    assert errors == []
+    submit.assert_not_called()
+    assert uploaded == firstUploaded
+    assert len(cache) == 4
+    assert convertCached(files['0.md'], NotionPyRenderer, cache) == uploaded['0.md']
+
+def test_runPipeline_crash():
+    '''only fails the file that crashed its conversion process, uploading the rest'''
+    #arrange
+    files = { f'{i}.md': 'CRASH' if i == 3 else f'Text {i}' for i in range(8) }
+    uploaded = {}
+    def upload(path, target, rendered):
+        uploaded[path] = rendered[0]['title']
+
+    #act
+    errors = runPipeline(files.items(), lambda path: files[path], lambda path, fileName: None, upload,
+        CrashingRenderer, jobs=2)
+
+    #assert
+    assert [(path, type(e)) for path, e in errors] == [('3.md', BrokenProcessPool)]
+    assert uploaded == { path: text for path, text in files.items() if path != '3.md' }
+
+def test_convertMany(tmp_path):
+    '''converts every file and directory on processes, in order, isolating failures'''
+    #arrange
+    (tmp_path / 'docs' / 'sub').mkdir(parents=True)
+    for i in range(12):
+        (tmp_path / 'docs' / ('sub' if i % 2 else '') / f'{i:02}.md').write_text(f'# Title {i}\n\n<img src="{i}.png"/>')
+    (tmp_path / 'bad.md').write_bytes(b'\xff\xfe not utf-8')
+    paths = [str(tmp_path / 'bad.md'), str(tmp_path / 'docs'), 'tests/COMPREHENSIVE_TEST.md']
+
+    #act
+    results = list(convertMany(paths, addHtmlImgTagExtension(NotionPyRenderer), workers=2, chunkSize=3))
+
+    #assert
+    assert [path for path, rendered, error in results] == [str(tmp_path / 'bad.md')] + \
+        sorted(str(p) for p in (tmp_path / 'docs').rglob('*.md')) + ['tests/COMPREHENSIVE_TEST.md']
+    assert results[0][1] is None and isinstance(results[0][2], UnicodeDecodeError)
+    assert all(error is None for path, rendered, error in results[1:])
+    titles = [rendered[0]['title'] for path, rendered, error in results[1:-1]]
+    assert sorted(titles) == sorted(f'Title {i}' for i in range(12))
+    assert results[1][1][1]['type'] == ImageBlock
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        assert results[-1][1] == convert(mdFile)
+
+def test_convertMany_crash(tmp_path):
+    '''only fails the files sent with the one that crashed its process, converting the rest on a new pool'''
+    #arrange
+    for i in range(8):
+        (tmp_path / f'{i}.md').write_text('CRASH' if i == 2 else f'Text {i}')
+
+    #act
+    results = list(convertMany([str(tmp_path)], CrashingRenderer, workers=2, chunkSize=2))
+
+    #assert
+    assert [path for path, rendered, error in results] == [str(tmp_path / f'{i}.md') for i in range(8)]
+    assert [type(error) for path, rendered, error in results[2:4]] == [BrokenProcessPool] * 2
+    assert [rendered[0]['title'] for path, rendered, error in results[:2] + results[4:]] == \
+        [f'Text {i}' for i in (0, 1, 4, 5, 6, 7)]
+
+def test_descriptors_picklable():
+    '''block descriptors can be sent between processes as they are'''
+    #arrange
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        rendered = convert(mdFile)
+
+    #act
+    unpickled = pickle.loads(pickle.dumps(rendered))
+
+    #assert
+    assert unpickled == rendered
+    assert unpickled[0]['type'] is rendered[0]['type']
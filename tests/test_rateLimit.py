@@ -0,0 +1,126 @@
+'''
+Tests the shared rate limiter
+'''
+import time
+import requests
+from unittest.mock import Mock, patch
+from notion.client import NotionClient
+from md2notion.rateLimit import RateLimiter, retryAfterSeconds
+from tests.stubServer import StubNotionServer
+from md2notion.upload import upload, cli
+import md2notion.cli
+
+def test_retryAfterSeconds():
+    '''it reads Retry-After as seconds or as a date'''
+    #arrange
+    def response(retryAfter):
+        return Mock(headers={ 'Retry-After': retryAfter } if retryAfter else {})
+
+    #act/assert
+    assert retryAfterSeconds(response('1.5')) == 1.5
+    assert retryAfterSeconds(response('Wed, 21 Oct 2015 07:28:00 GMT')) == 0
+    assert retryAfterSeconds(response(None)) is None
+    assert retryAfterSeconds(response('soon')) is None
+
+def test_RateLimiter_token_bucket():
+    '''it paces requests to the rate'''
+    #arrange
+    limiter = RateLimiter(rate=50, burst=1)
+
+    #act
+    start = time.monotonic()
+    for i in range(6):
+        limiter.acquire()
+        limiter.release()
+    elapsed = time.monotonic() - start
+
+    #assert
+    assert elapsed >= 0.09 #5 waits of 1/50s after the first burst
+
+def test_RateLimiter_aimd():
+    '''it halves concurrency when throttled and slowly grows it back'''
+    #arrange
+    limiter = RateLimiter(maxConcurrency=8)
+
+    #act
+    limiter.acquire()
+    limiter.release(throttled=True)
+    afterThrottle = limiter.stats.concurrency
+    for i in range(8):
+        limiter.acquire()
+        limiter.release()
+
+    #assert
+    assert afterThrottle == 4
+    assert 4 < limiter.stats.concurrency < 8
+    assert limiter.stats.throttled == 1
+
+def test_RateLimiter_retries_429():
+    '''it retries rate limited requests after their Retry-After'''
+    #arrange
+    limiter = RateLimiter(backoffBase=0.01)
+    session = limiter.install(requests.Session())
+
+    #act
+    with StubNotionServer(rateLimit=20) as server:
+        responses = [session.post(server.apiBaseUrl + 'loadUserContent', json={}) for i in range(30)]
+
+    #assert
+    assert all(r.status_code == 200 for r in responses)
+    assert server.stats.rateLimited > 0
+    assert limiter.stats.throttled == server.stats.rateLimited
+    assert limiter.stats.retries == server.stats.rateLimited
+
+def test_RateLimiter_gives_up():
+    '''it returns the last failed response once it runs out of retries'''
+    #arrange
+    limiter = RateLimiter(maxRetries=2, backoffBase=0.01)
+    session = limiter.install(requests.Session())
+
+    #act
+    with StubNotionServer(errorRate=1, errorStatus=502) as server:
+        response = session.post(server.apiBaseUrl + 'loadUserContent', json={})
+
+    #assert
+    assert response.status_code == 502
+    assert server.stats.totalRequests == 3
+    assert limiter.stats.errors == 2
+
+def test_RateLimiter_upload_through_errors():
+    '''it gets a whole upload through transient errors'''
+    #arrange
+    limiter = RateLimiter(backoffBase=0.01, maxRetries=10)
+    with StubNotionServer(errorRate=0.2, errorStatus=503, seed=1) as server, server.patchNotionPy():
+        server.errorRate = 0 #Let the client start up
+        client = limiter.install(NotionClient(token_v2='anything'))
+        page = client.get_block(server.pageUrl(server.addPage('Page')))
+        server.errorRate = 0.2
+
+        #act
+        with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+            upload(mdFile, page, batchSize=20)
+
+    #assert
+    assert server.stats.errors > 0
+    assert limiter.stats.retries >= server.stats.errors
+    assert len(server.children(page.id)) == 128
+
+def test_cli_fetcher_not_rate_limited():
+    '''only paces requests to Notion.so, not fetching markdown urls'''
+    #arrange
+    fetchers = []
+    fetcherFromArgs = md2notion.cli.fetcherFromArgs
+    def recordFetcher(args):
+        fetchers.append(fetcherFromArgs(args))
+        return fetchers[-1]
+    with StubNotionServer() as server, server.patchNotionPy():
+        pageId = server.addPage('Root')
+
+        #act
+        with patch('md2notion.cli.fetcherFromArgs', recordFetcher):
+            cli(['token_v2', server.pageUrl(pageId), 'tests/TEST.md', '--rate-limit', '10'])
+
+    #assert
+    fetcher, = fetchers
+    assert not hasattr(fetcher.session.get_adapter('https://example.com'), 'limiter')
+    assert server.children(pageId)
@@ -0,0 +1,114 @@
+'''
+Tests uploading with a real NotionClient against the local stand-in for Notion.so
+'''
+import pytest
+import requests
+from tests.stubServer import StubNotionServer, applyOperation
+from md2notion.pipeline import convertText
+from md2notion.upload import upload, uploadDescriptors, uploadBlock
+
+def test_applyOperation():
+    '''it applies operations like Notion.so'''
+    #arrange
+    records = {}
+
+    #act
+    applyOperation(records, 'block', 'a', [], 'set', { 'id': 'a', 'content': ['c'] })
+    applyOperation(records, 'block', 'a', ['properties', 'title'], 'set', [['Hi']])
+    applyOperation(records, 'block', 'a', ['content'], 'listBefore', { 'id': 'b', 'before': 'c' })
+    applyOperation(records, 'block', 'a', ['content'], 'listAfter', { 'id': 'd' })
+    applyOperation(records, 'block', 'a', ['content'], 'listRemove', { 'id': 'c' })
+    applyOperation(records, 'block', 'a', [], 'update', { 'alive': False })
+
+    #assert
+    assert records['block']['a'] == {
+        'id': 'a',
+        'content': ['b', 'd'],
+        'properties': { 'title': [['Hi']] },
+        'alive': False
+    }
+
+@pytest.mark.parametrize('batchSize', [None, 100])
+def test_upload_to_stub(stubServer, stubPage, batchSize):
+    '''it uploads a whole document, tables and images included'''
+    #arrange
+    page = stubPage()
+
+    #act
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        upload(mdFile, page, batchSize=batchSize)
+
+    #assert
+    children = stubServer.children(page.id)
+    assert children[0]['type'] == 'header'
+    images = [c for c in children if c['type'] == 'image']
+    assert len(stubServer.files) == 1
+    assert any(list(stubServer.files.keys())[0] in i['properties']['source'][0][0] for i in images)
+    collection = next(c for c in children if c['type'] == 'collection_view')
+    rows = page._client.get_block(collection['id']).collection.get_rows()
+    assert len(rows) > 0
+    assert stubServer.stats.requests['submitTransaction'] > 0
+    assert stubServer.stats.bytesIn > 0
+
+def test_stub_counts_fewer_requests_batched(stubServer, stubPage):
+    '''it shows how many requests batching saves'''
+    #arrange
+    mdText = ''.join(f'Paragraph {i}\n\n' for i in range(50))
+    unbatchedPage = stubPage()
+    batchedPage = stubPage()
+
+    #act
+    before = stubServer.stats.totalRequests
+    uploadDescriptors(convertText(mdText), unbatchedPage, 'TEST.md')
+    unbatched = stubServer.stats.totalRequests - before
+    before = stubServer.stats.totalRequests
+    uploadDescriptors(convertText(mdText), batchedPage, 'TEST.md', batchSize=100)
+    batched = stubServer.stats.totalRequests - before
+
+    #assert
+    assert len(stubServer.children(unbatchedPage.id)) == 50
+    assert len(stubServer.children(batchedPage.id)) == 50
+    assert batched < unbatched
+
+def test_stub_rate_limits():
+    '''it answers requests over the rate limit with 429 and Retry-After'''
+    #arrange
+    with StubNotionServer(rateLimit=2) as server:
+        #act
+        responses = [requests.post(server.apiBaseUrl + 'loadUserContent', json={}) for i in range(4)]
+
+    #assert
+    assert [r.status_code for r in responses[:2]] == [200, 200]
+    assert responses[-1].status_code == 429
+    assert float(responses[-1].headers['Retry-After']) > 0
+    assert server.stats.rateLimited >= 1
+
+def test_stub_injects_errors():
+    '''it fails requests at the given rate'''
+    #arrange
+    with StubNotionServer(errorRate=1, errorStatus=503) as server:
+        #act
+        response = requests.post(server.apiBaseUrl + 'loadUserContent', json={})
+
+    #assert
+    assert response.status_code == 503
+    assert server.stats.errors == 1
+
+def test_upload_big_table_in_chunks(stubServer, stubPage):
+    '''it creates a table's rows a chunk per transaction, in order'''
+    #arrange
+    page = stubPage()
+    mdText = '| A | B | C |\n|---|---|---|\n' + ''.join(f'| {i} | b{i} | c{i} |\n' for i in range(1200))
+    blockDescriptor = convertText(mdText)[0]
+    transactionsBefore = stubServer.stats.requests['submitTransaction']
+
+    #act
+    table = uploadBlock(blockDescriptor, page, '', rowChunkSize=500)
+
+    #assert
+    propIds = list(blockDescriptor['schema'].keys())
+    rows = page._client.get_block(table.id).collection.get_rows()
+    assert [row.get_property(propIds[0]) for row in rows] == [str(i) for i in range(1200)]
+    assert [rows[7].get_property(propId) for propId in propIds] == ['7', 'b7', 'c7']
+    #The view, the collection and 3 chunks of rows
+    assert stubServer.stats.requests['submitTransaction'] - transactionsBefore < 10
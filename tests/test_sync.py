@@ -0,0 +1,76 @@
+'''
+Tests syncing block descriptors to existing blocks
+'''
+import mistletoe
+from md2notion.NotionPyRenderer import NotionPyRenderer
+from md2notion.sync import syncBlocks, descriptorHash, blockHash, normalizeSource
+from md2notion.upload import uploadBlock
+from notion.block import TextBlock, BulletedListBlock
+from notion.settings import S3_URL_PREFIX
+
+def render(md):
+    return mistletoe.markdown(md, NotionPyRenderer)
+
+def createBlock(blockDescriptor, blockParent):
+    return uploadBlock(blockDescriptor, blockParent, '')
+
+def pageContents(block):
+    return [(type(c), c.title, pageContents(c)) for c in block.children]
+
+def test_normalizeSource():
+    '''compares local and uploaded files by name but external urls as-is'''
+    #act/assert
+    assert normalizeSource('images/TEST%20IMAGE.png') == 'TEST IMAGE.png'
+    assert normalizeSource(S3_URL_PREFIX + '1234/TEST%20IMAGE.png') == 'TEST IMAGE.png'
+    assert normalizeSource('https://example.com/a.png') == 'https://example.com/a.png'
+
+def test_descriptorHash_matches_blockHash(notionClient):
+    '''hashes a descriptor the same as the block it uploads to'''
+    #arrange
+    page = notionClient.addPage()
+    descriptor = render("* **list**\n  * nested")[0]
+    wantedHash = descriptorHash(descriptor)
+
+    #act
+    block = createBlock(dict(descriptor), page)
+
+    #assert
+    assert blockHash(block) == wantedHash
+
+def test_syncBlocks_unchanged(notionClient):
+    '''does nothing when nothing has changed'''
+    #arrange
+    page = notionClient.addPage()
+    md = "# Title\n\nParagraph\n\n* list\n  * nested\n\n```python\ncode\n```\n"
+    for descriptor in render(md):
+        createBlock(descriptor, page)
+    notionClient.transactions.clear()
+
+    #act
+    stats = syncBlocks(render(md), page, createBlock)
+
+    #assert
+    assert notionClient.transactions == []
+    assert stats.kept == 4
+    assert stats.inserted == stats.updated == stats.moved == stats.removed == 0
+
+def test_syncBlocks_changes(notionClient):
+    '''only touches the blocks that changed and ends up with the same blocks as an upload'''
+    #arrange
+    page = notionClient.addPage()
+    for descriptor in render("A\n\nB\n\n* C\n  * D\n\nE\n\nF\n"):
+        createBlock(descriptor, page)
+    expectedPage = notionClient.addPage()
+    newMd = "F\n\nA\n\n* C\n  * D2\n\nNEW\n\nE\n"
+    for descriptor in render(newMd):
+        createBlock(descriptor, expectedPage)
+
+    #act
+    stats = syncBlocks(render(newMd), page, createBlock)
+
+    #assert
+    assert pageContents(page) == pageContents(expectedPage)
+    assert stats.moved == 1 #F
+    assert stats.removed == 1 #B
+    assert stats.updated == 2 #C and D
+    assert stats.inserted == 1 #NEW
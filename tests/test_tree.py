@@ -0,0 +1,121 @@
+'''
+Tests mirroring directory trees of markdown files with PageTree and --tree
+'''
+import pytest
+from notion.block import CodeBlock
+from notion.client import NotionClient
+from md2notion.tree import PageTree, treePaths
+from md2notion.upload import convert, cli
+
+def writeFiles(root, files):
+    for path, text in files.items():
+        path = root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding='utf-8')
+
+def titleOf(record):
+    return record['properties']['title'][0][0]
+
+def test_PageTree_levels(tmp_path):
+    '''makes a page per directory and file, breadth first, with index files on their directory's page'''
+    #arrange
+    paths = [str(tmp_path / p) for p in ['docs/b.md', 'docs/guide/README.md', 'docs/guide/deep/x.md',
+        'docs/A.md', 'docs/index.md']]
+
+    #act
+    tree = PageTree(paths)
+    levels = [[title for key, parentKey, title in level] for level in tree.levels()]
+
+    #assert
+    assert tree.root == str(tmp_path / 'docs')
+    assert levels == [['A.md', 'b.md', 'guide', 'index.md'], ['deep'], ['x.md']]
+    assert sorted(tree.topLevelTitles()) == ['A.md', 'b.md', 'guide', 'index.md']
+
+def test_treePaths(tmp_path):
+    '''expands directories to their markdown files and leaves out urls'''
+    #arrange
+    writeFiles(tmp_path, { 'b.md': '', 'a/c.md': '', 'a/d.txt': '' })
+
+    #act
+    paths = treePaths([str(tmp_path), str(tmp_path / 'b.md'), 'https://example.com/e.md'])
+
+    #assert
+    assert paths == [str(tmp_path / 'a' / 'c.md'), str(tmp_path / 'b.md')]
+
+def test_PageTree_rewriteLinks(tmp_path):
+    '''points relative links to files and directories in the tree at their pages'''
+    #arrange
+    root = tmp_path / 'docs'
+    tree = PageTree([str(root / 'a.md'), str(root / 'sub dir' / 'b.md')])
+    tree.pageIds.update({ str(root / 'a.md'): 'aaaa-1', str(root / 'sub dir'): 'dddd-2',
+        str(root / 'sub dir' / 'b.md'): 'bbbb-3' })
+    rendered = convert('[b](sub%20dir/b.md#part), [dir](sub%20dir/), [self](#top), '
+        '[web](https://example.com/b.md) and [missing](c.md)\n\n'
+        '* [nested](./sub%20dir/b.md)\n\n```\n[code](a.md)\n```\n')
+
+    #act
+    count = tree.rewriteLinks(rendered, str(root / 'a.md'))
+
+    #assert
+    assert count == 3
+    assert rendered[0]['title'] == '[b](https://www.notion.so/bbbb3), [dir](https://www.notion.so/dddd2), ' \
+        '[self](#top), [web](https://example.com/b.md) and [missing](c.md)'
+    assert rendered[1]['title'] == '[nested](https://www.notion.so/bbbb3)'
+    assert rendered[2]['type'] == CodeBlock
+    assert rendered[2]['title_plaintext'] == '[code](a.md)\n'
+
+def test_PageTree_create_order(stubServer, tmp_path):
+    '''keeps the children of a page in order when they take more than one transaction'''
+    #arrange
+    client = NotionClient(token_v2='anything')
+    pageId = stubServer.addPage('Root')
+    page = client.get_block(stubServer.pageUrl(pageId))
+    names = [f'{idx:02}.md' for idx in range(20)]
+    tree = PageTree([str(tmp_path / 'a' / name) for name in names] + [str(tmp_path / 'b' / 'c.md')])
+
+    #act
+    errors = tree.create(page, lambda: NotionClient(token_v2='anything'), workers=4, batchSize=3)
+
+    #assert
+    assert errors == []
+    assert [titleOf(r) for r in stubServer.children(pageId)] == ['a', 'b']
+    assert [titleOf(r) for r in stubServer.children(tree.pageId(str(tmp_path / 'a')))] == names
+    assert tree.pageId(str(tmp_path / 'b' / 'c.md')) in stubServer.records['block']
+
+@pytest.mark.parametrize('extraArgs', [[], ['--jobs', '2', '--batch-size', '10']])
+def test_cli_tree(stubServer, tmp_path, extraArgs):
+    '''mirrors the directories as nested pages, with links between the files going to their pages'''
+    #arrange
+    writeFiles(tmp_path, {
+        'docs/intro.md': 'See [install](guide/install.md) and [the guide](guide/)\n',
+        'docs/guide/README.md': 'Back to [intro](../intro.md)\n',
+        'docs/guide/install.md': 'Install it\n',
+    })
+    pageId = stubServer.addPage('Root')
+
+    #act
+    cli(['token_v2', stubServer.pageUrl(pageId), str(tmp_path / 'docs'), '--tree'] + extraArgs)
+
+    #assert
+    guide, intro = stubServer.children(pageId)
+    assert (titleOf(intro), titleOf(guide)) == ('intro.md', 'guide')
+    install, guideText = stubServer.children(guide['id'])
+    assert titleOf(install) == 'install.md'
+    assert guideText['properties']['title'] == [['Back to '],
+        ['intro', [['a', 'https://www.notion.so/' + intro['id'].replace('-', '')]]]]
+    assert stubServer.children(intro['id'])[0]['properties']['title'] == [['See '],
+        ['install', [['a', 'https://www.notion.so/' + install['id'].replace('-', '')]]], [' and '],
+        ['the guide', [['a', 'https://www.notion.so/' + guide['id'].replace('-', '')]]]]
+    assert titleOf(stubServer.children(install['id'])[0]) == 'Install it'
+
+def test_cli_tree_sync():
+    '''only makes new pages'''
+    #act/assert
+    with pytest.raises(SystemExit):
+        cli(['token_v2', 'page', 'docs', '--tree', '--sync'])
+
+def test_cli_tree_url():
+    '''only takes local files and directories'''
+    #act/assert
+    with pytest.raises(SystemExit):
+        cli(['token_v2', 'page', 'docs', 'https://example.com/a.md', '--tree'])
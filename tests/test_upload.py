@@ -7,9 +7,14 @@ import re
 import notion
 import sys
 from io import IOBase
-from md2notion.upload import filesFromPathsUrls, uploadBlock, cli, relativePathForMarkdownUrl
-from notion.block import TextBlock, ImageBlock, CollectionViewBlock, PageBlock
-from unittest.mock import Mock, patch, call
+from md2notion.upload import filesFromPathsUrls, uploadBlock, uploadBlocksBatched, cli, relativePathForMarkdownUrl, \
+    convert, convertStream, convertCached, markdownChunks, uploadDescriptors, ChildPages, targetPage
+from md2notion.pathIndex import PathIndex
+from md2notion.NotionPyRenderer import NotionPyRenderer, addHtmlImgTagExtension
+from notion.block import TextBlock, ImageBlock, CollectionViewBlock, PageBlock, BulletedListBlock
+from requests.exceptions import HTTPError
+from contextlib import contextmanager
+from unittest.mock import Mock, MagicMock, patch, call
 
 def test_filesFromPathUrl_with_file():
     '''it can get a file name, path, and file object from a file'''
@@ -79,6 +84,40 @@ def test_relativePathForMarkdownUrl_non_exist():
     #assert
     assert relPath == None
 
+@pytest.mark.parametrize('url,expected', [
+    ('TEST_IMAGE.png', Path('tests/TEST_IMAGE.png')),
+    ('file://TEST%20IMAGE%20HAS%20SPACES.png', Path('tests/TEST IMAGE HAS SPACES.png')),
+    ('TEST%20IMAGE%20HAS%20SPACES.png', Path('tests/TEST IMAGE HAS SPACES.png')),
+    ('../tests/TEST_IMAGE.png', Path('tests/../tests/TEST_IMAGE.png')),
+    ('NON_EXIST.png', None),
+    ('TEST.md/TEST_IMAGE.png', None),
+    ('test_image.png', None),
+])
+def test_relativePathForMarkdownUrl_pathIndex(url, expected):
+    '''finds the same paths from a PathIndex, listing each directory only once'''
+    #arrange
+    pathIndex = PathIndex()
+    relativePathForMarkdownUrl('TEST_IMAGE.png', 'tests/TEST.md', pathIndex)
+    scans = pathIndex.scans
+
+    #act
+    relPath = relativePathForMarkdownUrl(url, 'tests/TEST.md', pathIndex)
+
+    #assert
+    assert relPath == expected
+    assert pathIndex.scans == scans
+
+def test_relativePathForMarkdownUrl_pathIndex_caseInsensitive():
+    '''finds files whose name only matches in a different case'''
+    #arrange
+    pathIndex = PathIndex(caseInsensitive=True)
+
+    #act
+    relPath = relativePathForMarkdownUrl('test_image.PNG', 'TESTS/TEST.md', pathIndex)
+
+    #assert
+    assert relPath == Path('tests/TEST_IMAGE.png').absolute()
+
 def test_uploadBlock():
     '''uploads a simple block to Notion using add_new'''
     #arrange
@@ -210,7 +249,212 @@ def test_uploadBlock_collection():
     notionBlock.children.add_new.assert_called_with(CollectionViewBlock)
     notionBlock._client.create_record.assert_called_with("collection", parent=newBlock, schema=schema)
     notionBlock._client.get_collection.assert_called_with(collection)
-    #TODO: This is incomplete...
+    ops = notionBlock._client.submit_transaction.call_args[0][0]
+    rowOps = [op for op in ops if op['path'] == []]
+    assert [op['args']['properties'] for op in rowOps] == [
+        { 'J=}2': [['Test100']], 'J=}x': [['Test200']], 'title': [['Test300']] },
+        { 'J=}2': [], 'J=}x': [['Test400']], 'title': [] }
+    ]
+    assert ops[-1]['path'] == ['page_sort']
+    assert ops[-1]['args'] == [op['id'] for op in rowOps]
+
+class MockTransactionClient:
+    '''Records the operations submitted in every atomic transaction'''
+    def __init__(self, rejectTransactions=False):
+        self._monitor = None
+        self.rejectTransactions = rejectTransactions
+        self.transactions = []
+        self.records = []
+        self._ops = None
+
+    @contextmanager
+    def as_atomic_transaction(self):
+        self._ops = []
+        yield
+        ops, self._ops = self._ops, None
+        if self.rejectTransactions:
+            raise HTTPError("Rejected")
+        self.transactions.append(ops)
+
+    def create_record(self, table, parent, **kwargs):
+        recordId = f"00000000-0000-0000-0000-{len(self.records):012}"
+        self.records.append((recordId, parent, kwargs))
+        self._ops.append(recordId)
+        return recordId
+
+    def submit_transaction(self, operations, update_last_edited=True):
+        self._ops.append(operations)
+
+def test_uploadBlocksBatched():
+    '''uploads blocks and their children in as few transactions as the batch size allows'''
+    #arrange
+    blockDescriptors = [
+        { 'type': TextBlock, 'title': 'Text 1' },
+        { 'type': BulletedListBlock, 'title': 'List', 'children': [
+            { 'type': TextBlock, 'title': 'Nested' }
+        ]},
+        { 'type': TextBlock, 'title': 'Text 2' }
+    ]
+    notionBlock = Mock()
+    notionBlock._client = client = MockTransactionClient()
+
+    #act
+    blocks = uploadBlocksBatched(blockDescriptors, notionBlock, '', batchSize=3)
+
+    #assert
+    assert len(client.transactions) == 2
+    assert len(client.records) == 4
+    assert [type(b) for b in blocks] == [TextBlock, BulletedListBlock, TextBlock]
+    assert client.records[0][1] == notionBlock
+    assert client.records[2][1] == blocks[1] #Nested block is a child of the list
+    assert client.records[3][1] == notionBlock
+    notionBlock.children.add_new.assert_not_called()
+    assert blockDescriptors[1]['children'] #Descriptors aren't modified
+
+def test_uploadBlocksBatched_image_local():
+    '''uploads local images after their batch has been committed'''
+    #arrange
+    blockDescriptors = [{
+        'type': ImageBlock,
+        'caption': 'test',
+        'source': 'TEST_IMAGE.png'
+    }]
+    notionBlock = Mock()
+    notionBlock._client = MockTransactionClient()
+
+    #act
+    with patch.object(ImageBlock, 'upload_file') as uploadFile:
+        uploadBlocksBatched(blockDescriptors, notionBlock, 'tests/DUMMY.md')
+
+    #assert
+    uploadFile.assert_called_with(str(Path('tests/TEST_IMAGE.png')))
+
+def test_uploadBlocksBatched_rejected():
+    '''falls back to uploading one block at a time if a batch is rejected'''
+    #arrange
+    blockDescriptors = [
+        { 'type': TextBlock, 'title': 'Text 1' },
+        { 'type': TextBlock, 'title': 'Text 2' }
+    ]
+    notionBlock = Mock()
+    notionBlock._client = MockTransactionClient(rejectTransactions=True)
+
+    #act
+    uploadBlocksBatched(blockDescriptors, notionBlock, '')
+
+    #assert
+    notionBlock.children.add_new.assert_has_calls([
+        call(TextBlock, title='Text 1'),
+        call(TextBlock, title='Text 2')
+    ])
+
+def test_markdownChunks():
+    '''splits at top level blocks but never inside of a code fence'''
+    #arrange
+    lines = ['Text\n', '\n', '```\n', 'a\n', '\n', 'b\n', '```\n', '\n', '* List\n', '\n',
+        '    Continued\n', '\n', 'End\n']
+
+    #act
+    chunks = list(markdownChunks(lines, chunkLines=1))
+
+    #assert
+    assert chunks == [
+        ['Text\n', '\n'],
+        ['```\n', 'a\n', '\n', 'b\n', '```\n', '\n'],
+        ['* List\n', '\n', '    Continued\n', '\n'],
+        ['End\n']
+    ]
+
+def test_convertStream():
+    '''converts to the same blocks as convert()'''
+    #arrange
+    with open('tests/COMPREHENSIVE_TEST.md', 'r', encoding='utf-8') as mdFile:
+        mdText = mdFile.read()
+    def simplify(descriptors):
+        return [(d['type'], d.get('title'), d.get('title_plaintext'), d.get('rows'),
+            simplify(d.get('children') or [])) for d in descriptors]
+
+    #act
+    streamed = list(convertStream(mdText, chunkLines=5))
+
+    #assert
+    assert simplify(streamed) == simplify(convert(mdText))
+
+@pytest.mark.parametrize('html', [
+    '<pre>\nline\n\nmore\n</pre>',
+    '<script>\na()\n\nb()\n</script>',
+    '<!--\na\n\nb -->',
+    '<?php\na\n\nb ?>',
+    '<!DOCTYPE\n\nhtml>',
+])
+def test_convertStream_html_blocks(html):
+    '''doesn't split raw HTML blocks that can have blank lines in them'''
+    #arrange
+    mdText = f'Intro\n\n{html}\n\nafter\n'
+
+    renderer = addHtmlImgTagExtension(NotionPyRenderer)
+
+    #act
+    streamed = list(convertStream(mdText, renderer, chunkLines=1))
+
+    #assert
+    assert [(d['type'], d['title']) for d in streamed] == \
+        [(d['type'], d['title']) for d in convert(mdText, renderer)]
+    assert streamed[-1]['title'] == 'after'
+
+def test_convertStream_lazy():
+    '''only reads as far as it has to for the blocks asked for'''
+    #arrange
+    linesRead = []
+    def lines():
+        for i in range(10000):
+            linesRead.append(i)
+            yield f'Paragraph {i}\n'
+            yield '\n'
+
+    #act
+    first = next(convertStream(lines(), chunkLines=10))
+
+    #assert
+    assert first['title'] == 'Paragraph 0'
+    assert len(linesRead) < 100
+
+def test_convertStream_references():
+    '''keeps link reference definitions from earlier chunks'''
+    #arrange/act
+    output = list(convertStream('[ref]: https://example.com\n\nText\n\n[Link][ref]\n', chunkLines=1))
+
+    #assert
+    assert output[-1]['title'] == '[Link](https://example.com)'
+
+def test_convertCached_late_references():
+    '''resolves references defined after a long stretch of markdown, unless streaming'''
+    #arrange
+    mdText = 'See [docs][d]\n\n' + 'Text\n\n' * 1000 + '[d]: https://x.com\n'
+
+    #act
+    converted = convertCached(mdText)
+    streamed = list(convertCached(mdText, stream=True))
+
+    #assert
+    assert converted[0]['title'] == 'See [docs](https://x.com)'
+    assert streamed[0]['title'] == 'See [docs][d]'
+
+def test_uploadDescriptors_stream_batched():
+    '''uploads a stream of blocks in batches as they come in'''
+    #arrange
+    notionBlock = Mock()
+    notionBlock._client = client = MockTransactionClient()
+    def rendered():
+        for i in range(5):
+            yield { 'type': TextBlock, 'title': f'Text {i}' }
+
+    #act
+    uploadDescriptors(rendered(), notionBlock, '', batchSize=2)
+
+    #assert
+    assert len(client.transactions) == 3
+    assert len(client.records) == 5
 
 def MockClient():
     #No-op, seal doesn't exist in Python 3.6
@@ -229,12 +473,15 @@ def MockClient():
                 return None
             m.remove = Mock(return_value=None, side_effect=remove)
             m.title = title
+            m.id = f'{title}-{len(self)}'
             seal(m)
             self.append(m)
             return m
     getBlock.children = MockNodeList()
     getBlock.title = Mock(return_value="")
+    getBlock._client = notionClient
     notionClient.get_block = Mock(return_value=getBlock)
+    notionClient.as_atomic_transaction = MagicMock(return_value=MagicMock())
     seal(getBlock)
     seal(notionClient)
     return notionClient
@@ -339,3 +586,58 @@ def test_cli_latex(mockClient, upload):
     renderer = args0[3]()
     assert "InlineEquation" in renderer.render_map
     assert "BlockEquation" in renderer.render_map
+
+@patch('md2notion.upload.sync')
+@patch('md2notion.upload.upload')
+@patch('md2notion.upload.NotionClient', new_callable=MockClient)
+def test_cli_sync(mockClient, upload, sync):
+    '''should sync pages that already exist and upload ones that don't'''
+    #arrange
+    testBlock = mockClient.get_block().children.add_new(PageBlock, title='TEST.md')
+
+    #act
+    cli(['token_v2', 'page_url', 'tests/TEST.md', 'tests/COMPREHENSIVE_TEST.md', '--sync'])
+
+    #assert
+    testBlock.remove.assert_not_called()
+    args0, kwargs0 = sync.call_args
+    assert args0[0].name == 'tests/TEST.md'
+    assert args0[1] == testBlock
+    args1, kwargs1 = upload.call_args
+    assert args1[0].name == 'tests/COMPREHENSIVE_TEST.md'
+    assert args1[1] == mockClient.get_block.return_value.children[1]
+    assert args1[1].title == 'COMPREHENSIVE_TEST.md'
+
+def test_ChildPages_remove(notionClient):
+    '''removes every page with the titles in one transaction, keeping the ones asked to'''
+    #arrange
+    page = notionClient.addPage('Root')
+    children = [page.children.add_new(PageBlock, title=f'{i % 3}.md') for i in range(9)]
+    childPages = ChildPages(page)
+    transactionsBefore = len(notionClient.transactions)
+
+    #act
+    removed = childPages.remove(['0.md', '1.md', '0.md'], keepIds={ children[3].id })
+
+    #assert
+    assert len(notionClient.transactions) == transactionsBefore + 1
+    assert [p.id for p in removed] == [children[i].id for i in [0, 6, 1, 4, 7]]
+    assert [p.id for p in childPages.find('0.md')] == [children[3].id]
+    assert [c.title for c in page.children] == ['2.md', '0.md', '2.md', '2.md']
+
+def test_targetPage_childPages(notionClient):
+    '''finds and makes pages through the index'''
+    #arrange
+    page = notionClient.addPage('Root')
+    existing = page.children.add_new(PageBlock, title='a.md')
+    childPages = ChildPages(page)
+
+    #act
+    syncPage, shouldSync = targetPage(page, 'sync', 'a.md', childPages=childPages)
+    newPage, shouldSyncNew = targetPage(page, 'sync', 'b.md', childPages=childPages)
+    syncNewPage, shouldSyncNewAgain = targetPage(page, 'sync', 'b.md', childPages=childPages)
+
+    #assert
+    assert (syncPage.id, shouldSync) == (existing.id, True)
+    assert shouldSyncNew is False
+    assert (syncNewPage.id, shouldSyncNewAgain) == (newPage.id, True)